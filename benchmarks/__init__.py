@@ -0,0 +1 @@
+# Pruebas de rendimiento de los caminos críticos de la aplicación (sin GTK)
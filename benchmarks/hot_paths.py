@@ -0,0 +1,400 @@
+# Pruebas de rendimiento de los caminos críticos, sin GTK
+#
+#   python3 -m benchmarks.hot_paths                  # compara con benchmarks/baselines.json
+#   python3 -m benchmarks.hot_paths --save-baseline  # guarda los tiempos actuales como referencia
+#   python3 -m benchmarks.hot_paths --quick          # tamaños pequeños (para comprobar que funciona)
+#
+# Cada prueba prepara sus datos en un directorio temporal, se repite varias veces
+# y se compara la mediana con la referencia guardada: si es más de `tolerance`
+# veces más lenta se marca como regresión y el programa termina con código 1.
+import io
+import os
+import sys
+import json
+import time
+import shutil
+import socket
+import logging
+import argparse
+import platform
+import tempfile
+import threading
+import subprocess
+import statistics
+from collections import namedtuple
+
+from core.utils import find_models
+from core.discovery import ModelDiscovery
+from core.model_index import ModelIndex
+from core.config import ConfigStore
+from core.server_log import SessionLogWriter
+from core.llama_server import ServerInstance, check_server_running
+from tests.test_gguf import write_gguf_stub, LLAMA_METADATA
+
+BASELINE_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baselines.json")
+
+# Una regresión es una mediana más de DEFAULT_TOLERANCE veces la de referencia
+DEFAULT_TOLERANCE = 1.5
+
+DEFAULT_REPEAT = 5
+
+# Tamaños de cada prueba: (completo, --quick)
+SIZES = {
+    "models": (10000, 300),
+    "processes": (200, 10),
+    "log_lines": (200000, 5000),
+    "config_ops": (200, 20),
+}
+
+# Registro de una prueba
+#   name: Nombre (clave en baselines.json)
+#   setup: Función(workdir, sizes) que prepara los datos y devuelve (run, unidades, cleanup)
+#          run: Función sin argumentos que se cronometra
+#          unidades: Elementos procesados por ejecución (para el rendimiento por segundo)
+#          cleanup: Función para liberar recursos, o None
+#   unit: Nombre de las unidades ("modelos", "líneas", ...)
+Benchmark = namedtuple("Benchmark", ["name", "setup", "unit"])
+
+# Resultado de una prueba (tiempos en segundos)
+Result = namedtuple("Result", ["name", "median", "best", "units", "unit", "skipped"])
+
+BENCHMARKS = []
+
+
+def benchmark(name, unit):
+    def register(setup):
+        BENCHMARKS.append(Benchmark(name, setup, unit))
+        return setup
+    return register
+
+
+def _make_stubs(directory, count, per_dir=None):
+    """Crea `count` GGUF mínimos (copias de una misma cabecera) en `directory`
+
+    Args:
+        per_dir: Si se indica, se reparten en subdirectorios de per_dir ficheros
+    """
+    template = os.path.join(directory, ".template.gguf")
+    os.makedirs(directory, exist_ok=True)
+    write_gguf_stub(template, LLAMA_METADATA, [("a", (64, 100))])
+    with open(template, "rb") as f:
+        data = f.read()
+    os.remove(template)
+    for i in range(count):
+        target = directory if per_dir is None else os.path.join(directory, f"d{i // per_dir:03d}")
+        if per_dir is not None and i % per_dir == 0:
+            os.makedirs(target, exist_ok=True)
+        with open(os.path.join(target, f"model-{i:05d}.Q4_K_M.gguf"), "wb") as f:
+            f.write(data)
+
+
+@benchmark("find_models", "modelos")
+def bench_find_models(workdir, sizes):
+    models_dir = os.path.join(workdir, "flat")
+    _make_stubs(models_dir, sizes["models"])
+    return lambda: find_models(models_dir), sizes["models"], None
+
+
+@benchmark("update_model_list", "modelos")
+def bench_update_model_list(workdir, sizes):
+    """Lo que hace update_model_list sin el widget: listar, consultar el índice, podar y guardar"""
+    models_dir = os.path.join(workdir, "flat")
+    if not os.path.isdir(models_dir):
+        _make_stubs(models_dir, sizes["models"])
+    index = ModelIndex(os.path.join(workdir, "index-warm.json"))
+
+    def run():
+        models = find_models(models_dir)
+        for path in models:
+            index.get(path)
+        index.prune(models_dir, models)
+        index.save()
+
+    run()  # El índice ya está caliente, como en cualquier refresco después del primero
+    return run, sizes["models"], None
+
+
+@benchmark("discovery_cold_index", "modelos")
+def bench_discovery_cold(workdir, sizes):
+    """Primer escaneo de un árbol (100 modelos por directorio) con el índice vacío: se leen todas las cabeceras"""
+    root = os.path.join(workdir, "tree")
+    _make_stubs(root, sizes["models"], per_dir=100)
+    counter = iter(range(1_000_000))
+
+    def run():
+        index = ModelIndex(os.path.join(workdir, f"index-cold-{next(counter)}.json"))
+        done = threading.Event()
+        discovery = ModelDiscovery(lambda r, batch: None, on_finished=done.set, index=index, root_timeout=None)
+        discovery.start([root])
+        if not done.wait(600):
+            raise RuntimeError("El escaneo no terminó")
+        discovery.cancel()
+
+    return run, sizes["models"], None
+
+
+@benchmark("check_server_running", "comprobaciones")
+def bench_check_server_running(workdir, sizes):
+    """Un puerto libre (camino rápido por /proc/net/tcp) y uno ocupado por otro programa
+    (hay que buscar el dueño entre todos los procesos) con muchos procesos en marcha"""
+    processes = [subprocess.Popen(["sleep", "600"]) for _ in range(sizes["processes"])]
+    listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    busy_port = listener.getsockname()[1]
+    probe = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    probe.bind(("127.0.0.1", 0))
+    free_port = probe.getsockname()[1]
+    probe.close()
+
+    def run():
+        check_server_running(free_port)
+        check_server_running(busy_port)
+
+    def cleanup():
+        listener.close()
+        for process in processes:
+            process.kill()
+        for process in processes:
+            process.wait()
+
+    return run, 2, cleanup
+
+
+class _FakeProcess:
+    """Proceso con la salida ya escrita, para alimentar ServerInstance._read_output"""
+
+    pid = 0
+
+    def __init__(self, text):
+        self.stdout = io.StringIO(text)
+
+    def wait(self, timeout=None):
+        return 0
+
+    def poll(self):
+        return 0
+
+
+def _server_output(lines):
+    sample = [
+        "srv  update_slots: all slots are idle\n",
+        "slot launch_slot_: id  0 | task 12 | processing task\n",
+        "prompt eval time =     120.51 ms /    64 tokens (    1.88 ms per token,   531.07 tokens per second)\n",
+        "       eval time =    2001.44 ms /   128 tokens (   15.64 ms per token,    63.95 tokens per second)\n",
+        "slot      release: id  0 | task 12 | stop processing: n_past = 192, truncated = 0\n",
+        "srv  log_server_r: request: POST /completion 127.0.0.1 200\n",
+        "llama_model_loader: - kv  19:               general.quantization_version u32              = 2\n",
+        "main: server is listening on http://127.0.0.1:8080 - starting the main loop\n",
+    ]
+    return "".join(sample[i % len(sample)] for i in range(lines))
+
+
+@benchmark("log_ingestion", "líneas")
+def bench_log_ingestion(workdir, sizes):
+    """Hilo lector de la salida: registro en disco, métricas, búfer circular y oyentes"""
+    text = _server_output(sizes["log_lines"])
+    log_dir = os.path.join(workdir, "logs")
+    instance = ServerInstance(os.path.join(workdir, "m.gguf"), 8080)
+    instance.add_output_listener(lambda inst, line: None)
+
+    def run():
+        process = _FakeProcess(text)
+        instance.process = process
+        instance._read_output(process, SessionLogWriter(log_dir=log_dir), instance.metrics)
+
+    return run, sizes["log_lines"], None
+
+
+@benchmark("config_save_load", "operaciones")
+def bench_config(workdir, sizes):
+    """Guardar (con escritura inmediata) y volver a cargar la configuración"""
+    path = os.path.join(workdir, "config.json")
+    store = ConfigStore(path, save_delay=0)
+    store.update_model_section("m.gguf", {"launch_profiles": {"active": "a", "profiles": {"a": {"parallel": 4}}}})
+    ops = sizes["config_ops"]
+
+    def run():
+        for i in range(ops):
+            store.update({"threads": str(i % 16), "ctx_size": str(2048 + i)})
+            ConfigStore(path, save_delay=0)
+
+    return run, ops, None
+
+
+def _startup_script(modules):
+    return ("import time; t = time.perf_counter(); "
+            + "; ".join(f"import {module}" for module in modules)
+            + "; from core.config import load_config; from core.i18n import set_language, get_text; "
+              "set_language(load_config().get('language', 'es')); get_text('app_title'); "
+              "print(time.perf_counter() - t)")
+
+
+def _bench_startup(workdir, modules):
+    home = os.path.join(workdir, "home")
+    os.makedirs(home, exist_ok=True)
+    repo = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = dict(os.environ, HOME=home, PYTHONDONTWRITEBYTECODE="1")
+    script = _startup_script(modules)
+
+    def run():
+        subprocess.run([sys.executable, "-c", script], cwd=repo, env=env, check=True,
+                       stdout=subprocess.DEVNULL)
+
+    return run, 1, None
+
+
+@benchmark("startup_headless", "arranques")
+def bench_startup_headless(workdir, sizes):
+    """Arranque en frío de un intérprete con los módulos de core, la configuración y las traducciones"""
+    return _bench_startup(workdir, ["core.llama_server", "core.proxy", "core.autotune", "core.memory_fit",
+                                    "core.launch_profile", "core.watchdog", "core.discovery"])
+
+
+@benchmark("startup_window_import", "arranques")
+def bench_startup_window(workdir, sizes):
+    """Importación de la ventana principal (necesita PyGObject; la ventana en sí se mide con --profile-startup)"""
+    try:
+        import gi  # noqa: F401
+    except ImportError:
+        return None
+    return _bench_startup(workdir, ["gi", "gui.main_window"])
+
+
+def run_benchmarks(names=None, quick=False, repeat=DEFAULT_REPEAT, on_result=None):
+    """Ejecuta las pruebas y devuelve sus resultados
+
+    Args:
+        names: Nombres de las pruebas (por defecto, todas)
+        quick: Usar los tamaños pequeños
+        repeat: Repeticiones de cada prueba
+        on_result: Callback(Result) según termina cada una
+
+    Returns:
+        Lista de Result
+    """
+    sizes = {key: value[1] if quick else value[0] for key, value in SIZES.items()}
+    results = []
+    workdir = tempfile.mkdtemp(prefix="llama-gui-bench-")
+    try:
+        for bench in BENCHMARKS:
+            if names and bench.name not in names:
+                continue
+            prepared = bench.setup(workdir, sizes)
+            if prepared is None:
+                result = Result(bench.name, None, None, 0, bench.unit, True)
+            else:
+                run, units, cleanup = prepared
+                timings = []
+                try:
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        run()
+                        timings.append(time.perf_counter() - start)
+                finally:
+                    if cleanup is not None:
+                        cleanup()
+                result = Result(bench.name, statistics.median(timings), min(timings), units, bench.unit, False)
+            results.append(result)
+            if on_result is not None:
+                on_result(result)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+    return results
+
+
+def host_info():
+    return {"machine": platform.machine(), "python": platform.python_version(), "cpus": os.cpu_count()}
+
+
+def load_baselines(path=BASELINE_FILE):
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baselines(results, quick=False, path=BASELINE_FILE):
+    """Guarda las medianas como referencia (en la sección "quick" o "full")"""
+    data = load_baselines(path)
+    section = data.setdefault("quick" if quick else "full", {})
+    section["host"] = host_info()
+    section["saved"] = time.strftime("%Y-%m-%d %H:%M:%S")
+    results_section = section.setdefault("results", {})
+    for result in results:
+        if not result.skipped:
+            results_section[result.name] = {"median": result.median, "units": result.units}
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2, sort_keys=True)
+        f.write("\n")
+    os.replace(tmp_path, path)
+
+
+def compare(results, baselines, quick=False, tolerance=DEFAULT_TOLERANCE):
+    """Compara los resultados con las referencias
+
+    Returns:
+        Lista de (Result, ratio o None si no hay referencia, True si es una regresión)
+    """
+    reference = baselines.get("quick" if quick else "full", {}).get("results", {})
+    comparison = []
+    for result in results:
+        base = reference.get(result.name)
+        if result.skipped or not base or base.get("units") != result.units:
+            comparison.append((result, None, False))
+            continue
+        ratio = result.median / base["median"] if base["median"] else None
+        comparison.append((result, ratio, ratio is not None and ratio > tolerance))
+    return comparison
+
+
+def format_result(result, ratio=None, regression=False):
+    if result.skipped:
+        return f"  {result.name:<24} (omitida)"
+    rate = result.units / result.median if result.median else 0
+    line = f"  {result.name:<24} {result.median * 1000:10.1f} ms  {rate:12.0f} {result.unit}/s"
+    if ratio is not None:
+        line += f"  x{ratio:.2f} respecto a la referencia" + ("  ⚠ REGRESIÓN" if regression else "")
+    return line
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pruebas de rendimiento de LLaMA Server GUI (sin GTK)")
+    parser.add_argument("names", nargs="*", help="Pruebas a ejecutar (por defecto, todas)")
+    parser.add_argument("--quick", action="store_true", help="Tamaños pequeños")
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE,
+                        help="Factor de lentitud a partir del cual se considera una regresión")
+    parser.add_argument("--save-baseline", action="store_true", help="Guardar los resultados como referencia")
+    parser.add_argument("--baseline-file", default=BASELINE_FILE)
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.ERROR)
+
+    unknown = set(args.names) - {bench.name for bench in BENCHMARKS}
+    if unknown:
+        parser.error(f"Pruebas desconocidas: {', '.join(sorted(unknown))}")
+    results = run_benchmarks(args.names, args.quick, args.repeat,
+                             on_result=lambda result: print(format_result(result), flush=True))
+    baselines = load_baselines(args.baseline_file)
+    if args.save_baseline:
+        save_baselines(results, args.quick, args.baseline_file)
+        print(f"Referencia guardada en {args.baseline_file}")
+        return 0
+
+    section = baselines.get("quick" if args.quick else "full", {})
+    if not section.get("results"):
+        print("No hay referencia guardada: usa --save-baseline para crearla")
+        return 0
+    if section.get("host") != host_info():
+        print(f"Aviso: la referencia se tomó en otra máquina ({section['host']})")
+    comparison = compare(results, baselines, args.quick, args.tolerance)
+    print("\nComparación con la referencia:")
+    for result, ratio, regression in comparison:
+        print(format_result(result, ratio, regression))
+    return 1 if any(regression for _, _, regression in comparison) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,336 @@
+# Ajuste automático de hilos, tamaños de lote y slots paralelos para cada modelo
+import os
+import json
+import time
+import logging
+import threading
+import subprocess
+import urllib.request
+from collections import namedtuple
+import psutil
+from core.llama_server import ServerInstance, find_free_port, STATE_READY, STATE_EXITED, STATE_FAILED
+
+# Perfiles ajustados, uno por modelo
+PROFILES_FILE = os.path.expanduser("~/.llama-server-gui/autotune_profiles.json")
+
+# Tokens del prompt y de la generación de cada medición
+PROMPT_TOKENS = 512
+GEN_TOKENS = 64
+
+# Segundos máximos para que una instancia de prueba cargue el modelo
+TRIAL_LOAD_TIMEOUT = 600.0
+
+# Parejas (--batch-size, --ubatch-size) que se prueban
+BATCH_CANDIDATES = [(512, 512), (1024, 512), (2048, 512), (2048, 1024), (4096, 1024)]
+
+# Valores de --parallel que se prueban
+PARALLEL_CANDIDATES = [1, 2, 4]
+
+# Resultado de una medición: parámetros probados y velocidades en tokens/s
+#   (con --parallel > 1, gen_tps es la velocidad conjunta de todas las peticiones simultáneas)
+TrialResult = namedtuple("TrialResult", ["params", "prompt_tps", "gen_tps"])
+
+
+def model_key(model_path):
+    """Clave del perfil: nombre y tamaño del modelo (sobrevive a mover la carpeta)"""
+    try:
+        size = os.path.getsize(model_path)
+    except OSError:
+        size = 0
+    return f"{os.path.basename(model_path)}|{size}"
+
+
+def load_profiles():
+    if not os.path.exists(PROFILES_FILE):
+        return {}
+    try:
+        with open(PROFILES_FILE, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"No se pudo leer {PROFILES_FILE}: {e}")
+        return {}
+
+
+def load_tuned_profile(model_path):
+    """Perfil ajustado del modelo (threads, threads_batch, batch_size, ubatch_size, parallel) o None"""
+    return load_profiles().get(model_key(model_path))
+
+
+def save_tuned_profile(model_path, profile):
+    data = load_profiles()
+    data[model_key(model_path)] = profile
+    try:
+        os.makedirs(os.path.dirname(PROFILES_FILE), exist_ok=True)
+        tmp_file = f"{PROFILES_FILE}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_file, PROFILES_FILE)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"No se pudo guardar el perfil ajustado: {e}")
+
+
+def thread_candidates():
+    """Valores de --threads a probar: alrededor del número de núcleos físicos"""
+    logical = os.cpu_count() or 4
+    physical = psutil.cpu_count(logical=False) or max(1, logical // 2)
+    candidates = {max(1, physical // 2), max(1, physical - 1), physical, logical}
+    return sorted(candidates)
+
+
+def find_llama_bench(bin_base):
+    """Ruta de llama-bench junto a llama-server, o None si no está"""
+    path = os.path.join(bin_base, "llama-bench")
+    return path if os.path.isfile(path) and os.access(path, os.X_OK) else None
+
+
+def parse_llama_bench_output(text):
+    """Extrae las velocidades de la salida JSON de llama-bench (-o json)
+
+    Returns:
+        (prompt_tps, gen_tps); cualquiera puede ser None si no se midió
+    """
+    prompt_tps = gen_tps = None
+    for entry in json.loads(text):
+        if entry.get("n_gen"):
+            gen_tps = float(entry["avg_ts"])
+        elif entry.get("n_prompt"):
+            prompt_tps = float(entry["avg_ts"])
+    return prompt_tps, gen_tps
+
+
+class Autotuner:
+    """Barre los parámetros de rendimiento de un modelo y guarda la mejor combinación
+
+    En vez de probar todas las combinaciones se ajusta un parámetro cada vez
+    (manteniendo los mejores valores encontrados hasta entonces):
+
+    1. --threads: mejor velocidad de generación
+    2. --threads-batch: mejor velocidad de procesado del prompt
+    3. --batch-size / --ubatch-size: mejor velocidad de procesado del prompt
+    4. --parallel: más tokens/s generados en total con peticiones simultáneas
+
+    Si llama-bench está en bin_base se usa para los pasos 1-3 (con -t sirve para
+    ambos tipos de hilos); el resto se mide con instancias temporales de llama-server
+    consultando /completion. Los callbacks se ejecutan en el hilo del ajuste.
+    """
+
+    def __init__(self, model_path, bin_base="", base_args=None, on_progress=None, on_finished=None,
+                 threads=None, batches=None, parallels=None, prompt_tokens=PROMPT_TOKENS, gen_tokens=GEN_TOKENS,
+                 use_llama_bench=True):
+        """
+        Args:
+            model_path: Ruta al modelo .gguf
+            bin_base: Directorio de llama-server (y de llama-bench si existe)
+            base_args: Argumentos fijos de las instancias de prueba (p. ej. --n-gpu-layers, --ctx-size)
+            on_progress: Callback(texto, paso, pasos_totales)
+            on_finished: Callback(perfil o None, error o None)
+            threads / batches / parallels: Candidatos a probar (por defecto, según la máquina)
+        """
+        self.model_path = model_path
+        self.bin_base = bin_base
+        self.base_args = list(base_args or [])
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.threads = threads or thread_candidates()
+        self.batches = batches or BATCH_CANDIDATES
+        self.parallels = parallels or PARALLEL_CANDIDATES
+        self.prompt_tokens = prompt_tokens
+        self.gen_tokens = gen_tokens
+        self.llama_bench = find_llama_bench(bin_base) if use_llama_bench else None
+        self.cancel_event = threading.Event()
+        self.results = []
+        self.thread = None
+        self.step = 0
+        self.total_steps = (2 * len(self.threads) + len(self.batches) + len(self.parallels))
+        if self.llama_bench:
+            # Con llama-bench una pasada de -t mide a la vez prompt y generación
+            self.total_steps -= len(self.threads)
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def _progress(self, text):
+        self.step += 1
+        logging.getLogger(__name__).info(f"Autotune [{self.step}/{self.total_steps}] {text}")
+        if self.on_progress:
+            self.on_progress(text, self.step, self.total_steps)
+
+    def _run(self):
+        try:
+            profile = self.run()
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Autotune falló: {e}")
+            if self.on_finished:
+                self.on_finished(None, str(e))
+            return
+        if self.on_finished:
+            self.on_finished(profile, None if profile else "cancelado")
+
+    def run(self):
+        """Ejecuta el barrido completo (bloqueante)
+
+        Returns:
+            El perfil guardado, o None si se canceló
+        """
+        best = {"threads": self.threads[0], "threads_batch": self.threads[0],
+                "batch_size": self.batches[0][0], "ubatch_size": self.batches[0][1], "parallel": 1}
+
+        def sweep(values, apply, metric, label, server=False):
+            chosen, chosen_tps = None, -1.0
+            for value in values:
+                if self.cancel_event.is_set():
+                    return None
+                params = dict(best)
+                apply(params, value)
+                self._progress(f"{label}={value}")
+                result = self.measure(params, server)
+                tps = getattr(result, metric) or 0.0
+                if tps > chosen_tps:
+                    chosen, chosen_tps = value, tps
+            return chosen
+
+        if self.llama_bench:
+            # Una sola pasada: la mejor generación fija --threads y el mejor prompt --threads-batch
+            by_threads = []
+            for threads in self.threads:
+                if self.cancel_event.is_set():
+                    return None
+                self._progress(f"threads={threads} (llama-bench)")
+                by_threads.append(self.measure(dict(best, threads=threads, threads_batch=threads)))
+            best["threads"] = max(by_threads, key=lambda r: r.gen_tps or 0.0).params["threads"]
+            best["threads_batch"] = max(by_threads, key=lambda r: r.prompt_tps or 0.0).params["threads"]
+        else:
+            value = sweep(self.threads, lambda p, v: p.update(threads=v, threads_batch=v), "gen_tps", "threads")
+            if value is None:
+                return None
+            best["threads"] = best["threads_batch"] = value
+            value = sweep(self.threads, lambda p, v: p.update(threads_batch=v), "prompt_tps", "threads-batch")
+            if value is None:
+                return None
+            best["threads_batch"] = value
+
+        value = sweep(self.batches, lambda p, v: p.update(batch_size=v[0], ubatch_size=v[1]), "prompt_tps",
+                      "batch/ubatch")
+        if value is None:
+            return None
+        best["batch_size"], best["ubatch_size"] = value
+
+        # Todas las opciones de --parallel se miden con el servidor para poder compararlas
+        value = sweep(self.parallels, lambda p, v: p.update(parallel=v), "gen_tps", "parallel", server=True)
+        if value is None:
+            return None
+        best["parallel"] = value
+
+        final = [r for r in self.results if r.params == best]
+        profile = dict(best)
+        if final:
+            profile["prompt_tps"] = final[-1].prompt_tps
+            profile["gen_tps"] = final[-1].gen_tps
+        profile["tuned_at"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        profile["method"] = "llama-bench" if self.llama_bench else "llama-server"
+        save_tuned_profile(self.model_path, profile)
+        logging.getLogger(__name__).info(f"Autotune de {self.model_path}: {profile}")
+        return profile
+
+    def measure(self, params, server=False):
+        """Mide una combinación de parámetros; guarda y devuelve el TrialResult
+
+        Args:
+            params: threads, threads_batch, batch_size, ubatch_size y parallel
+            server: Medir con llama-server aunque haya llama-bench (necesario para --parallel)
+        """
+        if self.llama_bench and not server:
+            prompt_tps, gen_tps = self._measure_llama_bench(params)
+        else:
+            prompt_tps, gen_tps = self._measure_server(params)
+        result = TrialResult(dict(params), prompt_tps, gen_tps)
+        self.results.append(result)
+        logging.getLogger(__name__).info(f"Autotune {params}: prompt {prompt_tps} t/s, generación {gen_tps} t/s")
+        return result
+
+    def _measure_llama_bench(self, params):
+        cmd = [
+            self.llama_bench,
+            "-m", self.model_path,
+            "-t", str(params["threads"]),
+            "-b", str(params["batch_size"]),
+            "-ub", str(params["ubatch_size"]),
+            "-p", str(self.prompt_tokens),
+            "-n", str(self.gen_tokens),
+            "-r", "1",
+            "-o", "json",
+        ]
+        # llama-bench solo entiende algunos de los argumentos del servidor
+        for flag in ("--n-gpu-layers", "-ngl"):
+            if flag in self.base_args:
+                cmd += ["-ngl", self.base_args[self.base_args.index(flag) + 1]]
+        output = subprocess.run(cmd, capture_output=True, text=True, timeout=TRIAL_LOAD_TIMEOUT, check=True)
+        return parse_llama_bench_output(output.stdout)
+
+    def server_args(self, params):
+        return self.base_args + [
+            "--threads", str(params["threads"]),
+            "--threads-batch", str(params["threads_batch"]),
+            "--batch-size", str(params["batch_size"]),
+            "--ubatch-size", str(params["ubatch_size"]),
+            "--parallel", str(params["parallel"]),
+        ]
+
+    def _measure_server(self, params):
+        instance = ServerInstance(self.model_path, find_free_port(), self.server_args(params),
+                                  bin_base=self.bin_base, name="autotune", host="127.0.0.1")
+        if not instance.start():
+            raise RuntimeError("No se pudo lanzar llama-server para la prueba")
+        try:
+            deadline = time.monotonic() + TRIAL_LOAD_TIMEOUT
+            while instance.state not in (STATE_READY, STATE_EXITED, STATE_FAILED):
+                if self.cancel_event.is_set() or time.monotonic() > deadline:
+                    return None, None
+                time.sleep(0.1)
+            if instance.state != STATE_READY:
+                return None, None  # Combinación no válida (p. ej. sin memoria): se descarta
+            return self._run_completions(instance.port, params["parallel"])
+        finally:
+            instance.stop()
+
+    def _run_completions(self, port, parallel):
+        """Lanza `parallel` peticiones simultáneas y mide la velocidad total"""
+        # Aproximadamente un token por palabra corta
+        prompt = " ".join(["hola"] * self.prompt_tokens)
+        timings = []
+
+        def request():
+            payload = json.dumps({"prompt": prompt, "n_predict": self.gen_tokens, "cache_prompt": False,
+                                  "ignore_eos": True}).encode()
+            req = urllib.request.Request(f"http://127.0.0.1:{port}/completion", data=payload,
+                                         headers={"Content-Type": "application/json"})
+            with urllib.request.urlopen(req, timeout=TRIAL_LOAD_TIMEOUT) as response:
+                timings.append(json.load(response).get("timings", {}))
+
+        workers = [threading.Thread(target=request) for _ in range(parallel)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        if len(timings) < parallel:
+            return None, None
+        prompt_tps = sum(t.get("prompt_per_second", 0.0) for t in timings) / len(timings)
+        # Misma medida para cualquier --parallel: tokens generados por todas las peticiones
+        # entre la fase de generación más larga (sin el prompt ni la latencia HTTP); con una
+        # sola petición coincide con su predicted_per_second
+        tokens = sum(t.get("predicted_n", self.gen_tokens) for t in timings)
+        decode_ms = max(self._decode_ms(t) for t in timings)
+        gen_tps = tokens / (decode_ms / 1000) if decode_ms else None
+        return prompt_tps, gen_tps
+
+    def _decode_ms(self, timings):
+        """Duración de la generación de una petición (de predicted_per_second si falta predicted_ms)"""
+        if timings.get("predicted_ms"):
+            return timings["predicted_ms"]
+        per_second = timings.get("predicted_per_second")
+        return timings.get("predicted_n", self.gen_tokens) / per_second * 1000 if per_second else 0.0
+
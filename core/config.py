@@ -1,17 +1,20 @@
 # Lectura y escritura de configuración
 import os
-import logging
 import json
+import atexit
+import logging
+import threading
 
 # Guardar la configuración siempre en ~/.llama-server-gui/.llama-server-config.json
 CONFIG_FILE = os.path.expanduser("~/.llama-server-gui/.llama-server-config.json")
 
 DEFAULT_CONFIG = {
-    "models_dir": "",
+    "models_dir": "",  # Una o varias rutas raíz separadas por ":" (se recorren recursivamente)
+    "models_scan_timeout": "30",  # Segundos máximos para recorrer cada raíz de modelos
     "bin_base": "",
     "ngl": "40",
     "port": "8080",
-    "prompt": "",
+    "prompt": "",  # Prefijo de sistema compartido: se precarga tras arrancar y su caché KV se guarda en disco
     "temp": "0.8",
     "top_k": "40",
     "top_p": "0.9",
@@ -19,44 +22,208 @@ DEFAULT_CONFIG = {
     "threads": str(int(os.cpu_count() / 2 or 4)),
     "ctx_size": "4096",
     "max_tokens": "512",
+    "log_max_lines": "5000",  # Líneas que conserva el panel de salida del servidor
+    "log_max_mb": "64",  # Tamaño de cada fragmento del registro en disco antes de rotar
+    "log_max_files": "50",  # Fragmentos de registro que se conservan en ~/.llama-server-gui/logs
+    "log_compress": "false",  # Comprimir con gzip los fragmentos ya cerrados
+    "watchdog": "true",  # Reiniciar automáticamente las instancias que se caen o se cuelgan
+    "watchdog_hang_timeout": "30",  # Segundos sin respuesta de /health para dar una instancia por colgada
+    "watchdog_max_restarts": "5",  # Caídas en 5 minutos tras las que se deja de reiniciar
+    "stop_grace": "5",  # Segundos entre SIGTERM y SIGKILL al detener un servidor
+    "drain_timeout": "30",  # Segundos máximos de espera a que terminen las peticiones en curso al detener (0: no esperar)
+    "warmup": "true",  # Enviar peticiones de calentamiento antes de dar el servidor por listo
+    "warmup_prompts": "Hola|Resume en una frase qué es un modelo de lenguaje.|Cuenta del uno al diez.",  # Separadas por "|"
+    "warmup_tokens": "16",  # Tokens que genera cada petición de calentamiento
+    "model_prefetch": "false",  # Leer en segundo plano el modelo seleccionado a la caché de páginas del sistema
+    "gpu_offload": "auto",  # Descontar de la RAM las capas de --n-gpu-layers: auto (si se detecta GPU), true o false
+    "memory_mode": "auto",  # Carga del modelo: auto (según la memoria libre), mlock, mmap o no-mmap
+    "ctx_auto_fit": "true",  # Reducir --ctx-size al mayor contexto que cabe en memoria
+    "proxy_port": "8000",  # Puerto único del proxy de reparto entre réplicas
+    "proxy_enabled": "false",  # Arrancar el proxy al abrir la aplicación
     "language": "en",  # Idioma por defecto: inglés
     "theme": "system"  # Tema por defecto: sistema
 }
 
-def save_config(models_dir, bin_base, ngl, port, prompt, temp, top_k, top_p, repeat_penalty, threads, ctx_size, max_tokens, language="es", theme="system"):
-    config = {
-        "models_dir": models_dir,
-        "bin_base": bin_base,
-        "ngl": ngl,
-        "port": port,
-        "prompt": prompt,
-        "temp": temp,
-        "top_k": top_k,
-        "top_p": top_p,
-        "repeat_penalty": repeat_penalty,
-        "threads": threads,
-        "ctx_size": ctx_size,
-        "max_tokens": max_tokens,
-        "language": language,
-        "theme": theme
-    }
-    try:
-        with open(CONFIG_FILE, "w") as f:
-            json.dump(config, f, indent=2, ensure_ascii=False)
-        logging.getLogger(__name__).info(f"Configuration saved to {CONFIG_FILE}")
-    except Exception as e:
-        logging.getLogger(__name__).error(f"Failed to save configuration to {CONFIG_FILE}: {e}")
+# Versión del formato del fichero
+#   1: diccionario plano con las claves de DEFAULT_CONFIG
+#   2: {"version": 2, "settings": {...}, "models": {"modelo.gguf": {...}}}
+CONFIG_VERSION = 2
+
+# Segundos que se esperan antes de escribir, para agrupar cambios seguidos
+SAVE_DELAY = 0.5
+
+
+def _migrate(data):
+    """Convierte el contenido del fichero al formato actual"""
+    if not isinstance(data, dict):
+        raise ValueError("la configuración no es un objeto JSON")
+    if "version" not in data:
+        # Versión 1: las claves estaban en la raíz
+        return {"version": CONFIG_VERSION, "settings": dict(data), "models": {}}
+    if data["version"] > CONFIG_VERSION:
+        logging.getLogger(__name__).warning(
+            f"Configuration version {data['version']} is newer than supported ({CONFIG_VERSION})")
+    data.setdefault("settings", {})
+    data.setdefault("models", {})
+    data["version"] = CONFIG_VERSION
+    return data
+
+
+class ConfigStore:
+    """Configuración de la aplicación en memoria con guardado diferido y atómico
+
+    - Ajustes globales: las claves de DEFAULT_CONFIG (siempre como texto). Las
+      claves desconocidas (p. ej. editadas a mano) se conservan al guardar.
+    - Secciones por modelo: diccionarios libres indexados por el nombre del fichero
+      .gguf (los usa, por ejemplo, core.launch_profile para los perfiles).
+
+    Los cambios se guardan SAVE_DELAY segundos después del último, desde un hilo
+    temporizador, escribiendo a un temporal que se renombra sobre el original: un
+    cierre inesperado deja el fichero anterior o el nuevo, nunca uno a medias.
+    Todos los métodos se pueden llamar desde cualquier hilo sin bloquear la interfaz.
+    """
+
+    def __init__(self, path=CONFIG_FILE, save_delay=SAVE_DELAY):
+        self.path = path
+        self.save_delay = save_delay
+        self.lock = threading.RLock()
+        self.write_lock = threading.Lock()  # Serializa las escrituras en disco
+        self.snapshots = 0  # Instantáneas tomadas para guardar (numeradas en orden)
+        self.written = 0  # Número de la última instantánea escrita en disco
+        self.timer = None
+        self.dirty = False
+        self.settings = {}
+        self.models = {}
+        self.load()
+
+    def load(self):
+        """(Re)carga el fichero; si no existe o está dañado se usan los valores por defecto"""
+        data = {"version": CONFIG_VERSION, "settings": {}, "models": {}}
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    data = _migrate(json.load(f))
+                logging.getLogger(__name__).info(f"Loaded configuration from {self.path}")
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Failed to load configuration from {self.path}: {e}")
+        else:
+            logging.getLogger(__name__).info("Using default configuration")
+        with self.lock:
+            self.settings = {**DEFAULT_CONFIG, **{k: str(v) for k, v in data["settings"].items()}}
+            self.models = data["models"]
+            self.dirty = False
+
+    def get(self, key, default=None):
+        with self.lock:
+            return self.settings.get(key, default)
+
+    def as_dict(self):
+        """Copia de los ajustes globales"""
+        with self.lock:
+            return dict(self.settings)
+
+    def update(self, values):
+        """Cambia varios ajustes globales y programa el guardado"""
+        with self.lock:
+            changed = False
+            for key, value in values.items():
+                if key not in DEFAULT_CONFIG:
+                    logging.getLogger(__name__).warning(f"Unknown configuration key: {key}")
+                value = "" if value is None else str(value)
+                if self.settings.get(key) != value:
+                    self.settings[key] = value
+                    changed = True
+            if changed:
+                self._schedule_save()
+
+    def set(self, key, value):
+        self.update({key: value})
+
+    def model_section(self, model_key):
+        """Copia de la sección de un modelo (diccionario vacío si no tiene)"""
+        with self.lock:
+            return json.loads(json.dumps(self.models.get(model_key, {})))
+
+    def update_model_section(self, model_key, values):
+        """Reemplaza claves de la sección de un modelo (None borra la clave)"""
+        with self.lock:
+            section = self.models.setdefault(model_key, {})
+            for key, value in values.items():
+                if value is None:
+                    section.pop(key, None)
+                else:
+                    section[key] = json.loads(json.dumps(value))
+            if not section:
+                del self.models[model_key]
+            self._schedule_save()
+
+    def _schedule_save(self):
+        self.dirty = True
+        if self.timer is not None:
+            self.timer.cancel()
+        if self.save_delay <= 0:
+            self.timer = None
+            self.flush()
+            return
+        self.timer = threading.Timer(self.save_delay, self.flush)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def flush(self):
+        """Escribe ya los cambios pendientes (también se llama al salir)"""
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            if not self.dirty:
+                return
+            text = json.dumps({"version": CONFIG_VERSION, "settings": self.settings, "models": self.models},
+                              indent=2, ensure_ascii=False)
+            self.dirty = False
+            self.snapshots += 1
+            snapshot = self.snapshots
+        failed = False
+        with self.write_lock:
+            if snapshot < self.written:
+                return  # Otro hilo ya escribió una instantánea posterior: esta sobrescribiría sus cambios
+            try:
+                os.makedirs(os.path.dirname(self.path), exist_ok=True)
+                tmp_file = f"{self.path}.tmp"
+                with open(tmp_file, "w") as f:
+                    f.write(text)
+                    f.flush()
+                    os.fsync(f.fileno())
+                os.replace(tmp_file, self.path)
+                self.written = snapshot
+                logging.getLogger(__name__).info(f"Configuration saved to {self.path}")
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Failed to save configuration to {self.path}: {e}")
+                failed = True
+        if failed:
+            # Fuera de write_lock: update() puede llamar a flush() con self.lock tomado
+            with self.lock:
+                self.dirty = True
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_config_store():
+    """Almacén de configuración compartido por toda la aplicación"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ConfigStore()
+            atexit.register(_store.flush)
+        return _store
+
 
 def load_config():
-    config = DEFAULT_CONFIG.copy()
-    if os.path.exists(CONFIG_FILE):
-        try:
-            with open(CONFIG_FILE, "r") as f:
-                user_config = json.load(f)
-                config.update(user_config)
-            logging.getLogger(__name__).info(f"Loaded configuration from {CONFIG_FILE}")
-        except Exception as e:
-            logging.getLogger(__name__).error(f"Failed to load configuration from {CONFIG_FILE}: {e}")
-    else:
-        logging.getLogger(__name__).info("Using default configuration")
-    return config
+    """Copia de los ajustes globales (con los valores por defecto para lo que falte)"""
+    return get_config_store().as_dict()
+
+
+def update_config(values):
+    """Cambia los ajustes indicados; el guardado en disco se hace en segundo plano"""
+    get_config_store().update(values)
@@ -0,0 +1,248 @@
+# Modo sin interfaz: un demonio con el supervisor de instancias y una API de control local
+#
+#   python3 -m core.daemon [--socket RUTA]      (o gtk_llama_gui.py --daemon)
+#
+# La API es JSON por líneas sobre un socket Unix (solo accesible para el usuario):
+# cada petición es un objeto {"cmd": "...", ...parámetros} en una línea y la
+# respuesta es {"ok": true, ...} o {"ok": false, "error": "..."} en otra.
+import os
+import sys
+import json
+import signal
+import socket
+import logging
+import argparse
+import threading
+import socketserver
+from core.llama_server import ServerSupervisor
+
+# Socket de control por defecto (junto a la configuración)
+DAEMON_SOCKET = os.path.expanduser("~/.llama-server-gui/daemon.sock")
+
+# Argumentos de ServerInstance que se aceptan en "create" (además de modelo, argumentos, puerto y watchdog)
+INSTANCE_OPTIONS = ("bin_base", "name", "host", "settings", "log_max_lines", "log_options", "stop_grace",
+                    "drain_timeout", "prompt_prefix", "warmup")
+
+# Líneas de salida que devuelve "logs" si no se indica otra cantidad
+DEFAULT_TAIL_LINES = 100
+
+
+class DaemonError(Exception):
+    """Error de la API de control (petición no válida o demonio inaccesible)"""
+
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        for raw in self.rfile:
+            if not raw.strip():
+                continue
+            try:
+                request = json.loads(raw)
+                if not isinstance(request, dict):
+                    raise ValueError("se esperaba un objeto JSON")
+                response = self.server.control.dispatch(request)
+            except ValueError as e:
+                response = {"ok": False, "error": f"Petición no válida: {e}"}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+
+
+class _UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+
+
+class ControlServer:
+    """API de control de un ServerSupervisor sobre un socket Unix
+
+    Órdenes: ping, status, create, start, stop, swap, remove, stop_all, log, logs,
+    metrics, poll (estado y salida nueva de todas las instancias de una vez) y
+    shutdown. Cada orden es un método cmd_<orden> que recibe los parámetros de
+    la petición y devuelve un diccionario serializable.
+    """
+
+    def __init__(self, supervisor, path=DAEMON_SOCKET, on_shutdown=None):
+        """
+        Args:
+            supervisor: ServerSupervisor cuyas instancias se controlan
+            path: Ruta del socket Unix
+            on_shutdown: Callback() cuando un cliente pide detener el demonio
+        """
+        self.supervisor = supervisor
+        self.path = path
+        self.on_shutdown = on_shutdown
+        self.server = None
+        self.thread = None
+
+    def start(self):
+        """Crea el socket y empieza a atender peticiones en un hilo
+
+        Raises:
+            DaemonError: Si ya hay otro demonio escuchando en la misma ruta
+        """
+        if os.path.exists(self.path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.path)
+                raise DaemonError(f"Ya hay un demonio escuchando en {self.path}")
+            except OSError:
+                os.unlink(self.path)  # Socket de un demonio que ya no existe
+            finally:
+                probe.close()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        old_umask = os.umask(0o177)  # Solo el usuario puede conectarse
+        try:
+            self.server = _UnixServer(self.path, _RequestHandler)
+        finally:
+            os.umask(old_umask)
+        self.server.control = self
+        self.thread = threading.Thread(target=self.server.serve_forever, name="daemon-control", daemon=True)
+        self.thread.start()
+        logging.getLogger(__name__).info(f"API de control escuchando en {self.path}")
+
+    def stop(self):
+        if self.server is None:
+            return
+        self.server.shutdown()
+        self.server.server_close()
+        self.server = None
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def dispatch(self, request):
+        """Ejecuta una petición y devuelve la respuesta"""
+        params = dict(request)
+        command = params.pop("cmd", None)
+        handler = getattr(self, f"cmd_{command}", None) if isinstance(command, str) else None
+        if handler is None:
+            return {"ok": False, "error": f"Orden desconocida: {command}"}
+        try:
+            result = handler(**params)
+        except (DaemonError, RuntimeError, TypeError, ValueError, OSError) as e:
+            return {"ok": False, "error": str(e)}
+        except Exception as e:
+            logging.getLogger(__name__).exception(f"Error en la orden {command}")
+            return {"ok": False, "error": str(e)}
+        return {"ok": True, **(result or {})}
+
+    def _instance(self, id):
+        instance = self.supervisor.get(int(id))
+        if instance is None:
+            raise DaemonError(f"La instancia {id} no existe")
+        return instance
+
+    def cmd_ping(self):
+        return {"pid": os.getpid()}
+
+    def cmd_status(self):
+        return {"instances": [instance.describe() for instance in self.supervisor.list()]}
+
+    def cmd_create(self, model_path, args=None, port=None, watchdog=None, start=False, **options):
+        unknown = set(options) - set(INSTANCE_OPTIONS)
+        if unknown:
+            raise DaemonError(f"Opciones desconocidas: {', '.join(sorted(unknown))}")
+        instance = self.supervisor.create_instance(model_path, args, port=port, watchdog=watchdog, **options)
+        started = instance.start() if start else False
+        return {"instance": instance.describe(), "started": started}
+
+    def cmd_start(self, id):
+        instance = self._instance(id)
+        started = instance.start()
+        return {"instance": instance.describe(), "started": started}
+
+    def cmd_stop(self, id, wait=True, grace=None, drain=None):
+        """Detiene la instancia (drenándola antes si procede); con wait=False responde sin esperar"""
+        instance = self._instance(id)
+        stopped = instance.stop(wait=bool(wait), grace=None if grace is None else float(grace),
+                                drain=None if drain is None else float(drain))
+        return {"instance": instance.describe(), "stopped": stopped}
+
+    def cmd_swap(self, id, model_path, args=None, settings=None):
+        """Empieza a cambiar el modelo de la instancia sin cortes (ver ServerSupervisor.swap)
+
+        Responde con la instancia nueva en cuanto se lanza; la anterior se retira
+        cuando la nueva está lista.
+        """
+        new = self.supervisor.swap(int(id), model_path, args, settings, wait=False)
+        return {"instance": new.describe()}
+
+    def cmd_remove(self, id):
+        """Retira la instancia (si está en marcha, se detiene en segundo plano, drenándola si procede)"""
+        return {"removed": self.supervisor.remove(int(id), wait=False)}
+
+    def cmd_stop_all(self):
+        self.supervisor.stop_all()
+        return self.cmd_status()
+
+    def cmd_log(self, id, text):
+        """Añade un mensaje propio a la salida de la instancia (como ServerInstance.log)"""
+        self._instance(id).log(str(text))
+        return {}
+
+    def cmd_logs(self, id, lines=DEFAULT_TAIL_LINES, since=None):
+        """Últimas líneas de salida, o las nuevas desde la posición `since`"""
+        buffer = self._instance(id).log_buffer
+        if since is None:
+            return {"lines": buffer.tail(int(lines)), "next": buffer.total, "dropped": 0}
+        new_lines, cursor, dropped = buffer.since(int(since), int(lines))
+        return {"lines": new_lines, "next": cursor, "dropped": dropped}
+
+    def cmd_metrics(self, id):
+        return {"metrics": self._instance(id).metrics.snapshot()}
+
+    def cmd_poll(self, cursors=None):
+        """Estado de todas las instancias y la salida nueva de cada una
+
+        Args:
+            cursors: {id: posición} devuelta por el poll anterior (las instancias
+                que no aparecen empiezan desde lo más antiguo que se conserva)
+        """
+        cursors = cursors or {}
+        instances = self.supervisor.list()
+        logs = {}
+        for instance in instances:
+            lines, cursor, dropped = instance.log_buffer.since(int(cursors.get(str(instance.id), 0)))
+            logs[str(instance.id)] = {"lines": lines, "next": cursor, "dropped": dropped}
+        return {"instances": [instance.describe() for instance in instances], "logs": logs}
+
+    def cmd_shutdown(self):
+        if self.on_shutdown is not None:
+            threading.Thread(target=self.on_shutdown, daemon=True).start()
+        return {}
+
+
+def run_daemon(path=DAEMON_SOCKET):
+    """Arranca el demonio y espera hasta SIGTERM/SIGINT o la orden shutdown
+
+    Al terminar se detienen todas las instancias que gestiona.
+    """
+    supervisor = ServerSupervisor()
+    stop_event = threading.Event()
+    server = ControlServer(supervisor, path, on_shutdown=stop_event.set)
+    server.start()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop_event.set())
+    try:
+        while not stop_event.wait(1.0):
+            pass
+    finally:
+        logging.getLogger(__name__).info("Deteniendo el demonio y sus instancias")
+        server.stop()
+        supervisor.stop_all()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Demonio de LLaMA Server GUI (sin interfaz gráfica)")
+    parser.add_argument("--socket", default=DAEMON_SOCKET, help="Ruta del socket de control")
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(name)s: %(message)s")
+    try:
+        run_daemon(args.socket)
+    except DaemonError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,393 @@
+# Cliente de la API de control del demonio (core.daemon)
+#
+# RemoteSupervisor ofrece la misma interfaz que ServerSupervisor, de modo que la
+# ventana puede gestionar las instancias del demonio como si fueran locales: los
+# servidores siguen funcionando aunque se cierre la interfaz.
+#
+#   python3 -m core.daemon_client [--socket RUTA] status | logs ID | metrics ID | start ID | stop ID | shutdown
+import sys
+import json
+import time
+import socket
+import logging
+import threading
+from core.daemon import DAEMON_SOCKET, DaemonError
+from core.llama_server import (ServerSupervisor, STATE_STARTING, STATE_WARMING, STATE_READY, STATE_DRAINING,
+                               STATE_STOPPING, STATE_RESTARTING)
+from core.log_buffer import LogRingBuffer, DEFAULT_MAX_LINES
+from core.metrics import MetricsTracker
+
+# Segundos entre consultas del estado y la salida de las instancias
+POLL_INTERVAL = 0.5
+
+USAGE = "Uso: python3 -m core.daemon_client [--socket RUTA] status | logs ID | metrics ID | start ID | stop ID | remove ID | shutdown"
+
+
+class DaemonClient:
+    """Cliente de la API JSON por líneas del demonio (una conexión por petición)"""
+
+    def __init__(self, path=DAEMON_SOCKET, timeout=30.0):
+        self.path = path
+        self.timeout = timeout
+
+    def call(self, cmd, **params):
+        """Envía una orden y devuelve la respuesta
+
+        Raises:
+            DaemonError: Si no se puede conectar o el demonio responde con un error
+        """
+        try:
+            with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+                sock.settimeout(self.timeout)
+                sock.connect(self.path)
+                sock.sendall((json.dumps({"cmd": cmd, **params}) + "\n").encode("utf-8"))
+                with sock.makefile("rb") as stream:
+                    raw = stream.readline()
+        except OSError as e:
+            raise DaemonError(f"No se pudo conectar con el demonio en {self.path}: {e}")
+        if not raw:
+            raise DaemonError("El demonio cerró la conexión sin responder")
+        response = json.loads(raw)
+        if not response.pop("ok", False):
+            raise DaemonError(response.get("error", "Error desconocido"))
+        return response
+
+    def is_running(self):
+        try:
+            self.call("ping")
+            return True
+        except DaemonError:
+            return False
+
+
+class RemoteWatchdog:
+    """Vista del watchdog de una instancia del demonio (a partir de Watchdog.describe)"""
+
+    def __init__(self, info):
+        self.update(info)
+
+    def update(self, info):
+        self.info = info
+        self.gave_up = info.get("gave_up", False)
+        self.restarts = info.get("restarts", 0)
+        self.next_restart_delay = info.get("next_restart_delay")
+
+    def describe(self):
+        return dict(self.info)
+
+
+class RemoteInstance:
+    """Instancia del demonio con la interfaz de ServerInstance que usa la ventana
+
+    La salida llega por RemoteSupervisor.poll(); las métricas se calculan en local
+    a partir de esas mismas líneas.
+    """
+
+    def __init__(self, supervisor, info, log_max_lines=DEFAULT_MAX_LINES):
+        self.supervisor = supervisor
+        self.id = info["id"]
+        self.log_buffer = LogRingBuffer(log_max_lines)
+        self.metrics = MetricsTracker()
+        self.cursor = 0  # Posición en la salida del demonio
+        self.state = info["state"]
+        self.state_listeners = []
+        self.output_listeners = []
+        self.watchdog = None
+        self.stop_waiters = []  # (evento, callback) de stop() pendientes
+        self.lock = threading.Lock()
+        self.update(info)
+
+    def update(self, info):
+        """Aplica el resumen (ServerInstance.describe) recibido del demonio"""
+        self.info = info
+        self.name = info["name"]
+        self.model_path = info["model"]
+        self.port = info["port"]
+        self.args = info.get("args", [])
+        self.exit_code = info.get("exit_code")
+        self.ready_seconds = info.get("ready_seconds")
+        self.previous_ready_seconds = info.get("previous_ready_seconds")
+        self.drain_timeout = info.get("drain_timeout", 0)
+        self.warmup_report = info.get("warmup")
+        watchdog = info.get("watchdog")
+        if watchdog is None:
+            self.watchdog = None
+        elif self.watchdog is None:
+            self.watchdog = RemoteWatchdog(watchdog)
+        else:
+            self.watchdog.update(watchdog)
+        if info["state"] == STATE_STARTING and self.state != STATE_STARTING:
+            self.metrics = MetricsTracker()  # Nueva sesión del servidor, como en ServerInstance.start
+        self._set_state(info["state"])
+        if not self.is_running():
+            self._notify_stopped()
+
+    def feed(self, lines):
+        for line in lines:
+            self.metrics.feed(line)
+            self.log_buffer.append(line)
+            for callback in list(self.output_listeners):
+                callback(self, line)
+
+    def add_state_listener(self, callback):
+        self.state_listeners.append(callback)
+
+    def add_output_listener(self, callback):
+        self.output_listeners.append(callback)
+
+    def _set_state(self, state):
+        with self.lock:
+            if self.state == state:
+                return
+            self.state = state
+        for callback in list(self.state_listeners):
+            try:
+                callback(self)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Error en oyente de estado: {e}")
+
+    def is_running(self):
+        return self.state in (STATE_STARTING, STATE_WARMING, STATE_READY, STATE_DRAINING, STATE_STOPPING,
+                              STATE_RESTARTING)
+
+    def log(self, text):
+        self.supervisor.client.call("log", id=self.id, text=text)
+
+    def start(self):
+        response = self.supervisor.client.call("start", id=self.id)
+        self.update(response["instance"])
+        return response["started"]
+
+    def stop(self, wait=True, on_stopped=None, grace=None, drain=None):
+        """Detiene la instancia en el demonio (mismos argumentos que ServerInstance.stop)
+
+        La petición vuelve enseguida; el fin de la detención (que puede incluir el
+        drenado) llega con el poll que ve la instancia detenida.
+        """
+        done = threading.Event()
+        waiter = (done, on_stopped)
+        with self.lock:
+            self.stop_waiters.append(waiter)
+        try:
+            response = self.supervisor.client.call("stop", id=self.id, wait=False, grace=grace, drain=drain)
+        except DaemonError:
+            with self.lock:
+                self.stop_waiters.remove(waiter)
+            raise
+        self.update(response["instance"])
+        if wait:
+            done.wait()
+        return True
+
+    def _notify_stopped(self):
+        with self.lock:
+            waiters, self.stop_waiters = self.stop_waiters, []
+        for done, on_stopped in waiters:
+            done.set()
+            if on_stopped is not None:
+                on_stopped(True)
+
+    def describe(self):
+        return dict(self.info)
+
+
+class RemoteSupervisor:
+    """ServerSupervisor cuyas instancias viven en el demonio
+
+    Un hilo consulta periódicamente el estado y la salida nueva de todas las
+    instancias (orden "poll") y notifica a los oyentes igual que el supervisor local.
+    """
+
+    def __init__(self, client, poll_interval=POLL_INTERVAL):
+        self.client = client
+        self.poll_interval = poll_interval
+        self.instances = {}
+        self.lock = threading.Lock()
+        self.listeners = []
+        self.stop_event = threading.Event()
+        self.connected = True
+        self.poll()
+        self.thread = threading.Thread(target=self._run, name="daemon-poll", daemon=True)
+        self.thread.start()
+
+    def add_listener(self, callback):
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _notify(self, event, instance):
+        for callback in list(self.listeners):
+            try:
+                callback(event, instance)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Error en oyente del supervisor: {e}")
+
+    def _track(self, info):
+        """Instancia local para el resumen recibido (la crea si es nueva)"""
+        with self.lock:
+            instance = self.instances.get(info["id"])
+            is_new = instance is None
+            if is_new:
+                instance = RemoteInstance(self, info)
+                instance.add_state_listener(lambda inst: self._notify("state", inst))
+                self.instances[instance.id] = instance
+        if is_new:
+            self._notify("added", instance)
+        else:
+            instance.update(info)
+        return instance
+
+    def _forget(self, instance_id):
+        with self.lock:
+            instance = self.instances.pop(instance_id, None)
+        if instance is not None:
+            self._notify("removed", instance)
+        return instance is not None
+
+    def poll(self):
+        """Sincroniza estado y salida de todas las instancias con el demonio"""
+        with self.lock:
+            cursors = {str(inst.id): inst.cursor for inst in self.instances.values()}
+        response = self.client.call("poll", cursors=cursors)
+        seen = set()
+        for info in response["instances"]:
+            instance = self._track(info)
+            seen.add(instance.id)
+            entry = response["logs"].get(str(instance.id))
+            if entry:
+                instance.feed(entry["lines"])
+                instance.cursor = entry["next"]
+        # Solo se olvidan las que ya se conocían al pedir el poll: una creada mientras
+        # tanto aún no podía aparecer en la respuesta
+        for instance_id in [int(i) for i in cursors if int(i) not in seen]:
+            self._forget(instance_id)
+
+    def _run(self):
+        while not self.stop_event.wait(self.poll_interval):
+            try:
+                self.poll()
+                if not self.connected:
+                    logging.getLogger(__name__).info("Conexión con el demonio recuperada")
+                self.connected = True
+            except DaemonError as e:
+                if self.connected:
+                    logging.getLogger(__name__).warning(f"Sin conexión con el demonio: {e}")
+                self.connected = False
+
+    def close(self):
+        """Deja de consultar al demonio (sus instancias siguen funcionando)"""
+        self.stop_event.set()
+
+    def used_ports(self):
+        with self.lock:
+            return {inst.port for inst in self.instances.values()}
+
+    def create_instance(self, model_path, args=None, port=None, watchdog=None, **kwargs):
+        """Crea (sin arrancar) una instancia en el demonio; mismos argumentos que ServerSupervisor
+
+        Raises:
+            RuntimeError: Si el demonio no puede crearla
+        """
+        try:
+            response = self.client.call("create", model_path=model_path, args=list(args or []), port=port,
+                                        watchdog=watchdog, **kwargs)
+        except DaemonError as e:
+            raise RuntimeError(str(e))
+        return self._track(response["instance"])
+
+    def get(self, instance_id):
+        with self.lock:
+            return self.instances.get(instance_id)
+
+    def list(self):
+        with self.lock:
+            return sorted(self.instances.values(), key=lambda inst: inst.id)
+
+    def start(self, instance_id):
+        instance = self.get(instance_id)
+        return instance.start() if instance else False
+
+    def stop(self, instance_id, wait=True, on_stopped=None, drain=None):
+        instance = self.get(instance_id)
+        return instance.stop(wait, on_stopped, drain=drain) if instance else False
+
+    def swap(self, instance_id, model_path, args=None, settings=None, wait=True):
+        """Cambia el modelo de una instancia del demonio sin cortes (ver ServerSupervisor.swap)
+
+        Raises:
+            RuntimeError: Si el demonio no puede lanzar la instancia nueva
+        """
+        try:
+            response = self.client.call("swap", id=instance_id, model_path=model_path, args=args,
+                                        settings=settings)
+        except DaemonError as e:
+            raise RuntimeError(str(e))
+        new = self._track(response["instance"])
+        # El cambio termina cuando el demonio retira una de las dos
+        while wait and self.get(instance_id) is not None and self.get(new.id) is not None:
+            time.sleep(self.poll_interval)
+        return new
+
+    def remove(self, instance_id, wait=True):
+        """Elimina una instancia del demonio; sin wait, la petición se hace en otro hilo"""
+        if not wait:
+            threading.Thread(target=self._remove_in_background, args=(instance_id,), daemon=True).start()
+            return True
+        if not self.client.call("remove", id=instance_id)["removed"]:
+            return False
+        return self._forget(instance_id)
+
+    def _remove_in_background(self, instance_id):
+        try:
+            self.remove(instance_id)
+        except DaemonError as e:
+            logging.getLogger(__name__).error(f"No se pudo eliminar la instancia {instance_id}: {e}")
+
+    def stop_all(self):
+        for info in self.client.call("stop_all")["instances"]:
+            self._track(info)
+
+
+def connect_supervisor(path=DAEMON_SOCKET):
+    """Supervisor para la interfaz: el del demonio si está en marcha, o uno local
+
+    Returns:
+        RemoteSupervisor o ServerSupervisor
+    """
+    client = DaemonClient(path)
+    if client.is_running():
+        try:
+            supervisor = RemoteSupervisor(client)
+            logging.getLogger(__name__).info(f"Conectado al demonio en {path}: la interfaz actúa como cliente")
+            return supervisor
+        except DaemonError as e:
+            logging.getLogger(__name__).warning(f"No se pudo usar el demonio: {e}")
+    return ServerSupervisor()
+
+
+def main(argv=None):
+    argv = sys.argv[1:] if argv is None else argv
+    path = DAEMON_SOCKET
+    if len(argv) >= 2 and argv[0] == "--socket":
+        path, argv = argv[1], argv[2:]
+    if not argv:
+        print(USAGE)
+        return 2
+    command, rest = argv[0], argv[1:]
+    params = {"id": int(rest[0])} if rest and command in ("logs", "metrics", "stop", "start", "remove") else {}
+    try:
+        response = DaemonClient(path).call(command, **params)
+    except DaemonError as e:
+        print(f"[ERROR] {e}", file=sys.stderr)
+        return 1
+    if command == "logs":
+        sys.stdout.write("".join(response["lines"]))
+    else:
+        print(json.dumps(response, indent=2, ensure_ascii=False))
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
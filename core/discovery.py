@@ -0,0 +1,153 @@
+# Búsqueda recursiva de modelos GGUF en varios directorios raíz, en segundo plano
+import os
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from core.model_index import get_model_index
+
+# Número de hilos que recorren directorios en paralelo
+DEFAULT_WORKERS = 4
+
+# Número de modelos a partir del cual se entrega un lote sin esperar al final del directorio
+BATCH_SIZE = 32
+
+# Tiempo máximo (segundos) para recorrer cada raíz, p. ej. en un recurso de red lento
+DEFAULT_ROOT_TIMEOUT = 30.0
+
+
+def split_roots(text):
+    """Convierte el texto del campo de modelos en una lista de raíces
+
+    Se admiten varias rutas separadas por os.pathsep (":" en Linux).
+    """
+    roots = []
+    for part in (text or "").split(os.pathsep):
+        part = part.strip()
+        if part:
+            root = os.path.abspath(os.path.expanduser(part))
+            if root not in roots:
+                roots.append(root)
+    return roots
+
+
+class ModelDiscovery:
+    """Recorre varias raíces con un pool de hilos os.scandir y entrega los modelos por lotes
+
+    Cada directorio es una tarea independiente del pool, así que un árbol grande se
+    reparte entre los hilos y los primeros resultados llegan en cuanto se lee el
+    primer directorio. Los callbacks se ejecutan en los hilos del pool.
+    """
+
+    def __init__(self, on_batch, on_root_done=None, on_finished=None,
+                 max_workers=DEFAULT_WORKERS, root_timeout=DEFAULT_ROOT_TIMEOUT, index=None, on_directory=None):
+        """
+        Args:
+            on_batch: Callback(root, entries) con una lista de (ruta, info_del_índice)
+            on_root_done: Callback(root, paths, timed_out) al terminar cada raíz
+            on_directory: Callback(root, directorio) por cada directorio que se recorre
+                (también los que no tienen modelos, p. ej. para vigilarlos)
+            on_finished: Callback() cuando han terminado todas las raíces
+            max_workers: Número de hilos del pool
+            root_timeout: Segundos máximos por raíz (None para no limitar)
+            index: Índice de modelos (por defecto, el compartido)
+        """
+        self.on_batch = on_batch
+        self.on_root_done = on_root_done
+        self.on_directory = on_directory
+        self.on_finished = on_finished
+        self.max_workers = max_workers
+        self.root_timeout = root_timeout
+        self.index = index or get_model_index()
+        self.cancelled = threading.Event()
+        self.lock = threading.Lock()
+        self.executor = None
+        self.roots = {}
+
+    def start(self, roots):
+        """Empieza a recorrer las raíces indicadas (no bloquea)"""
+        if not roots:
+            if self.on_finished:
+                self.on_finished()
+            return
+        self.executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="model-scan")
+        now = time.monotonic()
+        for root in roots:
+            self.roots[root] = {
+                "deadline": now + self.root_timeout if self.root_timeout else None,
+                "pending": 1,
+                "paths": [],
+                "timed_out": False,
+            }
+        for root in roots:
+            self.executor.submit(self._scan_dir, root, root)
+        logging.getLogger(__name__).info(f"Buscando modelos en {len(roots)} raíces")
+
+    def cancel(self):
+        """Detiene la búsqueda: las tareas pendientes terminan sin entregar resultados"""
+        self.cancelled.set()
+        if self.executor is not None:
+            self.executor.shutdown(wait=False, cancel_futures=True)
+
+    def _scan_dir(self, root, directory):
+        state = self.roots[root]
+        batch = []
+        try:
+            if self.cancelled.is_set():
+                return
+            if state["deadline"] is not None and time.monotonic() > state["deadline"]:
+                state["timed_out"] = True
+                return
+            with os.scandir(directory) as it:
+                if self.on_directory:
+                    self.on_directory(root, directory)
+                for entry in it:
+                    if self.cancelled.is_set():
+                        return
+                    try:
+                        if entry.is_dir(follow_symlinks=False):
+                            if not entry.name.startswith("."):
+                                with self.lock:
+                                    state["pending"] += 1
+                                self.executor.submit(self._scan_dir, root, entry.path)
+                        elif entry.name.endswith(".gguf") and entry.is_file():
+                            batch.append((entry.path, self.index.get(entry.path, entry.stat())))
+                            if len(batch) >= BATCH_SIZE:
+                                self._deliver(root, batch)
+                                batch = []
+                    except (OSError, RuntimeError) as e:
+                        # RuntimeError: el pool ya se cerró porque se canceló la búsqueda
+                        logging.getLogger(__name__).debug(f"Entrada ignorada {entry.path}: {e}")
+        except OSError as e:
+            logging.getLogger(__name__).warning(f"No se pudo leer {directory}: {e}")
+        finally:
+            if batch:
+                self._deliver(root, batch)
+            self._task_done(root)
+
+    def _deliver(self, root, batch):
+        if self.cancelled.is_set():
+            return
+        with self.lock:
+            self.roots[root]["paths"].extend(path for path, _ in batch)
+        self.on_batch(root, batch)
+
+    def _task_done(self, root):
+        state = self.roots[root]
+        with self.lock:
+            state["pending"] -= 1
+            root_done = state["pending"] == 0
+            all_done = root_done and all(s["pending"] == 0 for s in self.roots.values())
+        if not root_done or self.cancelled.is_set():
+            return
+        if state["timed_out"]:
+            logging.getLogger(__name__).warning(f"Tiempo agotado recorriendo {root}; resultados parciales")
+        else:
+            self.index.prune(root, state["paths"])
+        if self.on_root_done:
+            self.on_root_done(root, list(state["paths"]), state["timed_out"])
+        if all_done:
+            self.index.save()
+            self.executor.shutdown(wait=False)
+            if self.on_finished:
+                self.on_finished()
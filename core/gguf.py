@@ -0,0 +1,246 @@
+# Lector de cabeceras GGUF (metadatos clave/valor y tabla de tensores) mediante mmap
+import os
+import mmap
+import struct
+import hashlib
+import logging
+
+GGUF_MAGIC = b"GGUF"
+
+# Tipos de valor de la sección clave/valor de GGUF
+GGUF_TYPE_UINT8 = 0
+GGUF_TYPE_INT8 = 1
+GGUF_TYPE_UINT16 = 2
+GGUF_TYPE_INT16 = 3
+GGUF_TYPE_UINT32 = 4
+GGUF_TYPE_INT32 = 5
+GGUF_TYPE_FLOAT32 = 6
+GGUF_TYPE_BOOL = 7
+GGUF_TYPE_STRING = 8
+GGUF_TYPE_ARRAY = 9
+GGUF_TYPE_UINT64 = 10
+GGUF_TYPE_INT64 = 11
+GGUF_TYPE_FLOAT64 = 12
+
+# Formato struct de los tipos escalares
+_SCALAR_FORMATS = {
+    GGUF_TYPE_UINT8: "<B",
+    GGUF_TYPE_INT8: "<b",
+    GGUF_TYPE_UINT16: "<H",
+    GGUF_TYPE_INT16: "<h",
+    GGUF_TYPE_UINT32: "<I",
+    GGUF_TYPE_INT32: "<i",
+    GGUF_TYPE_FLOAT32: "<f",
+    GGUF_TYPE_BOOL: "<?",
+    GGUF_TYPE_UINT64: "<Q",
+    GGUF_TYPE_INT64: "<q",
+    GGUF_TYPE_FLOAT64: "<d",
+}
+
+# Los arrays con más elementos que este límite no se decodifican (p. ej. el vocabulario),
+# solo se guarda su tamaño y su posición dentro del fichero
+MAX_DECODED_ARRAY = 64
+
+# Valores de general.file_type (enum llama_ftype de llama.cpp)
+FILE_TYPES = {
+    0: "F32", 1: "F16", 2: "Q4_0", 3: "Q4_1", 7: "Q8_0", 8: "Q5_0", 9: "Q5_1",
+    10: "Q2_K", 11: "Q3_K_S", 12: "Q3_K_M", 13: "Q3_K_L", 14: "Q4_K_S", 15: "Q4_K_M",
+    16: "Q5_K_S", 17: "Q5_K_M", 18: "Q6_K", 19: "IQ2_XXS", 20: "IQ2_XS", 21: "Q2_K_S",
+    22: "IQ3_XS", 23: "IQ3_XXS", 24: "IQ1_S", 25: "IQ4_NL", 26: "IQ3_S", 27: "IQ3_M",
+    28: "IQ2_S", 29: "IQ2_M", 30: "IQ4_XS", 31: "IQ1_M", 32: "BF16", 36: "TQ1_0", 37: "TQ2_0",
+}
+
+
+class GGUFError(Exception):
+    """Error al leer un fichero que no es GGUF o está truncado"""
+
+
+class GGUFArray:
+    """Referencia a un array GGUF grande que no se ha decodificado"""
+
+    def __init__(self, item_type, count, start, end):
+        self.item_type = item_type
+        self.count = count
+        self.start = start  # Offset del primer elemento
+        self.end = end  # Offset justo después del último elemento
+
+    def __len__(self):
+        return self.count
+
+
+class _Cursor:
+    """Cursor de lectura secuencial sobre el mmap"""
+
+    def __init__(self, buf, offset=0):
+        self.buf = buf
+        self.offset = offset
+
+    def read(self, fmt):
+        size = struct.calcsize(fmt)
+        if self.offset + size > len(self.buf):
+            raise GGUFError("Fichero GGUF truncado")
+        value = struct.unpack_from(fmt, self.buf, self.offset)[0]
+        self.offset += size
+        return value
+
+    def read_string(self):
+        length = self.read("<Q")
+        end = self.offset + length
+        if end > len(self.buf):
+            raise GGUFError("Cadena GGUF fuera de rango")
+        value = bytes(self.buf[self.offset:end]).decode("utf-8", errors="replace")
+        self.offset = end
+        return value
+
+    def skip_string(self):
+        length = self.read("<Q")
+        self.offset += length
+
+    def read_value(self, value_type):
+        if value_type in _SCALAR_FORMATS:
+            return self.read(_SCALAR_FORMATS[value_type])
+        if value_type == GGUF_TYPE_STRING:
+            return self.read_string()
+        if value_type == GGUF_TYPE_ARRAY:
+            item_type = self.read("<I")
+            count = self.read("<Q")
+            if count <= MAX_DECODED_ARRAY:
+                return [self.read_value(item_type) for _ in range(count)]
+            start = self.offset
+            self.skip_array(item_type, count)
+            return GGUFArray(item_type, count, start, self.offset)
+        raise GGUFError(f"Tipo de valor GGUF desconocido: {value_type}")
+
+    def skip_array(self, item_type, count):
+        if item_type in _SCALAR_FORMATS:
+            self.offset += struct.calcsize(_SCALAR_FORMATS[item_type]) * count
+        elif item_type == GGUF_TYPE_STRING:
+            for _ in range(count):
+                self.skip_string()
+        else:
+            for _ in range(count):
+                self.read_value(item_type)
+        if self.offset > len(self.buf):
+            raise GGUFError("Array GGUF fuera de rango")
+
+
+def _parse(buf):
+    """Analiza la cabecera, los metadatos y la tabla de tensores de un buffer GGUF"""
+    cur = _Cursor(buf)
+    if bytes(buf[:4]) != GGUF_MAGIC:
+        raise GGUFError("No es un fichero GGUF")
+    cur.offset = 4
+    version = cur.read("<I")
+    # GGUF v1 usaba contadores de 32 bits
+    count_fmt = "<I" if version == 1 else "<Q"
+    tensor_count = cur.read(count_fmt)
+    kv_count = cur.read(count_fmt)
+
+    metadata = {}
+    for _ in range(kv_count):
+        key = cur.read_string()
+        value_type = cur.read("<I")
+        metadata[key] = cur.read_value(value_type)
+
+    # Tabla de tensores: solo nos interesan las dimensiones para contar parámetros
+    n_params = 0
+    for _ in range(tensor_count):
+        cur.skip_string()
+        n_dims = cur.read("<I")
+        n_elements = 1
+        for _ in range(n_dims):
+            n_elements *= cur.read("<Q")
+        cur.read("<I")  # Tipo del tensor
+        cur.read("<Q")  # Offset de los datos
+        n_params += n_elements
+
+    return {
+        "version": version,
+        "tensor_count": tensor_count,
+        "metadata": metadata,
+        "n_params": n_params,
+        "tokenizer_fingerprint": _tokenizer_fingerprint(buf, metadata),
+    }
+
+
+def _tokenizer_fingerprint(buf, metadata):
+    """Huella corta del tokenizador (tipo de modelo + vocabulario) para comparar modelos"""
+    digest = hashlib.sha1()
+    digest.update(str(metadata.get("tokenizer.ggml.model", "")).encode("utf-8"))
+    tokens = metadata.get("tokenizer.ggml.tokens")
+    if isinstance(tokens, GGUFArray):
+        digest.update(buf[tokens.start:tokens.end])
+    elif tokens:
+        digest.update("\0".join(str(t) for t in tokens).encode("utf-8"))
+    else:
+        return ""
+    return digest.hexdigest()[:16]
+
+
+def read_gguf(path):
+    """Lee la cabecera de un fichero GGUF sin cargar los pesos en memoria
+
+    Args:
+        path: Ruta al fichero .gguf
+
+    Returns:
+        Diccionario con version, tensor_count, metadata, n_params y tokenizer_fingerprint
+    """
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size < 24:
+            raise GGUFError("Fichero GGUF demasiado pequeño")
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            return _parse(mm)
+
+
+def _arch_value(metadata, arch, name, default=None):
+    value = metadata.get(f"{arch}.{name}", default)
+    # Algunos modelos guardan valores por capa como array: nos quedamos con el máximo
+    if isinstance(value, list):
+        value = max(value) if value else default
+    return value
+
+
+def summarize_gguf(path):
+    """Extrae los datos del modelo que se muestran en el selector
+
+    Args:
+        path: Ruta al fichero .gguf
+
+    Returns:
+        Diccionario con arquitectura, cuantización, parámetros, contexto, capas,
+        geometría de atención y huella del tokenizador
+    """
+    info = read_gguf(path)
+    metadata = info["metadata"]
+    arch = metadata.get("general.architecture", "")
+    file_type = metadata.get("general.file_type")
+    n_embd = _arch_value(metadata, arch, "embedding_length")
+    n_head = _arch_value(metadata, arch, "attention.head_count")
+    summary = {
+        "name": metadata.get("general.name", ""),
+        "architecture": arch,
+        "quantization": FILE_TYPES.get(file_type, str(file_type) if file_type is not None else ""),
+        "n_params": info["n_params"],
+        "context_length": _arch_value(metadata, arch, "context_length"),
+        "block_count": _arch_value(metadata, arch, "block_count"),
+        "embedding_length": n_embd,
+        "head_count": n_head,
+        "head_count_kv": _arch_value(metadata, arch, "attention.head_count_kv", n_head),
+        "key_length": _arch_value(metadata, arch, "attention.key_length"),
+        "value_length": _arch_value(metadata, arch, "attention.value_length"),
+        "tokenizer_fingerprint": info["tokenizer_fingerprint"],
+    }
+    logging.getLogger(__name__).debug(f"GGUF leído: {path} ({arch}, {summary['quantization']})")
+    return summary
+
+
+def format_param_count(n_params):
+    """Formatea el número de parámetros de forma compacta (p. ej. 7.2B, 135M)"""
+    if not n_params:
+        return ""
+    if n_params >= 1e9:
+        return f"{n_params / 1e9:.1f}B"
+    if n_params >= 1e6:
+        return f"{n_params / 1e6:.0f}M"
+    return f"{n_params / 1e3:.0f}K"
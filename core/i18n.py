@@ -1,10 +1,23 @@
 # Sistema de internacionalización para LLaMA Server GUI
+#
+# La fuente de las traducciones es assets/translations.json ({clave: {idioma: texto}}).
+# Para no leerla entera en cada arranque se compila un catálogo plano por idioma
+# (assets/i18n/<idioma>.json, {clave: texto}) con `python3 -m core.i18n`; en tiempo
+# de ejecución solo se carga el catálogo del idioma activo, y si falta o es más
+# antiguo que la fuente se vuelve a compilar.
 import os
+import sys
 import json
 import logging
+import threading
 
-# Ruta al archivo de traducciones
-LANGUAGE_FILE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets", "translations.json")
+ASSETS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "assets")
+
+# Ruta al archivo de traducciones (fuente de los catálogos)
+LANGUAGE_FILE = os.path.join(ASSETS_DIR, "translations.json")
+
+# Directorio de los catálogos compilados (uno por idioma)
+CATALOG_DIR = os.path.join(ASSETS_DIR, "i18n")
 
 # Idiomas disponibles
 LANGUAGES = ["es", "en", "pt", "it", "de", "zh", "ja"]
@@ -15,55 +28,138 @@ DEFAULT_LANGUAGE = "en"
 # Variable global para almacenar el idioma actual
 current_language = DEFAULT_LANGUAGE
 
-# Diccionario para almacenar las traducciones
-translations = {}
+# Catálogos ya cargados: {idioma: {clave: texto}} (también los vacíos, para no reintentar en cada get_text)
+catalogs = {}
+_load_lock = threading.Lock()
+
+
+def catalog_path(language, catalog_dir=None):
+    return os.path.join(catalog_dir or CATALOG_DIR, f"{language}.json")
+
+
+def _read_source(source):
+    with open(source, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _split_source(translations, languages):
+    """Reparte {clave: {idioma: texto}} en {idioma: {clave: texto}}"""
+    result = {language: {} for language in languages}
+    for key, texts in translations.items():
+        for language, text in texts.items():
+            if language in result:
+                result[language][key] = text
+    return result
+
+
+def _write_catalog(path, catalog):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(catalog, f, ensure_ascii=False, separators=(",", ":"), sort_keys=True)
+    os.replace(tmp_path, path)
+
+
+def compile_catalogs(source=None, catalog_dir=None, languages=None):
+    """Compila la fuente de traducciones en un catálogo por idioma
+
+    Args:
+        source: Archivo de traducciones (por defecto, LANGUAGE_FILE)
+        catalog_dir: Directorio de salida (por defecto, CATALOG_DIR)
+        languages: Idiomas a compilar (por defecto, LANGUAGES)
+
+    Returns:
+        Lista de rutas escritas
+    """
+    source = source or LANGUAGE_FILE
+    catalog_dir = catalog_dir or CATALOG_DIR
+    os.makedirs(catalog_dir, exist_ok=True)
+    paths = []
+    for language, catalog in _split_source(_read_source(source), languages or LANGUAGES).items():
+        path = catalog_path(language, catalog_dir)
+        _write_catalog(path, catalog)
+        paths.append(path)
+    logging.getLogger(__name__).info(f"Catálogos de traducción compilados en {catalog_dir}")
+    return paths
+
+
+def _is_stale(path, source):
+    try:
+        return os.path.getmtime(path) < os.path.getmtime(source)
+    except OSError:
+        return not os.path.exists(path)
+
 
+def load_catalog(language, source=None, catalog_dir=None):
+    """Carga el catálogo compilado de un idioma
 
-def load_translations():
-    """Carga las traducciones desde el archivo JSON"""
-    global translations
+    Si el catálogo no existe o es más antiguo que la fuente se compila de nuevo
+    (si no se puede escribir, se usa el resultado en memoria).
+
+    Returns:
+        {clave: texto}, vacío si no hay traducciones
+    """
+    source = source or LANGUAGE_FILE
+    path = catalog_path(language, catalog_dir)
+    logger = logging.getLogger(__name__)
     try:
-        if os.path.exists(LANGUAGE_FILE):
-            with open(LANGUAGE_FILE, "r", encoding="utf-8") as f:
-                translations = json.load(f)
-            logging.getLogger(__name__).info(f"Traducciones cargadas desde {LANGUAGE_FILE}")
-        else:
-            logging.getLogger(__name__).warning(f"Archivo de traducciones no encontrado en {LANGUAGE_FILE}")
-            translations = {}
+        if not _is_stale(path, source):
+            with open(path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        if not os.path.exists(source):
+            logger.warning(f"Archivo de traducciones no encontrado en {source}")
+            return {}
+        logger.info(f"Catálogo de '{language}' ausente o desactualizado: se compila desde {source}")
+        catalog = _split_source(_read_source(source), [language])[language]
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            _write_catalog(path, catalog)
+        except OSError as e:
+            logger.warning(f"No se pudo guardar el catálogo {path}: {e}")
+        return catalog
     except Exception as e:
-        logging.getLogger(__name__).error(f"Error al cargar traducciones: {e}")
-        translations = {}
+        logger.error(f"Error al cargar traducciones de '{language}': {e}")
+        return {}
+
+
+def get_catalog(language):
+    """Catálogo de un idioma, cargándolo la primera vez (espera si otro hilo lo está cargando)"""
+    catalog = catalogs.get(language)
+    if catalog is None:
+        with _load_lock:
+            catalog = catalogs.get(language)
+            if catalog is None:
+                catalog = catalogs[language] = load_catalog(language)
+    return catalog
+
+
+def preload_translations():
+    """Empieza a cargar el catálogo del idioma actual en segundo plano
+
+    Se llama al arrancar, antes de inicializar GTK, para que la lectura se solape
+    con el resto del arranque; el primer get_text espera a que termine.
+    """
+    threading.Thread(target=get_catalog, args=(current_language,), name="i18n-preload", daemon=True).start()
 
 
 def get_text(key, language=None):
     """Obtiene el texto traducido para la clave dada
-    
+
     Args:
         key: Clave del texto a traducir
         language: Idioma específico (si es None, usa el idioma actual)
-    
+
     Returns:
         El texto traducido o la clave original si no se encuentra traducción
     """
-    lang = language or current_language
-    
-    # Si no hay traducciones cargadas, intentar cargarlas
-    if not translations:
-        load_translations()
-    
-    # Si la clave no existe o el idioma no está disponible, devolver la clave original
-    if key not in translations or lang not in translations[key]:
-        return key
-    
-    return translations[key][lang]
+    return get_catalog(language or current_language).get(key, key)
 
 
 def set_language(language):
     """Establece el idioma actual
-    
+
     Args:
         language: Código de idioma ("es" o "en")
-    
+
     Returns:
         True si el idioma se cambió correctamente, False en caso contrario
     """
@@ -79,12 +175,37 @@ def set_language(language):
 
 def get_current_language():
     """Obtiene el idioma actual
-    
+
     Returns:
         El código del idioma actual
     """
     return current_language
 
 
-# Cargar traducciones al importar el módulo
-load_translations()
+class TextBindings:
+    """Textos traducibles de una ventana, para volver a aplicarlos todos de una vez al cambiar de idioma
+
+    Cada enlace es una función que recibe el texto (p. ej. entry.set_placeholder_text
+    o button.set_label) y la clave de la traducción.
+    """
+
+    def __init__(self):
+        self.bindings = []
+
+    def bind(self, setter, key):
+        """Aplica el texto de la clave y lo recuerda para refresh()"""
+        self.bindings.append((setter, key))
+        setter(get_text(key))
+
+    def refresh(self, language=None):
+        """Vuelve a aplicar todos los textos con el catálogo del idioma (por defecto, el actual)"""
+        catalog = get_catalog(language or current_language)
+        for setter, key in self.bindings:
+            setter(catalog.get(key, key))
+
+
+if __name__ == "__main__":
+    # python3 -m core.i18n [fuente] [directorio de salida]
+    logging.basicConfig(level=logging.INFO)
+    for written in compile_catalogs(*sys.argv[1:3]):
+        print(written)
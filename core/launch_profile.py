@@ -0,0 +1,264 @@
+# Perfiles de lanzamiento tipados: opciones de llama-server descritas por un esquema
+import os
+import logging
+import threading
+from collections import namedtuple
+from core.config import get_config_store
+
+# Tipos de opción
+TYPE_INT = "int"
+TYPE_FLOAT = "float"
+TYPE_CHOICE = "choice"
+TYPE_FLAG = "flag"  # Sin valor: se pasa el argumento si es True
+
+# Descripción de una opción de llama-server
+#   key: Nombre interno (el de la configuración cuando coincide)
+#   flag: Argumento de llama-server
+#   type: TYPE_INT, TYPE_FLOAT, TYPE_CHOICE o TYPE_FLAG
+#   default: Valor si el perfil no dice nada (None = no se pasa el argumento)
+#   label: Texto para el editor
+#   choices: Valores permitidos (solo TYPE_CHOICE)
+#   minimum: Valor mínimo (TYPE_INT y TYPE_FLOAT)
+#   advanced: True si solo aparece en el editor de opciones avanzadas
+Option = namedtuple("Option", ["key", "flag", "type", "default", "label", "choices", "minimum", "advanced"],
+                    defaults=(None, None, False))
+
+KV_CACHE_TYPES = ["f16", "bf16", "f32", "q8_0", "q5_1", "q5_0", "q4_1", "q4_0", "iq4_nl"]
+
+SCHEMA = [
+    # Opciones del formulario principal
+    Option("ngl", "--n-gpu-layers", TYPE_INT, None, "Capas en la GPU", minimum=0),
+    Option("temp", "--temp", TYPE_FLOAT, None, "Temperatura", minimum=0.0),
+    Option("top_k", "--top-k", TYPE_INT, None, "Top-k", minimum=0),
+    Option("top_p", "--top-p", TYPE_FLOAT, None, "Top-p", minimum=0.0),
+    Option("repeat_penalty", "--repeat-penalty", TYPE_FLOAT, None, "Penalización por repetición", minimum=0.0),
+    Option("threads", "--threads", TYPE_INT, None, "Hilos de generación", minimum=1),
+    Option("ctx_size", "--ctx-size", TYPE_INT, None, "Tamaño del contexto", minimum=0),
+    Option("max_tokens", "--n-predict", TYPE_INT, None, "Tokens máximos", minimum=-1),
+    # Opciones avanzadas de rendimiento
+    Option("threads_batch", "--threads-batch", TYPE_INT, None, "Hilos del prompt (--threads-batch)", minimum=1,
+           advanced=True),
+    Option("batch_size", "--batch-size", TYPE_INT, None, "Lote lógico (--batch-size)", minimum=1, advanced=True),
+    Option("ubatch_size", "--ubatch-size", TYPE_INT, None, "Lote físico (--ubatch-size)", minimum=1,
+           advanced=True),
+    Option("parallel", "--parallel", TYPE_INT, None, "Slots en paralelo (--parallel)", minimum=1, advanced=True),
+    Option("cache_type_k", "--cache-type-k", TYPE_CHOICE, None, "Tipo de la caché K", KV_CACHE_TYPES,
+           advanced=True),
+    Option("cache_type_v", "--cache-type-v", TYPE_CHOICE, None, "Tipo de la caché V", KV_CACHE_TYPES,
+           advanced=True),
+    Option("numa", "--numa", TYPE_CHOICE, None, "NUMA (--numa)", ["distribute", "isolate", "numactl"],
+           advanced=True),
+    Option("defrag_thold", "--defrag-thold", TYPE_FLOAT, None, "Umbral de desfragmentación KV", minimum=-1.0,
+           advanced=True),
+    Option("cache_reuse", "--cache-reuse", TYPE_INT, None, "Reutilización de caché (--cache-reuse)", minimum=0,
+           advanced=True),
+    Option("cont_batching", "--cont-batching", TYPE_FLAG, True, "Batching continuo", advanced=True),
+    Option("flash_attn", "--flash-attn", TYPE_FLAG, True, "Flash attention", advanced=True),
+    Option("mlock", "--mlock", TYPE_FLAG, None, "Bloquear el modelo en RAM (--mlock)", advanced=True),
+    Option("no_mmap", "--no-mmap", TYPE_FLAG, None, "No proyectar el fichero (--no-mmap)", advanced=True),
+]
+
+OPTIONS = {option.key: option for option in SCHEMA}
+
+
+def parse_value(option, value):
+    """Convierte y valida un valor (texto o nativo) según su opción
+
+    Returns:
+        El valor con su tipo, o None si está vacío
+
+    Raises:
+        ValueError: Si el valor no es válido para la opción
+    """
+    if value is None or value == "":
+        return None
+    if option.type == TYPE_FLAG:
+        if isinstance(value, str):
+            return value.strip().lower() in ("1", "true", "yes", "on", "sí", "si")
+        return bool(value)
+    if option.type == TYPE_CHOICE:
+        value = str(value).strip()
+        if value not in option.choices:
+            raise ValueError(f"{option.label}: '{value}' no es uno de {', '.join(option.choices)}")
+        return value
+    try:
+        value = int(value) if option.type == TYPE_INT else float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"{option.label}: '{value}' no es un número válido")
+    if option.minimum is not None and value < option.minimum:
+        raise ValueError(f"{option.label}: debe ser como mínimo {option.minimum}")
+    return value
+
+
+class LaunchProfile:
+    """Conjunto de opciones de llama-server validadas contra SCHEMA
+
+    Solo guarda las opciones indicadas explícitamente; el resto toma su valor
+    por defecto del esquema al construir la línea de comandos.
+    """
+
+    def __init__(self, values=None):
+        self.values = {}
+        self.update(values or {})
+
+    def update(self, values):
+        """Aplica valores encima de los actuales (None o "" elimina la opción)
+
+        Raises:
+            ValueError: Si alguna opción no existe o su valor no es válido
+        """
+        for key, value in values.items():
+            option = OPTIONS.get(key)
+            if option is None:
+                raise ValueError(f"Opción desconocida: {key}")
+            parsed = parse_value(option, value)
+            if parsed is None:
+                self.values.pop(key, None)
+            else:
+                self.values[key] = parsed
+        return self
+
+    def get(self, key):
+        """Valor efectivo de una opción (el explícito o el del esquema)"""
+        return self.values.get(key, OPTIONS[key].default)
+
+    def is_set(self, key):
+        return key in self.values
+
+    def merged(self, other):
+        """Nuevo perfil con las opciones de `other` por encima de las de este"""
+        profile = LaunchProfile()
+        profile.values = {**self.values, **other.values}
+        return profile
+
+    def to_argv(self):
+        """Argumentos de llama-server (sin --model/--host/--port), en el orden del esquema"""
+        argv = []
+        for option in SCHEMA:
+            value = self.get(option.key)
+            if value is None:
+                continue
+            if option.type == TYPE_FLAG:
+                if value:
+                    argv.append(option.flag)
+            else:
+                argv += [option.flag, str(value)]
+        return argv
+
+    def to_dict(self):
+        return dict(self.values)
+
+    def __eq__(self, other):
+        return isinstance(other, LaunchProfile) and self.values == other.values
+
+    def __repr__(self):
+        return f"LaunchProfile({self.values!r})"
+
+
+class ProfileStore:
+    """Perfiles con nombre para cada modelo, en la sección del modelo de la configuración
+
+    Estructura de la sección: {"launch_profiles": {"active": "nombre", "profiles": {"nombre": {...}}}}
+    """
+
+    SECTION = "launch_profiles"
+
+    def __init__(self, config=None):
+        """
+        Args:
+            config: ConfigStore donde se guardan (por defecto, el de la aplicación)
+        """
+        self.config = config or get_config_store()
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def model_key(model_path):
+        return os.path.basename(model_path)
+
+    def _entry(self, model_path):
+        entry = self.config.model_section(self.model_key(model_path)).get(self.SECTION, {})
+        entry.setdefault("active", None)
+        entry.setdefault("profiles", {})
+        return entry
+
+    def _store(self, model_path, entry):
+        value = entry if entry["profiles"] or entry["active"] else None
+        self.config.update_model_section(self.model_key(model_path), {self.SECTION: value})
+
+    def names(self, model_path):
+        return sorted(self._entry(model_path)["profiles"])
+
+    def get(self, model_path, name):
+        """Perfil con nombre del modelo, o None si no existe"""
+        values = self._entry(model_path)["profiles"].get(name)
+        return LaunchProfile(values) if values is not None else None
+
+    def save(self, model_path, name, profile, activate=True):
+        with self.lock:
+            entry = self._entry(model_path)
+            entry["profiles"][name] = profile.to_dict()
+            if activate:
+                entry["active"] = name
+            self._store(model_path, entry)
+        logging.getLogger(__name__).info(f"Perfil '{name}' guardado para {self.model_key(model_path)}")
+
+    def delete(self, model_path, name):
+        with self.lock:
+            entry = self._entry(model_path)
+            if name not in entry["profiles"]:
+                return False
+            del entry["profiles"][name]
+            if entry["active"] == name:
+                entry["active"] = None
+            self._store(model_path, entry)
+        return True
+
+    def active_name(self, model_path):
+        return self._entry(model_path)["active"]
+
+    def set_active(self, model_path, name):
+        with self.lock:
+            entry = self._entry(model_path)
+            entry["active"] = name
+            self._store(model_path, entry)
+
+    def active(self, model_path):
+        """Perfil activo del modelo, o None si no tiene"""
+        name = self.active_name(model_path)
+        return self.get(model_path, name) if name else None
+
+
+def profile_from_settings(settings):
+    """Perfil base con las opciones del formulario principal (las que no son válidas se ignoran)"""
+    profile = LaunchProfile()
+    for option in SCHEMA:
+        if option.advanced or option.key not in settings:
+            continue
+        try:
+            profile.update({option.key: settings[option.key]})
+        except ValueError as e:
+            logging.getLogger(__name__).warning(f"Se ignora {option.flag}: {e}")
+    return profile
+
+
+# Opciones que fija un perfil de Autotune
+TUNED_KEYS = ("threads", "threads_batch", "batch_size", "ubatch_size", "parallel")
+
+
+def build_launch_profile(settings, tuned=None, named=None):
+    """Perfil efectivo de un lanzamiento
+
+    De menor a mayor prioridad: formulario principal, resultado de Autotune
+    y perfil con nombre activo del modelo (lo que el usuario fija a mano gana).
+
+    Args:
+        settings: Parámetros del formulario (collect_launch_settings)
+        tuned: Perfil de Autotune del modelo (diccionario) o None
+        named: LaunchProfile con nombre del modelo o None
+    """
+    profile = profile_from_settings(settings)
+    if tuned:
+        profile.update({key: tuned[key] for key in TUNED_KEYS if key in tuned})
+    if named is not None:
+        profile = profile.merged(named)
+    return profile
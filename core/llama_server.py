@@ -1,51 +1,274 @@
 # Gestión del servidor LLaMA
 import os
+import shlex
 import signal
 import logging
 import psutil
 import subprocess
 import time
+import json
+import threading
+import socket
+import itertools
+import urllib.request
+import urllib.error
+from core.log_buffer import LogRingBuffer, DEFAULT_MAX_LINES
+from core.metrics import MetricsTracker
+from core.server_log import SessionLogWriter
+from core import prompt_cache
+from core.warmup import run_warmup, EMBEDDING_ARGS
 
-def check_server_running(port):
-    """Verifica si un proceso llama-server está corriendo en el puerto especificado."""
-    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+# Tiempos de arranque en frío registrados por modelo y configuración
+COLD_START_FILE = os.path.expanduser("~/.llama-server-gui/cold_starts.json")
+
+# Número de mediciones que se guardan por modelo y configuración
+COLD_START_HISTORY = 20
+
+# Puerto por defecto de llama-server cuando no se indica --port
+DEFAULT_SERVER_PORT = 8080
+
+# Segundos que se espera tras SIGTERM antes de forzar la salida con SIGKILL
+STOP_GRACE_SECONDS = 5.0
+
+# Segundos que se espera tras SIGKILL antes de dar la detención por fallida
+KILL_WAIT_SECONDS = 5.0
+
+# Segundos entre consultas de las ranuras ocupadas durante el drenado
+DRAIN_POLL_INTERVAL = 0.5
+
+# Estado LISTEN en /proc/net/tcp
+_TCP_LISTEN = "0A"
+
+def _listening_socket_inodes(port):
+    """Inodos de los sockets TCP en escucha en el puerto, leídos de la tabla del kernel
+
+    Returns:
+        Conjunto de inodos, o None si /proc/net no está disponible
+    """
+    inodes = set()
+    found_table = False
+    for table in ("/proc/net/tcp", "/proc/net/tcp6"):
         try:
-            if proc.name() == "llama-server" or (proc.cmdline() and "llama-server" in " ".join(proc.cmdline())):
-                if f"--port {port}" in " ".join(proc.cmdline()):
-                    logging.getLogger(__name__).info(f"Found existing server running on port {port} with PID {proc.pid}")
-                    return proc.pid
-        except (psutil.NoSuchProcess, psutil.AccessDenied):
+            with open(table, "r") as f:
+                found_table = True
+                next(f, None)  # Cabecera
+                for line in f:
+                    fields = line.split()
+                    if len(fields) < 10 or fields[3] != _TCP_LISTEN:
+                        continue
+                    local_port = int(fields[1].rsplit(":", 1)[1], 16)
+                    if local_port == port and fields[9] != "0":
+                        inodes.add(fields[9])
+        except OSError:
             continue
-    logging.getLogger(__name__).debug(f"No server found running on port {port}")
-    return None
+    return inodes if found_table else None
 
-def kill_server(pid):
-    """Intenta matar el proceso del servidor con SIGTERM y luego SIGKILL si es necesario."""
+def _is_llama_server_pid(pid):
     try:
-        # Método simple: Usar psutil directamente
-        logging.getLogger(__name__).info(f"Intentando terminar proceso con PID {pid}")
-        proc = psutil.Process(pid)
-        proc.terminate()
-        
-        # Esperar a que termine
+        with open(f"/proc/{pid}/comm", "r") as f:
+            return f.read().strip() == "llama-server"
+    except OSError:
+        return False
+
+def _pid_owning_socket(inodes, candidates):
+    """Busca entre los PIDs candidatos el que tiene abierto alguno de los sockets"""
+    targets = {f"socket:[{inode}]" for inode in inodes}
+    for pid in candidates:
+        fd_dir = f"/proc/{pid}/fd"
         try:
-            proc.wait(timeout=2)
-            logging.getLogger(__name__).info("Servidor detenido correctamente")
-            return True
-        except psutil.TimeoutExpired:
-            logging.getLogger(__name__).warning("El servidor no terminó con terminate(), enviando kill()")
-            proc.kill()
-            return True
+            for fd in os.listdir(fd_dir):
+                try:
+                    if os.readlink(os.path.join(fd_dir, fd)) in targets:
+                        return pid
+                except OSError:
+                    continue
+        except OSError:
+            continue
+    return None
+
+def get_cmdline_port(cmdline):
+    """Extrae el puerto de la línea de comandos de llama-server (--port N, --port=N)
+
+    Admite también comandos lanzados con shell=True, donde todo va en un solo argumento.
+
+    Returns:
+        El puerto como entero, DEFAULT_SERVER_PORT si no se indica, o None si no es válido
+    """
+    args = []
+    for arg in cmdline:
+        try:
+            args.extend(shlex.split(arg) if " " in arg else [arg])
+        except ValueError:
+            args.append(arg)
+    for i, arg in enumerate(args):
+        value = None
+        if arg == "--port" and i + 1 < len(args):
+            value = args[i + 1]
+        elif arg.startswith("--port="):
+            value = arg.split("=", 1)[1]
+        if value is not None:
+            try:
+                return int(value)
+            except ValueError:
+                return None
+    return DEFAULT_SERVER_PORT
+
+def _find_server_by_cmdline(port):
+    """Búsqueda de respaldo: recorre los procesos y compara el --port de su línea de comandos"""
+    for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
+        cmdline = proc.info.get('cmdline') or []
+        if proc.info.get('name') != "llama-server" and not any("llama-server" in arg for arg in cmdline):
+            continue
+        if get_cmdline_port(cmdline) == port:
+            return proc.info['pid']
+    return None
+
+def check_server_running(port):
+    """Verifica si un proceso llama-server está escuchando en el puerto especificado.
+
+    Primero se consulta la tabla de sockets del kernel (/proc/net/tcp{,6}): si nadie
+    escucha en el puerto se responde sin recorrer ningún proceso. Si hay un socket
+    en escucha, se busca su dueño entre los procesos llama-server (inodo -> PID).
+    Solo si /proc no está disponible o no permite resolver el dueño se recurre a
+    comparar la línea de comandos de los procesos.
+    """
+    port = int(port)
+    inodes = _listening_socket_inodes(port)
+    if inodes is not None and not inodes:
+        logging.getLogger(__name__).debug(f"No server found running on port {port}")
+        return None
+    pid = None
+    if inodes:
+        candidates = [int(name) for name in os.listdir("/proc") if name.isdigit() and _is_llama_server_pid(name)]
+        pid = _pid_owning_socket(inodes, candidates)
+    if pid is None:
+        pid = _find_server_by_cmdline(port)
+    if pid is not None:
+        logging.getLogger(__name__).info(f"Found existing server running on port {port} with PID {pid}")
+    else:
+        logging.getLogger(__name__).debug(f"No server found running on port {port}")
+    return pid
+
+def _process_group(pid):
+    """Grupo de procesos del servidor, solo si el PID es su líder
+
+    Los servidores lanzados desde aquí tienen sesión propia y se puede señalizar el
+    grupo entero (incluidos sus hijos); con un proceso ajeno que no es líder se
+    señaliza solo él, para no arrastrar al resto de su grupo (p. ej. la terminal).
+    """
+    try:
+        pgid = os.getpgid(pid)
+    except OSError:
+        return None
+    return pgid if pgid == pid else None
+
+def _send_signal(pid, pgid, signum):
+    """Envía la señal al grupo (o al proceso); False si ya no existe"""
+    try:
+        if pgid is not None:
+            os.killpg(pgid, signum)
+        else:
+            os.kill(pid, signum)
+        return True
+    except ProcessLookupError:
+        return False
+
+def _group_alive(pgid):
+    try:
+        os.killpg(pgid, 0)
+        return True
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+
+def _wait_exit(pid, process, timeout):
+    """Espera a que el proceso termine (recogiéndolo si es hijo); True si terminó a tiempo"""
+    try:
+        if process is not None:
+            process.wait(timeout=timeout)
+        else:
+            psutil.Process(pid).wait(timeout=timeout)
+        return True
+    except (subprocess.TimeoutExpired, psutil.TimeoutExpired):
+        return False
+    except psutil.NoSuchProcess:
+        return True
+
+def _terminate(pid, grace, process, on_done):
+    logger = logging.getLogger(__name__)
+    ok = False
+    try:
+        if process is not None and process.poll() is not None:
+            # Ya terminó y se recogió: su PID puede ser ahora de otro proceso (como en Popen.send_signal)
+            logger.info(f"El servidor con PID {pid} ya había terminado")
+            ok = True
+        else:
+            pgid = _process_group(pid)
+            logger.info(f"Enviando SIGTERM al servidor con PID {pid}" + (" y su grupo" if pgid is not None else ""))
+            deadline = time.monotonic() + grace
+            if _send_signal(pid, pgid, signal.SIGTERM):
+                ok = _wait_exit(pid, process, grace)
+                # Pueden quedar otros procesos del grupo: se les deja el resto del periodo de gracia
+                while ok and pgid is not None and _group_alive(pgid) and time.monotonic() < deadline:
+                    time.sleep(0.05)
+                if not ok or (pgid is not None and _group_alive(pgid)):
+                    logger.warning(f"El servidor {pid} no terminó en {grace:.0f} s con SIGTERM: se envía SIGKILL")
+                    _send_signal(pid, pgid, signal.SIGKILL)
+                    ok = _wait_exit(pid, process, KILL_WAIT_SECONDS)
+            else:
+                ok = _wait_exit(pid, process, KILL_WAIT_SECONDS)  # Ya había terminado (si es hijo, se recoge)
+            if ok:
+                logger.info("Servidor detenido correctamente")
+            else:
+                logger.error(f"El servidor {pid} sigue vivo tras SIGKILL")
     except Exception as e:
-        logging.getLogger(__name__).error(f"Error al detener el servidor: {e}")
-        # Intentar con os.kill como último recurso
+        logger.error(f"Error al detener el servidor {pid}: {e}")
+    if on_done is not None:
         try:
-            os.kill(pid, signal.SIGKILL)
-            logging.getLogger(__name__).info("Servidor terminado con SIGKILL")
-            return True
-        except Exception as e2:
-            logging.getLogger(__name__).error(f"No se pudo detener el servidor: {e2}")
-            return False
+            on_done(ok)
+        except Exception as e:
+            logger.error(f"Error en el aviso de servidor detenido: {e}")
+
+def terminate_server(pid, grace=STOP_GRACE_SECONDS, on_done=None, process=None):
+    """Detiene un servidor sin bloquear a quien llama
+
+    Envía SIGTERM a su grupo de procesos y, si pasado el periodo de gracia queda
+    alguno vivo, SIGKILL. Las señales, la espera y la recogida del proceso se hacen
+    en un hilo aparte.
+
+    Args:
+        pid: PID del servidor
+        grace: Segundos entre SIGTERM y SIGKILL
+        on_done: Callback(ok) al terminar, desde el hilo de recogida; ok es False si
+            el proceso seguía vivo tras SIGKILL o no se pudo señalizar
+        process: Popen del servidor si es hijo de este proceso (para recogerlo con wait)
+
+    Returns:
+        El hilo de recogida (join() para esperar a que termine)
+    """
+    thread = threading.Thread(target=_terminate, args=(pid, grace, process, on_done),
+                              name=f"stop-server-{pid}", daemon=True)
+    thread.start()
+    return thread
+
+def kill_server(pid, grace=STOP_GRACE_SECONDS, on_done=None):
+    """Detiene el proceso del servidor con SIGTERM a su grupo y SIGKILL si no termina a tiempo
+
+    Args:
+        pid: PID del servidor
+        grace: Segundos entre SIGTERM y SIGKILL
+        on_done: Callback(ok); si se indica, vuelve enseguida (ver terminate_server)
+
+    Returns:
+        Sin on_done, True si el servidor terminó; con on_done, True (el resultado llega al callback)
+    """
+    if on_done is not None:
+        terminate_server(pid, grace, on_done)
+        return True
+    result = []
+    terminate_server(pid, grace, result.append).join()
+    return bool(result and result[0])
 
 def run_server(cmd, bin_dir):
     try:
@@ -55,3 +278,721 @@ def run_server(cmd, bin_dir):
     except Exception as e:
         logging.getLogger(__name__).error(f"Failed to start server: {e}")
         return None
+
+def probe_health(port, host="127.0.0.1", timeout=2.0):
+    """Consulta el endpoint /health del servidor
+
+    Returns:
+        El código HTTP (200 = modelo cargado, 503 = cargando) o None si no responde
+    """
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/health", timeout=timeout) as response:
+            return response.status
+    except urllib.error.HTTPError as e:
+        return e.code
+    except (urllib.error.URLError, OSError):
+        return None
+
+def wait_until_ready(port, host="127.0.0.1", timeout=1800.0, initial_delay=0.1, max_delay=2.0,
+                     stop_event=None, is_alive=None):
+    """Espera (bloqueando) a que /health responda 200, con espera exponencial entre intentos
+
+    Args:
+        port: Puerto del servidor
+        host: Dirección a consultar
+        timeout: Segundos máximos de espera
+        initial_delay: Espera inicial entre intentos
+        max_delay: Espera máxima entre intentos
+        stop_event: threading.Event para cancelar la espera
+        is_alive: Función que devuelve False si el proceso ha terminado
+
+    Returns:
+        "ready", "timeout", "cancelled" o "exited"
+    """
+    deadline = time.monotonic() + timeout
+    delay = initial_delay
+    while True:
+        if stop_event is not None and stop_event.is_set():
+            return "cancelled"
+        if is_alive is not None and not is_alive():
+            return "exited"
+        if probe_health(port, host, timeout=min(2.0, max_delay)) == 200:
+            return "ready"
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return "timeout"
+        wait = min(delay, remaining)
+        if stop_event is not None:
+            if stop_event.wait(wait):
+                return "cancelled"
+        else:
+            time.sleep(wait)
+        delay = min(delay * 2, max_delay)
+
+
+def _slot_busy(slot):
+    # Versiones recientes de llama-server: "is_processing"; anteriores: "state" (0 = libre)
+    if "is_processing" in slot:
+        return bool(slot["is_processing"])
+    return slot.get("state", 0) != 0
+
+def count_active_requests(port, host="127.0.0.1", timeout=2.0):
+    """Peticiones que el servidor está atendiendo, según /slots o, si no está disponible, /metrics
+
+    /slots se puede desactivar con --no-slots y /metrics solo existe con --metrics.
+
+    Returns:
+        Número de peticiones en curso (y en cola, con /metrics), o None si no expone ninguno de los dos
+    """
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/slots", timeout=timeout) as response:
+            slots = json.loads(response.read())
+        return sum(1 for slot in slots if _slot_busy(slot))
+    except (urllib.error.URLError, OSError, ValueError, TypeError, AttributeError):
+        pass
+    try:
+        with urllib.request.urlopen(f"http://{host}:{port}/metrics", timeout=timeout) as response:
+            text = response.read().decode("utf-8", "replace")
+    except (urllib.error.URLError, OSError):
+        return None
+    active = None
+    for line in text.splitlines():
+        if line.startswith(("llamacpp:requests_processing", "llamacpp:requests_deferred")):
+            try:
+                active = (active or 0) + int(float(line.split()[-1]))
+            except ValueError:
+                continue
+    return active
+
+def wait_until_idle(port, host="127.0.0.1", timeout=30.0, interval=DRAIN_POLL_INTERVAL, stop_event=None,
+                    is_alive=None, settle=2):
+    """Espera (bloqueando) a que el servidor no tenga peticiones en curso
+
+    Se exigen `settle` consultas seguidas sin peticiones, para no cortar una que
+    el proxy acaba de enviar entre dos consultas.
+
+    Returns:
+        "idle", "timeout", "cancelled", "exited" o "unknown" (el servidor no expone /slots ni /metrics)
+    """
+    deadline = time.monotonic() + timeout
+    idle_polls = 0
+    while True:
+        if stop_event is not None and stop_event.is_set():
+            return "cancelled"
+        if is_alive is not None and not is_alive():
+            return "exited"
+        active = count_active_requests(port, host, timeout=min(2.0, max(interval, 0.1) * 4))
+        if active is None:
+            return "unknown"
+        idle_polls = idle_polls + 1 if active == 0 else 0
+        if idle_polls >= settle:
+            return "idle"
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return "timeout"
+        wait = min(interval, remaining)
+        if stop_event is not None:
+            if stop_event.wait(wait):
+                return "cancelled"
+        else:
+            time.sleep(wait)
+
+
+class ReadinessProbe:
+    """Comprueba en segundo plano cuándo el servidor ha terminado de cargar el modelo
+
+    Los callbacks se ejecutan en el hilo del sondeo; la interfaz debe pasarlos a
+    su hilo principal (GLib.idle_add).
+    """
+
+    def __init__(self, port, on_ready, on_failed=None, is_alive=None, host="127.0.0.1", timeout=1800.0):
+        """
+        Args:
+            port: Puerto del servidor
+            on_ready: Callback(segundos_hasta_listo)
+            on_failed: Callback(motivo) con "timeout" o "exited"
+            is_alive: Función que devuelve False si el proceso ha terminado
+        """
+        self.port = port
+        self.host = host
+        self.timeout = timeout
+        self.on_ready = on_ready
+        self.on_failed = on_failed
+        self.is_alive = is_alive
+        self.stop_event = threading.Event()
+        self.started_at = None
+        self.thread = None
+
+    def start(self):
+        self.started_at = time.monotonic()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.stop_event.set()
+
+    def _run(self):
+        result = wait_until_ready(self.port, self.host, self.timeout,
+                                  stop_event=self.stop_event, is_alive=self.is_alive)
+        elapsed = time.monotonic() - self.started_at
+        if result == "ready":
+            logging.getLogger(__name__).info(f"Servidor listo en el puerto {self.port} tras {elapsed:.1f} s")
+            self.on_ready(elapsed)
+        elif result != "cancelled":
+            logging.getLogger(__name__).warning(f"El servidor del puerto {self.port} no llegó a estar listo: {result}")
+            if self.on_failed:
+                self.on_failed(result)
+
+
+def cold_start_key(model_path, settings):
+    """Clave de registro: modelo + parámetros que afectan al tiempo de carga"""
+    relevant = {k: str(settings.get(k, "")) for k in ("ngl", "ctx_size", "threads")}
+    return f"{os.path.basename(model_path)}|" + ",".join(f"{k}={v}" for k, v in sorted(relevant.items()))
+
+def load_cold_starts():
+    if not os.path.exists(COLD_START_FILE):
+        return {}
+    try:
+        with open(COLD_START_FILE, "r") as f:
+            return json.load(f)
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"No se pudo leer {COLD_START_FILE}: {e}")
+        return {}
+
+def record_cold_start(model_path, settings, seconds):
+    """Guarda el tiempo hasta listo de un arranque
+
+    Returns:
+        La media de los arranques anteriores con el mismo modelo y configuración (o None)
+    """
+    key = cold_start_key(model_path, settings)
+    data = load_cold_starts()
+    history = data.get(key, [])
+    previous = sum(history) / len(history) if history else None
+    data[key] = (history + [round(seconds, 2)])[-COLD_START_HISTORY:]
+    try:
+        os.makedirs(os.path.dirname(COLD_START_FILE), exist_ok=True)
+        tmp_file = f"{COLD_START_FILE}.tmp"
+        with open(tmp_file, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp_file, COLD_START_FILE)
+    except Exception as e:
+        logging.getLogger(__name__).error(f"No se pudo guardar el tiempo de arranque: {e}")
+    return previous
+
+
+# Estados del ciclo de vida de una instancia
+STATE_STOPPED = "stopped"  # Sin proceso (nunca arrancada o detenida por el usuario)
+STATE_STARTING = "starting"  # Proceso lanzado, cargando el modelo
+STATE_WARMING = "warming"  # /health responde 200; calentamiento y prefijo en curso, aún sin servir
+STATE_READY = "ready"  # Sirviendo peticiones
+STATE_DRAINING = "draining"  # Sin aceptar peticiones nuevas, esperando a que terminen las que hay en curso
+STATE_STOPPING = "stopping"  # Detención en curso
+STATE_EXITED = "exited"  # El proceso terminó por su cuenta
+STATE_FAILED = "failed"  # No se pudo lanzar o no llegó a estar listo
+STATE_RESTARTING = "restarting"  # Caída detectada, esperando al reinicio automático
+
+# Rango en el que se buscan puertos libres para nuevas instancias
+PORT_RANGE = (8080, 8180)
+
+def is_port_free(port, host="0.0.0.0"):
+    """Comprueba si se puede escuchar en el puerto indicado"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        try:
+            sock.bind((host, port))
+            return True
+        except OSError:
+            return False
+
+def find_free_port(start=PORT_RANGE[0], end=PORT_RANGE[1], exclude=()):
+    """Devuelve el primer puerto libre del rango que no esté en exclude (o None)"""
+    for port in range(start, end):
+        if port not in exclude and is_port_free(port):
+            return port
+    return None
+
+
+class ServerInstance:
+    """Una instancia de llama-server: modelo, puerto, argumentos, salida y estado
+
+    La salida del proceso se reparte a un búfer circular (para la interfaz), a un
+    registro en disco, al extractor de métricas y a los oyentes de salida.
+    """
+
+    _ids = itertools.count(1)
+
+    def __init__(self, model_path, port, args=None, bin_base="", name=None, host="0.0.0.0",
+                 settings=None, log_max_lines=DEFAULT_MAX_LINES, log_options=None, stop_grace=STOP_GRACE_SECONDS,
+                 drain_timeout=0.0, prompt_prefix=None, warmup=None):
+        """
+        Args:
+            model_path: Ruta al modelo .gguf
+            port: Puerto en el que escuchará el servidor
+            args: Argumentos adicionales de llama-server (sin --model/--host/--port)
+            bin_base: Directorio donde está el ejecutable llama-server
+            name: Nombre para mostrar (por defecto, el del modelo)
+            settings: Parámetros relevantes para el registro de tiempos de arranque
+            log_options: Argumentos de SessionLogWriter, o None para no guardar registro en disco
+            stop_grace: Segundos entre SIGTERM y SIGKILL al detenerla
+            drain_timeout: Segundos máximos que se espera, al detenerla, a que terminen
+                las peticiones en curso (0: sin drenado)
+            prompt_prefix: Prefijo de sistema compartido que se precarga (y se guarda
+                en disco) antes de darla por lista; ver core.prompt_cache
+            warmup: Argumentos de core.warmup.run_warmup para la carga de calentamiento
+                que se envía antes de darla por lista, o None para no calentarla
+        """
+        self.id = next(self._ids)
+        self.model_path = model_path
+        self.port = int(port)
+        self.args = list(args or [])
+        self.bin_base = bin_base
+        self.name = name or os.path.basename(model_path)
+        self.host = host
+        self.settings = settings or {}
+        self.log_options = log_options
+        self.stop_grace = float(stop_grace)
+        self.drain_timeout = float(drain_timeout)
+        self.prompt_prefix = prompt_prefix or None
+        self.warmup = warmup
+        self.warmup_report = None
+        self.log_buffer = LogRingBuffer(log_max_lines)
+        self.metrics = MetricsTracker()
+        self.state = STATE_STOPPED
+        self.process = None
+        self.session_log = None
+        self.readiness_probe = None
+        self.stopper = None  # Hilo de recogida de una detención en curso
+        self.stop_callbacks = []
+        self.drain_cancel = threading.Event()
+        self.started_at = None
+        self.ready_seconds = None
+        self.previous_ready_seconds = None
+        self.exit_code = None
+        self.state_listeners = []
+        self.output_listeners = []
+        self.watchdog = None  # Watchdog que la reinicia si se cae (opcional)
+        self.lock = threading.Lock()
+
+    def build_command(self):
+        """Línea de comandos completa de llama-server"""
+        cmd = [
+            os.path.join(self.bin_base, "llama-server"),
+            "--model", self.model_path,
+            "--host", self.host,
+            "--port", str(self.port),
+        ] + self.args
+        if self.prompt_prefix and "--slot-save-path" not in self.args:
+            cmd += ["--slot-save-path", self.slot_cache_dir()]
+        return cmd
+
+    def slot_cache_dir(self):
+        """Directorio de --slot-save-path: el de los argumentos o, con prefijo, el de la aplicación (o None)"""
+        if "--slot-save-path" in self.args[:-1]:
+            return self.args[self.args.index("--slot-save-path") + 1]
+        return prompt_cache.SLOT_CACHE_DIR if self.prompt_prefix else None
+
+    def add_state_listener(self, callback):
+        """Registra un callback(instancia) para los cambios de estado (se llama desde cualquier hilo)"""
+        self.state_listeners.append(callback)
+
+    def add_output_listener(self, callback):
+        """Registra un callback(instancia, línea) por cada línea de salida (hilo lector)"""
+        self.output_listeners.append(callback)
+
+    def _set_state(self, state):
+        with self.lock:
+            if self.state == state:
+                return
+            self.state = state
+        logging.getLogger(__name__).info(f"Instancia {self.id} ({self.name}:{self.port}) -> {state}")
+        for callback in list(self.state_listeners):
+            try:
+                callback(self)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Error en oyente de estado: {e}")
+
+    def is_running(self):
+        return self.process is not None and self.process.poll() is None
+
+    def log(self, text):
+        """Añade un mensaje propio (no del servidor) a la salida y al registro en disco"""
+        self.log_buffer.append(text if text.endswith("\n") else text + "\n")
+        if self.session_log is not None:
+            self.session_log.write(text)
+
+    def start(self):
+        """Lanza el proceso y empieza a leer su salida y a sondear /health
+
+        Returns:
+            True si el proceso se lanzó, False en caso contrario
+        """
+        if self.is_running():
+            return True
+        cmd = self.build_command()
+        if self.slot_cache_dir():
+            os.makedirs(self.slot_cache_dir(), exist_ok=True)
+        self.exit_code = None
+        self.ready_seconds = None
+        self.warmup_report = None
+        self.metrics = MetricsTracker()
+        if self.log_options is not None:
+            self.session_log = SessionLogWriter(name=f"i{self.id}-p{self.port}", **self.log_options)
+        self.log("Ejecutando: " + " ".join(cmd))
+        try:
+            # Nueva sesión: el servidor tiene su propio grupo de procesos
+            self.process = subprocess.Popen(
+                cmd,
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT,
+                text=True,
+                bufsize=1,
+                start_new_session=True,
+            )
+        except Exception as e:
+            self.log(f"Error al iniciar el proceso: {e}")
+            if self.session_log is not None:
+                self.session_log.close()
+            self.process = None
+            self._set_state(STATE_FAILED)
+            return False
+        self.started_at = time.monotonic()
+        self._set_state(STATE_STARTING)
+        threading.Thread(target=self._read_output, args=(self.process, self.session_log, self.metrics),
+                         daemon=True).start()
+        process = self.process
+        self.readiness_probe = ReadinessProbe(
+            self.port,
+            on_ready=lambda seconds: self._on_ready(process, seconds),
+            on_failed=lambda reason: self._on_not_ready(process, reason),
+            is_alive=lambda: process.poll() is None,
+        )
+        self.readiness_probe.start()
+        return True
+
+    def _read_output(self, process, session_log, metrics):
+        try:
+            for line in iter(process.stdout.readline, ''):
+                if session_log is not None:
+                    session_log.write(line)
+                metrics.feed(line)
+                self.log_buffer.append(line)
+                for callback in list(self.output_listeners):
+                    callback(self, line)
+        except Exception as e:
+            self.log_buffer.append(f"Error leyendo salida: {e}\n")
+        finally:
+            exit_code = process.wait()
+            if session_log is not None:
+                session_log.close()
+            if process is self.process:
+                self.exit_code = exit_code
+                if self.state not in (STATE_STOPPING, STATE_DRAINING):
+                    self.log_buffer.append(f"El servidor terminó con código {exit_code}\n")
+                    self._set_state(STATE_EXITED)
+
+    def _on_ready(self, process, seconds):
+        if process is not self.process:
+            return
+        self.ready_seconds = seconds
+        self.previous_ready_seconds = record_cold_start(self.model_path, self.settings, seconds)
+        self.log_buffer.append(f"Servidor listo en {seconds:.1f} s\n")
+        if self.warmup is not None or self.prompt_prefix:
+            # Antes de darla por lista (y de que el proxy le envíe peticiones), para que
+            # la primera petición real no pague la carga de los pesos ni el prefijo
+            self._set_state(STATE_WARMING)
+            if self.warmup is not None:
+                embeddings = any(arg in EMBEDDING_ARGS for arg in self.args)
+                self.warmup_report = run_warmup(self.port, embeddings=embeddings, log=self.log, **self.warmup)
+                if self.warmup_report["cold"] is None and process is self.process and self.state == STATE_WARMING:
+                    # No completó ni una petición: no se anuncia como lista (el proxy no le enviaría tráfico útil)
+                    self.log(f"❌ Ninguna petición de calentamiento terminó bien "
+                             f"({self.warmup_report['failed']} de {self.warmup_report['requests']})")
+                    self._set_state(STATE_FAILED)
+                    return
+            # El prefijo va al final: las peticiones de calentamiento ocupan ranuras
+            if self.prompt_prefix and self.state == STATE_WARMING:
+                prompt_cache.warm_prefix(self.port, self.model_path, self.prompt_prefix, self.args,
+                                         cache_dir=self.slot_cache_dir(), log=self.log)
+            if process is not self.process or self.state != STATE_WARMING:
+                return  # Se detuvo o se cayó mientras se calentaba
+        self._set_state(STATE_READY)
+
+    def _on_not_ready(self, process, reason):
+        if process is not self.process or reason == "exited":
+            return  # La salida del proceso la notifica _read_output
+        self.log_buffer.append("El servidor no respondió a tiempo en /health\n")
+        self._set_state(STATE_FAILED)
+
+    def stop(self, wait=True, on_stopped=None, grace=None, drain=None):
+        """Detiene el proceso del servidor (SIGTERM a su grupo y SIGKILL si no termina a tiempo)
+
+        Si la instancia está lista y hay tiempo de drenado, antes pasa a "draining":
+        deja de recibir peticiones nuevas (el proxy la excluye) y se espera a que
+        terminen las que están en curso, como mucho `drain` segundos.
+
+        Args:
+            wait: Esperar a que termine; con False vuelve enseguida y la recogida se
+                hace en otro hilo (para llamarlo desde la interfaz)
+            on_stopped: Callback(ok) cuando el proceso ha terminado (desde el hilo de recogida)
+            grace: Segundos entre SIGTERM y SIGKILL (por defecto, stop_grace)
+            drain: Segundos máximos de drenado (por defecto, drain_timeout); con 0
+                durante un drenado se detiene ya sin esperar a que acabe
+
+        Returns:
+            Con wait, True si el proceso terminó; sin wait, True
+        """
+        if self.readiness_probe is not None:
+            self.readiness_probe.cancel()
+            self.readiness_probe = None
+        process = self.process
+        if process is None:
+            self._set_state(STATE_STOPPED)
+            if on_stopped is not None:
+                on_stopped(True)
+            return True
+        drain = self.drain_timeout if drain is None else float(drain)
+        result = []
+        with self.lock:
+            if on_stopped is not None:
+                self.stop_callbacks.append(on_stopped)
+            if wait:
+                self.stop_callbacks.append(result.append)
+            stopper = self.stopper
+            started = stopper is None
+            if started:
+                draining = drain > 0 and self.state == STATE_READY
+                self.drain_cancel = threading.Event()
+                stopper = self.stopper = threading.Thread(
+                    target=self._shutdown, args=(process, self.stop_grace if grace is None else grace,
+                                                 drain if draining else 0),
+                    name=f"stop-instance-{self.id}", daemon=True)
+            elif not drain:
+                self.drain_cancel.set()  # Detener ya, sin esperar a que acabe el drenado en curso
+        if started:
+            self._set_state(STATE_DRAINING if draining else STATE_STOPPING)
+            stopper.start()
+        if not wait:
+            return True
+        stopper.join()
+        return bool(result and result[0])
+
+    def _shutdown(self, process, grace, drain):
+        if drain:
+            self.log(f"⏳ Esperando a que terminen las peticiones en curso (máximo {drain:.0f} s)")
+            result = wait_until_idle(self.port, timeout=drain, interval=DRAIN_POLL_INTERVAL,
+                                     stop_event=self.drain_cancel, is_alive=lambda: process.poll() is None)
+            if result == "timeout":
+                self.log(f"⚠ Quedaban peticiones en curso tras {drain:.0f} s de drenado: se detiene igualmente")
+            elif result == "unknown":
+                self.log("⚠ El servidor no expone /slots ni /metrics: se detiene sin esperar")
+            elif result == "idle":
+                self.log("Sin peticiones en curso: se detiene el servidor")
+            self._set_state(STATE_STOPPING)
+        _terminate(process.pid, grace, process, lambda ok: self._on_stopped(process, ok))
+
+    def _on_stopped(self, process, ok):
+        with self.lock:
+            callbacks, self.stop_callbacks = self.stop_callbacks, []
+            self.stopper = None
+        if process is self.process:
+            self.exit_code = process.poll()
+            self.process = None
+            self._set_state(STATE_STOPPED)
+        for callback in callbacks:
+            try:
+                callback(ok)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Error en el aviso de instancia detenida: {e}")
+
+    def describe(self):
+        """Resumen serializable del estado de la instancia"""
+        return {
+            "id": self.id,
+            "name": self.name,
+            "model": self.model_path,
+            "port": self.port,
+            "state": self.state,
+            "pid": self.process.pid if self.process is not None else None,
+            "ready_seconds": self.ready_seconds,
+            "previous_ready_seconds": self.previous_ready_seconds,
+            "exit_code": self.exit_code,
+            "drain_timeout": self.drain_timeout,
+            "warmup": self.warmup_report,
+            "args": self.args,
+            "watchdog": self.watchdog.describe() if self.watchdog is not None else None,
+        }
+
+
+class ServerSupervisor:
+    """Gestiona varias instancias de llama-server en la misma máquina"""
+
+    def __init__(self):
+        self.instances = {}
+        self.lock = threading.Lock()
+        self.listeners = []
+
+    def add_listener(self, callback):
+        """Registra un callback(evento, instancia); evento es added, removed o state"""
+        self.listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self.listeners:
+            self.listeners.remove(callback)
+
+    def _notify(self, event, instance):
+        for callback in list(self.listeners):
+            try:
+                callback(event, instance)
+            except Exception as e:
+                logging.getLogger(__name__).error(f"Error en oyente del supervisor: {e}")
+
+    def used_ports(self):
+        """Puertos asignados a las instancias (arrancadas o no)"""
+        with self.lock:
+            return {inst.port for inst in self.instances.values()}
+
+    def create_instance(self, model_path, args=None, port=None, watchdog=None, **kwargs):
+        """Crea (sin arrancar) una instancia nueva
+
+        Args:
+            model_path: Ruta al modelo .gguf
+            args: Argumentos adicionales de llama-server
+            port: Puerto deseado; si es None o está ocupado se asigna uno libre
+            watchdog: Argumentos de Watchdog para reiniciarla si se cae, o None para no vigilarla
+            **kwargs: Resto de argumentos de ServerInstance
+
+        Returns:
+            La ServerInstance creada
+
+        Raises:
+            RuntimeError: Si no queda ningún puerto libre en PORT_RANGE
+        """
+        used = self.used_ports()
+        if port is None or int(port) in used or not is_port_free(int(port)):
+            requested = port
+            port = find_free_port(exclude=used)
+            if port is None:
+                raise RuntimeError("No hay puertos libres para una nueva instancia")
+            if requested is not None:
+                logging.getLogger(__name__).info(f"Puerto {requested} ocupado, se usa el {port}")
+        instance = ServerInstance(model_path, port, args, **kwargs)
+        # Opciones de creación, para lanzar su sustituta con las mismas en swap()
+        instance.create_options = dict(kwargs, watchdog=watchdog)
+        if watchdog is not None:
+            from core.watchdog import Watchdog
+            # Se registra antes que el supervisor para que los oyentes ya vean su decisión
+            instance.watchdog = Watchdog(instance, **watchdog)
+        instance.add_state_listener(lambda inst: self._notify("state", inst))
+        with self.lock:
+            self.instances[instance.id] = instance
+        self._notify("added", instance)
+        return instance
+
+    def get(self, instance_id):
+        with self.lock:
+            return self.instances.get(instance_id)
+
+    def list(self):
+        with self.lock:
+            return sorted(self.instances.values(), key=lambda inst: inst.id)
+
+    def start(self, instance_id):
+        instance = self.get(instance_id)
+        return instance.start() if instance else False
+
+    def stop(self, instance_id, wait=True, on_stopped=None, drain=None):
+        instance = self.get(instance_id)
+        return instance.stop(wait, on_stopped, drain=drain) if instance else False
+
+    def remove(self, instance_id, wait=True):
+        """Detiene (si hace falta) y elimina una instancia
+
+        Con wait=False se retira enseguida y su proceso se detiene en segundo plano
+        (drenándolo si procede).
+        """
+        instance = self.get(instance_id)
+        if instance is None:
+            return False
+        if instance.watchdog is not None:
+            instance.watchdog.close()
+        if instance.process is not None:
+            instance.stop(wait=wait)
+        with self.lock:
+            self.instances.pop(instance_id, None)
+        self._notify("removed", instance)
+        return True
+
+    def swap(self, instance_id, model_path, args=None, settings=None, wait=True):
+        """Cambia el modelo de una instancia sin cortar el servicio
+
+        El modelo nuevo se lanza en otra instancia, en un puerto libre, con las mismas
+        opciones; solo cuando está lista se drena, detiene y retira la anterior. Con
+        el proxy enlazado (bind_supervisor) sus clientes no ven peticiones fallidas:
+        la nueva entra en el reparto al estar lista y la anterior deja de recibir
+        peticiones nuevas al empezar su drenado, así que siempre hay una que las
+        acepta. Si la nueva no llega a estar lista se retira y la anterior sigue igual.
+
+        Args:
+            instance_id: Instancia que se sustituye
+            model_path: Ruta al modelo nuevo
+            args: Argumentos de llama-server (por defecto, los de la instancia actual)
+            settings: Parámetros para el registro de tiempos de arranque
+            wait: Esperar a que termine el cambio; si no, se completa en segundo plano
+
+        Returns:
+            La instancia nueva (con wait, en estado "ready" si el cambio se completó)
+
+        Raises:
+            RuntimeError: Si la instancia no existe o no se pudo lanzar la nueva
+        """
+        old = self.get(instance_id)
+        if old is None:
+            raise RuntimeError(f"La instancia {instance_id} no existe")
+        options = dict(old.create_options)
+        if old.name == os.path.basename(old.model_path):
+            options.pop("name", None)  # Nombre por defecto: el del modelo nuevo
+        else:
+            options["name"] = old.name  # Nombre propio (p. ej. "principal")
+        if settings is not None:
+            options["settings"] = settings
+        new = self.create_instance(model_path, old.args if args is None else args, **options)
+        old.log(f"🔄 Cargando {new.name} en el puerto {new.port} para sustituir a esta instancia")
+        if not new.start():
+            self.remove(new.id)
+            raise RuntimeError(f"No se pudo lanzar llama-server para {new.name}")
+        thread = threading.Thread(target=self._complete_swap, args=(old, new), name=f"swap-{old.id}-{new.id}",
+                                  daemon=True)
+        thread.start()
+        if wait:
+            thread.join()
+        return new
+
+    def _complete_swap(self, old, new):
+        settled = threading.Event()
+
+        def on_state(instance):
+            if instance.state not in (STATE_STARTING, STATE_WARMING, STATE_STOPPING):
+                settled.set()
+
+        new.add_state_listener(on_state)
+        on_state(new)
+        settled.wait()
+        new.state_listeners.remove(on_state)
+        if new.state != STATE_READY:
+            old.log(f"⚠ {new.name} no llegó a estar listo ({new.state}): se mantiene esta instancia")
+            self.remove(new.id)
+            return
+        old.log(f"🔄 {new.name} listo en el puerto {new.port}: se retira esta instancia")
+        self.remove(old.id)
+
+    def stop_all(self):
+        """Detiene todas las instancias a la vez y espera a que terminen"""
+        pending = []
+        for instance in self.list():
+            if instance.state != STATE_STOPPED:
+                done = threading.Event()
+                instance.stop(wait=False, on_stopped=lambda ok, done=done: done.set())
+                pending.append(done)
+        for done in pending:
+            done.wait()
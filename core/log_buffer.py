@@ -0,0 +1,95 @@
+# Búfer circular de líneas de salida del servidor
+import threading
+from collections import deque
+from itertools import islice
+
+# Número de líneas que se conservan por defecto en el panel de salida
+DEFAULT_MAX_LINES = 5000
+
+
+class LogRingBuffer:
+    """Búfer acotado de líneas, seguro entre hilos
+
+    El hilo que lee la salida del servidor llama a append() por cada línea; la
+    interfaz llama a drain() como mucho una vez por fotograma y recibe de golpe
+    todo lo nuevo desde la última vez. Si la interfaz no consume (ventana
+    minimizada), las líneas más antiguas se descartan en lugar de acumularse.
+    Con on_pending la interfaz sabe cuándo hay algo que consumir sin consultar
+    el búfer en cada fotograma.
+    """
+
+    def __init__(self, max_lines=DEFAULT_MAX_LINES, on_pending=None):
+        """
+        Args:
+            max_lines: Líneas que se conservan
+            on_pending: Callback() (desde el hilo que añade) cuando llega texto y no
+                quedaba nada pendiente de drain(); una vez por tanda, no por línea
+        """
+        self.on_pending = on_pending
+        self.max_lines = max(1, int(max_lines))
+        self.lines = deque(maxlen=self.max_lines)
+        self.total = 0  # Líneas añadidas desde el principio
+        self.drained = 0  # Valor de total en el último drain()
+        self.lock = threading.Lock()
+
+    def append(self, line):
+        """Añade una línea (o fragmento de texto) al búfer"""
+        with self.lock:
+            notify = self.total == self.drained
+            self.lines.append(line)
+            self.total += 1
+        on_pending = self.on_pending
+        if notify and on_pending is not None:
+            on_pending()
+
+    def drain(self, full=False):
+        """Devuelve las líneas nuevas desde la última llamada
+
+        Args:
+            full: Si es True devuelve todo lo conservado (p. ej. al cambiar de vista)
+
+        Returns:
+            Tupla (texto, descartadas): el texto nuevo concatenado y el número de
+            líneas que se perdieron por superar el límite antes de consumirse
+        """
+        with self.lock:
+            pending = len(self.lines) if full else self.total - self.drained
+            if pending == 0:
+                self.drained = self.total
+                return "", 0
+            available = min(pending, len(self.lines))
+            text = "".join(reversed(list(islice(reversed(self.lines), available))))
+            self.drained = self.total
+        return text, pending - available
+
+    def since(self, cursor, limit=None):
+        """Líneas añadidas desde una posición, sin afectar a drain()
+
+        Permite que varios lectores (p. ej. clientes del demonio) sigan la salida
+        cada uno a su ritmo guardando el valor devuelto como siguiente posición.
+
+        Args:
+            cursor: Valor de total devuelto por la llamada anterior (0 la primera vez)
+            limit: Número máximo de líneas a devolver (las más recientes)
+
+        Returns:
+            Tupla (líneas, nueva posición, descartadas)
+        """
+        with self.lock:
+            pending = max(0, self.total - cursor)
+            available = min(pending, len(self.lines))
+            if limit is not None:
+                available = min(available, limit)
+            lines = list(islice(reversed(self.lines), available))[::-1]
+            return lines, self.total, pending - available
+
+    def tail(self, n=100):
+        """Devuelve las últimas n líneas conservadas"""
+        with self.lock:
+            return list(islice(reversed(self.lines), n))[::-1]
+
+    def clear(self):
+        """Vacía el búfer"""
+        with self.lock:
+            self.lines.clear()
+            self.drained = self.total
@@ -0,0 +1,219 @@
+# Estimación de la memoria que necesita un modelo antes de lanzarlo (pesos + caché KV)
+import os
+import sys
+import glob
+import logging
+import resource
+from collections import namedtuple
+import psutil
+from core.gguf import GGUFArray
+
+# Bytes por elemento de la caché KV según --cache-type-k/--cache-type-v
+# (los tipos cuantizados guardan bloques de 32 valores con su escala)
+KV_TYPE_BYTES = {
+    "f32": 4.0,
+    "f16": 2.0,
+    "bf16": 2.0,
+    "q8_0": 34 / 32,
+    "q5_1": 24 / 32,
+    "q5_0": 22 / 32,
+    "q4_1": 20 / 32,
+    "q4_0": 18 / 32,
+    "iq4_nl": 18 / 32,
+}
+
+# Memoria aproximada de los búferes de cálculo y del propio proceso
+COMPUTE_OVERHEAD = 512 * 1024 * 1024
+
+# Fracción de la memoria disponible que se considera segura
+SAFETY_MARGIN = 0.9
+
+# El contexto recomendado se redondea a múltiplos de este valor
+CTX_GRANULARITY = 256
+
+# Modos de carga del modelo
+MODE_MLOCK = "mlock"  # Se bloquea en RAM: nunca va a swap (necesita RLIMIT_MEMLOCK suficiente)
+MODE_MMAP = "mmap"  # Proyección del fichero: el kernel puede descartar páginas y releerlas del disco
+MODE_NO_MMAP = "no-mmap"  # Se copia entero a memoria (útil si todas las capas van a la GPU)
+
+# Opciones del perfil de lanzamiento (core.launch_profile) para cada modo
+MODE_OPTIONS = {
+    MODE_MLOCK: {"mlock": True, "no_mmap": False},
+    MODE_MMAP: {"mlock": False, "no_mmap": False},
+    MODE_NO_MMAP: {"mlock": False, "no_mmap": True},
+}
+
+# Dispositivos que indican un backend de GPU al que llama-server puede enviar capas
+# (CUDA y ROCm); en macOS, Metal está siempre disponible
+GPU_DEVICE_GLOBS = ("/dev/nvidia[0-9]*", "/dev/kfd")
+
+# Resultado de la estimación (tamaños en bytes)
+#   mode: Modo de carga recomendado (MODE_*)
+#   fits: True si pesos + caché KV caben en la memoria disponible
+#   max_ctx: Mayor --ctx-size que cabe (limitado al contexto de entrenamiento), o None si no se puede calcular
+#   reasons: Explicaciones de la recomendación, para mostrarlas al usuario
+MemoryAdvice = namedtuple("MemoryAdvice", [
+    "weights_bytes", "kv_bytes", "overhead_bytes", "required_bytes", "available_bytes", "memlock_bytes",
+    "mode", "fits", "ctx_size", "per_slot_ctx", "max_ctx", "reasons",
+])
+
+
+def _per_layer(value, n_layers):
+    """Valor de un campo GGUF que puede ser único o una lista por capa"""
+    if isinstance(value, (list, tuple)):
+        return [int(v) for v in value][:n_layers]
+    if value is None or isinstance(value, GGUFArray):
+        return None
+    return [int(value)] * n_layers
+
+
+def kv_bytes_per_token(summary, cache_type_k="f16", cache_type_v="f16"):
+    """Bytes de caché KV por token de contexto (todas las capas, K y V)
+
+    Args:
+        summary: Metadatos de summarize_gguf (block_count, head_count, head_count_kv, ...)
+        cache_type_k / cache_type_v: Tipos de --cache-type-k/--cache-type-v
+
+    Returns:
+        Bytes por token, o None si faltan datos en los metadatos
+    """
+    n_layers = summary.get("block_count")
+    n_embd = summary.get("embedding_length")
+    n_head = summary.get("head_count")
+    if not n_layers or not n_embd:
+        return None
+    head_counts = _per_layer(n_head, n_layers)
+    kv_heads = _per_layer(summary.get("head_count_kv"), n_layers) or head_counts
+    if not head_counts or not kv_heads:
+        return None
+    default_head_dim = n_embd // max(head_counts)
+    key_length = summary.get("key_length") or default_head_dim
+    value_length = summary.get("value_length") or default_head_dim
+    k_bytes = KV_TYPE_BYTES.get(cache_type_k, 2.0)
+    v_bytes = KV_TYPE_BYTES.get(cache_type_v, 2.0)
+    return sum(heads * (key_length * k_bytes + value_length * v_bytes) for heads in kv_heads)
+
+
+def memory_limits():
+    """Memoria disponible y límite de memoria bloqueable del proceso
+
+    Returns:
+        (bytes disponibles, límite de RLIMIT_MEMLOCK en bytes o None si es ilimitado)
+    """
+    available = psutil.virtual_memory().available
+    soft, _ = resource.getrlimit(resource.RLIMIT_MEMLOCK)
+    return available, (None if soft == resource.RLIM_INFINITY else soft)
+
+
+def gpu_offload_available():
+    """True si hay una GPU a la que llama-server puede enviar capas (CUDA, ROCm o Metal)
+
+    Sin ella --n-gpu-layers no tiene efecto y todo el modelo ocupa RAM.
+    """
+    if sys.platform == "darwin":
+        return True
+    return any(glob.glob(pattern) for pattern in GPU_DEVICE_GLOBS)
+
+
+def estimate_memory(model_path, summary, ctx_size, parallel=1, n_gpu_layers=0, cache_type_k="f16",
+                    cache_type_v="f16", available=None, memlock=None, gpu_offload=False):
+    """Calcula la memoria necesaria y recomienda cómo cargar el modelo
+
+    Si hay GPU (gpu_offload), las capas enviadas a ella (--n-gpu-layers) se
+    descuentan de los pesos y de la caché KV que ocupan RAM. Con --parallel el
+    contexto se reparte entre los slots, así que el tamaño de la caché solo
+    depende de --ctx-size.
+
+    Args:
+        model_path: Ruta al .gguf (su tamaño se toma como tamaño de los pesos)
+        summary: Metadatos de summarize_gguf
+        ctx_size: --ctx-size pedido (0 o menos: el contexto de entrenamiento, como llama-server)
+        parallel: Número de slots (--parallel)
+        n_gpu_layers: Capas en la GPU
+        available / memlock: Límites a usar (por defecto, los del sistema)
+        gpu_offload: True si las capas de n_gpu_layers van realmente a una GPU
+            (ver gpu_offload_available); si no, todo se cuenta como RAM
+
+    Returns:
+        MemoryAdvice
+    """
+    if available is None:
+        available, memlock = memory_limits()
+    ctx_size = int(ctx_size)
+    if ctx_size <= 0:
+        ctx_size = int(summary.get("context_length") or 0)
+    parallel = max(1, int(parallel))
+    n_layers = summary.get("block_count") or 0
+    gpu_fraction = min(1.0, n_gpu_layers / n_layers) if n_layers and gpu_offload else 0.0
+    cpu_fraction = 1.0 - gpu_fraction
+
+    weights = os.path.getsize(model_path)
+    per_token = kv_bytes_per_token(summary, cache_type_k, cache_type_v)
+    host_weights = int(weights * cpu_fraction)
+    kv = int(per_token * ctx_size * cpu_fraction) if per_token else 0
+    required = host_weights + kv + COMPUTE_OVERHEAD
+    budget = int(available * SAFETY_MARGIN)
+    fits = required <= budget
+    weights_fit = host_weights + COMPUTE_OVERHEAD <= budget
+    reasons = []
+
+    if gpu_fraction >= 1.0:
+        mode = MODE_NO_MMAP
+        reasons.append("Todas las capas van a la GPU: no hace falta mantener el fichero proyectado en RAM.")
+    elif not weights_fit:
+        mode = MODE_MMAP
+        reasons.append("Los pesos no caben enteros en la memoria libre: con mmap el sistema lee del disco "
+                       "las partes que necesite en vez de usar swap (será más lento).")
+    elif not fits:
+        mode = MODE_MMAP
+        reasons.append("El modelo cabe, pero no junto con la caché KV pedida: no se bloquea en RAM.")
+    elif memlock is not None and memlock < host_weights:
+        mode = MODE_MMAP
+        reasons.append(f"RLIMIT_MEMLOCK ({format_bytes(memlock)}) es menor que el modelo: --mlock fallaría. "
+                       "Sube el límite (ulimit -l) para bloquear el modelo en RAM.")
+    else:
+        mode = MODE_MLOCK
+        reasons.append("El modelo y la caché KV caben en memoria: se bloquea en RAM para evitar el swap.")
+
+    # Mayor contexto que cabe: con mmap los pesos no tienen por qué estar enteros en RAM
+    max_ctx = None
+    if per_token:
+        reserved = COMPUTE_OVERHEAD + (host_weights if weights_fit else 0)
+        if cpu_fraction > 0:
+            max_ctx = int((budget - reserved) / (per_token * cpu_fraction))
+        else:
+            max_ctx = summary.get("context_length") or ctx_size
+        if summary.get("context_length"):
+            max_ctx = min(max_ctx, int(summary["context_length"]))
+        max_ctx = max(0, max_ctx // CTX_GRANULARITY * CTX_GRANULARITY)
+        if ctx_size > max_ctx:
+            reasons.append(f"La caché KV de {ctx_size} tokens ({format_bytes(kv)}) no cabe; "
+                           f"el mayor contexto seguro es {max_ctx}.")
+    else:
+        reasons.append("Faltan datos de atención en el GGUF: no se puede estimar la caché KV.")
+
+    advice = MemoryAdvice(weights, kv, COMPUTE_OVERHEAD, required, available, memlock, mode, fits,
+                          ctx_size, ctx_size // parallel, max_ctx, reasons)
+    logging.getLogger(__name__).info(
+        f"Memoria para {os.path.basename(model_path)}: {format_bytes(required)} de {format_bytes(available)} "
+        f"disponibles -> {mode}, contexto máximo {max_ctx}")
+    return advice
+
+
+def format_bytes(n):
+    """Tamaño legible (p. ej. 4.1 GB, 512 MB)"""
+    if n >= 1024 ** 3:
+        return f"{n / 1024 ** 3:.1f} GB"
+    return f"{n / 1024 ** 2:.0f} MB"
+
+
+def describe_advice(advice):
+    """Resumen en varias líneas para la salida del servidor"""
+    lines = [
+        f"🧮 Memoria estimada: pesos {format_bytes(advice.weights_bytes)} + caché KV {format_bytes(advice.kv_bytes)}"
+        f" ({advice.ctx_size} tokens, {advice.per_slot_ctx} por slot) + cálculo {format_bytes(advice.overhead_bytes)}"
+        f" = {format_bytes(advice.required_bytes)} · disponible {format_bytes(advice.available_bytes)}",
+        f"🧮 Modo recomendado: {advice.mode}"
+        + (f" · contexto máximo seguro: {advice.max_ctx}" if advice.max_ctx is not None else ""),
+    ]
+    return lines + [f"   {reason}" for reason in advice.reasons]
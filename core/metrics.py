@@ -0,0 +1,168 @@
+# Métricas de rendimiento extraídas de la salida de llama-server
+import re
+import time
+import threading
+from array import array
+from collections import namedtuple
+
+# Evento tipado extraído de una línea de salida
+#   kind: "prompt_eval", "eval", "load", "request_start" o "request_end"
+#   value: tokens/s (prompt_eval, eval), milisegundos (load) o id de slot (request_*)
+#   tokens: número de tokens procesados (solo prompt_eval y eval)
+MetricEvent = namedtuple("MetricEvent", ["kind", "value", "tokens", "timestamp"])
+
+# Número de puntos que conserva cada serie antes de reducir su resolución
+SERIES_CAPACITY = 512
+
+_EVAL_RE = re.compile(
+    r"(?P<prompt>prompt )?eval time\s*=\s*(?P<ms>[\d.]+) ms\s*/\s*(?P<tokens>\d+) (?:tokens|runs)"
+    r".*?(?P<tps>[\d.]+|inf|nan) tokens per second"
+)
+_LOAD_RE = re.compile(r"\bload time\s*=\s*(?P<ms>[\d.]+) ms")
+_SLOT_START_RE = re.compile(r"slot\s+\w*:?\s*id\s+(?P<slot>\d+) \|.*processing task|slot (?P<old>\d+) is processing")
+_SLOT_END_RE = re.compile(r"slot\s+release:\s*id\s+(?P<slot>\d+)|slot (?P<old>\d+) released")
+
+
+def parse_line(line, timestamp=None):
+    """Convierte una línea de salida de llama-server en un MetricEvent
+
+    Args:
+        line: Línea de texto tal como la imprime el servidor
+        timestamp: Marca de tiempo del evento (por defecto, time.time())
+
+    Returns:
+        MetricEvent o None si la línea no contiene métricas
+    """
+    # Filtro rápido: la mayoría de las líneas no tienen métricas
+    if "time" not in line and "slot" not in line:
+        return None
+    timestamp = timestamp if timestamp is not None else time.time()
+    match = _EVAL_RE.search(line)
+    if match:
+        tps = float(match.group("tps")) if match.group("tps") not in ("inf", "nan") else 0.0
+        kind = "prompt_eval" if match.group("prompt") else "eval"
+        return MetricEvent(kind, tps, int(match.group("tokens")), timestamp)
+    match = _LOAD_RE.search(line)
+    if match:
+        return MetricEvent("load", float(match.group("ms")), 0, timestamp)
+    match = _SLOT_START_RE.search(line)
+    if match:
+        return MetricEvent("request_start", int(match.group("slot") or match.group("old")), 0, timestamp)
+    match = _SLOT_END_RE.search(line)
+    if match:
+        return MetricEvent("request_end", int(match.group("slot") or match.group("old")), 0, timestamp)
+    return None
+
+
+class TimeSeries:
+    """Serie temporal compacta respaldada por arrays de doubles
+
+    Cuando se llena, se reduce a la mitad promediando parejas de puntos
+    consecutivos, de modo que el historial completo cabe siempre en
+    `capacity` puntos y los más antiguos quedan a menor resolución.
+    """
+
+    def __init__(self, capacity=SERIES_CAPACITY):
+        self.capacity = max(2, capacity)
+        self.times = array("d")
+        self.values = array("d")
+
+    def append(self, timestamp, value):
+        if len(self.values) >= self.capacity:
+            self._downsample()
+        self.times.append(timestamp)
+        self.values.append(value)
+
+    def _downsample(self):
+        times = array("d")
+        values = array("d")
+        for i in range(0, len(self.values) - 1, 2):
+            times.append((self.times[i] + self.times[i + 1]) / 2)
+            values.append((self.values[i] + self.values[i + 1]) / 2)
+        if len(self.values) % 2:
+            times.append(self.times[-1])
+            values.append(self.values[-1])
+        self.times = times
+        self.values = values
+
+    def __len__(self):
+        return len(self.values)
+
+    def last(self, default=None):
+        return self.values[-1] if self.values else default
+
+    def mean(self, n=None):
+        """Media de los últimos n puntos (o de toda la serie)"""
+        values = self.values[-n:] if n else self.values
+        return sum(values) / len(values) if values else None
+
+
+class MetricsTracker:
+    """Acumula las métricas de una sesión del servidor a partir de su salida
+
+    feed() se llama desde el hilo que lee la salida; snapshot() desde la interfaz.
+    """
+
+    def __init__(self, capacity=SERIES_CAPACITY):
+        self.lock = threading.Lock()
+        self.prompt_tps = TimeSeries(capacity)
+        self.gen_tps = TimeSeries(capacity)
+        self.load_ms = None
+        self.requests_started = 0
+        self.requests_completed = 0
+        self.active_slots = set()
+        self.prompt_tokens = 0
+        self.generated_tokens = 0
+        self.version = 0  # Se incrementa con cada evento (para saber si hay que refrescar)
+
+    def feed(self, line):
+        """Procesa una línea de salida; devuelve el evento extraído o None"""
+        event = parse_line(line)
+        if event is not None:
+            self.add_event(event)
+        return event
+
+    def add_event(self, event):
+        with self.lock:
+            if event.kind == "prompt_eval":
+                self.prompt_tps.append(event.timestamp, event.value)
+                self.prompt_tokens += event.tokens
+            elif event.kind == "eval":
+                self.gen_tps.append(event.timestamp, event.value)
+                self.generated_tokens += event.tokens
+            elif event.kind == "load":
+                self.load_ms = event.value
+            elif event.kind == "request_start":
+                self.requests_started += 1
+                self.active_slots.add(event.value)
+            elif event.kind == "request_end":
+                self.requests_completed += 1
+                self.active_slots.discard(event.value)
+            self.version += 1
+
+    def snapshot(self):
+        """Devuelve un diccionario con el estado actual de las métricas"""
+        with self.lock:
+            return {
+                "prompt_tps": self.prompt_tps.last(),
+                "gen_tps": self.gen_tps.last(),
+                "prompt_tps_avg": self.prompt_tps.mean(10),
+                "gen_tps_avg": self.gen_tps.mean(10),
+                "load_ms": self.load_ms,
+                "requests_started": self.requests_started,
+                "requests_completed": self.requests_completed,
+                "active_requests": len(self.active_slots),
+                "prompt_tokens": self.prompt_tokens,
+                "generated_tokens": self.generated_tokens,
+            }
+
+
+def format_metrics(snapshot):
+    """Texto de una línea con las métricas para la barra de estado"""
+    def tps(value):
+        return f"{value:.1f} t/s" if value is not None else "–"
+
+    load = f"{snapshot['load_ms'] / 1000:.1f} s" if snapshot.get("load_ms") is not None else "–"
+    return (f"⚡ Prompt: {tps(snapshot['prompt_tps'])} · Generación: {tps(snapshot['gen_tps'])}"
+            f" · Carga: {load} · Peticiones: {snapshot['requests_completed']}"
+            f" ({snapshot['active_requests']} activas)")
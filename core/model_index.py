@@ -0,0 +1,120 @@
+# Índice persistente de metadatos de modelos GGUF
+import os
+import json
+import logging
+import threading
+from core.gguf import summarize_gguf, GGUFError
+
+# El índice se guarda junto a la configuración
+INDEX_FILE = os.path.expanduser("~/.llama-server-gui/model_index.json")
+
+# Se incrementa cuando cambian los campos extraídos para invalidar índices antiguos
+INDEX_VERSION = 1
+
+
+class ModelIndex:
+    """Caché en disco de los metadatos GGUF indexada por (ruta, tamaño, mtime)
+
+    Solo se vuelve a analizar un fichero cuando cambia su tamaño o su fecha de
+    modificación, de modo que refrescar el selector con cientos de modelos no
+    vuelve a leer ninguna cabecera.
+    """
+
+    def __init__(self, index_file=INDEX_FILE):
+        self.index_file = index_file
+        self.entries = {}
+        self.dirty = False
+        self.lock = threading.Lock()
+        self.load()
+
+    def load(self):
+        """Carga el índice desde disco (si existe y es de la versión actual)"""
+        if not os.path.exists(self.index_file):
+            return
+        try:
+            with open(self.index_file, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            if data.get("version") == INDEX_VERSION:
+                self.entries = data.get("models", {})
+            logging.getLogger(__name__).info(f"Índice de modelos cargado: {len(self.entries)} entradas")
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"No se pudo leer el índice de modelos {self.index_file}: {e}")
+            self.entries = {}
+
+    def save(self):
+        """Escribe el índice en disco si ha cambiado (escritura atómica)"""
+        with self.lock:
+            if not self.dirty:
+                return
+            # Copia: los hilos de descubrimiento pueden seguir añadiendo entradas mientras se escribe
+            data = {"version": INDEX_VERSION, "models": dict(self.entries)}
+            self.dirty = False
+        try:
+            os.makedirs(os.path.dirname(self.index_file), exist_ok=True)
+            tmp_file = f"{self.index_file}.tmp"
+            with open(tmp_file, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_file, self.index_file)
+        except Exception as e:
+            logging.getLogger(__name__).error(f"No se pudo guardar el índice de modelos: {e}")
+            with self.lock:
+                self.dirty = True  # Se reintenta en el siguiente guardado
+
+    def get(self, path, stat_result=None):
+        """Devuelve los metadatos del modelo, analizándolo solo si ha cambiado
+
+        Args:
+            path: Ruta al fichero .gguf
+            stat_result: Resultado de os.stat ya obtenido (opcional, evita otra llamada)
+
+        Returns:
+            Diccionario con size, mtime y los campos de summarize_gguf, o None si
+            el fichero no existe
+        """
+        try:
+            st = stat_result or os.stat(path)
+        except OSError:
+            return None
+        with self.lock:
+            entry = self.entries.get(path)
+        if entry and entry.get("size") == st.st_size and entry.get("mtime") == st.st_mtime_ns:
+            return entry
+
+        entry = {"size": st.st_size, "mtime": st.st_mtime_ns}
+        try:
+            entry.update(summarize_gguf(path))
+        except (GGUFError, OSError, ValueError) as e:
+            # Se guarda igualmente para no volver a intentarlo hasta que cambie el fichero
+            logging.getLogger(__name__).warning(f"No se pudieron leer los metadatos de {path}: {e}")
+            entry["error"] = str(e)
+        with self.lock:
+            self.entries[path] = entry
+            self.dirty = True
+        return entry
+
+    def prune(self, models_dir, existing_paths):
+        """Elimina del índice las entradas de un directorio cuyos ficheros ya no existen
+
+        Args:
+            models_dir: Directorio que se acaba de escanear
+            existing_paths: Rutas que siguen presentes en ese directorio
+        """
+        existing = set(existing_paths)
+        prefix = os.path.join(models_dir, "")
+        with self.lock:
+            stale = [p for p in self.entries if p.startswith(prefix) and p not in existing]
+            for path in stale:
+                del self.entries[path]
+            if stale:
+                self.dirty = True
+
+
+_default_index = None
+
+
+def get_model_index():
+    """Devuelve el índice compartido por toda la aplicación"""
+    global _default_index
+    if _default_index is None:
+        _default_index = ModelIndex()
+    return _default_index
@@ -0,0 +1,160 @@
+# Precarga en segundo plano de un modelo en la caché de páginas del sistema
+#
+# En discos mecánicos o NFS el arranque en frío lo domina la lectura del .gguf. Si se
+# lee antes (mientras el usuario aún está eligiendo parámetros), llama-server lo
+# encuentra ya en memoria. La lectura es secuencial, en bloques grandes, pidiendo al
+# núcleo el bloque siguiente por adelantado (posix_fadvise WILLNEED) y saltando los
+# que ya están en caché según mincore().
+import os
+import io
+import mmap
+import ctypes
+import ctypes.util
+import logging
+import threading
+
+# Tamaño de cada lectura
+PREFETCH_CHUNK = 64 * 1024 * 1024
+
+# Tamaño de las ventanas que se proyectan para consultar mincore()
+MINCORE_WINDOW = 1024 * 1024 * 1024
+
+_LOW_BIT = bytes(i & 1 for i in range(256))
+
+
+def _load_libc():
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        libc.mmap.restype = ctypes.c_void_p
+        libc.mmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.c_int, ctypes.c_int, ctypes.c_int,
+                              ctypes.c_long]
+        libc.munmap.argtypes = [ctypes.c_void_p, ctypes.c_size_t]
+        libc.mincore.argtypes = [ctypes.c_void_p, ctypes.c_size_t, ctypes.POINTER(ctypes.c_ubyte)]
+        return libc
+    except (OSError, AttributeError):
+        return None  # Sin libc con mincore (p. ej. fuera de Linux): no se informa del porcentaje
+
+
+_libc = _load_libc()
+_MAP_FAILED = ctypes.c_void_p(-1).value
+
+
+def resident_pages(fd, offset, length):
+    """Páginas del rango [offset, offset + length) que están en la caché de páginas
+
+    Args:
+        fd: Descriptor del fichero
+        offset: Inicio (múltiplo de mmap.ALLOCATIONGRANULARITY)
+        length: Longitud en bytes
+
+    Returns:
+        (residentes, total) o None si no se puede consultar
+    """
+    if _libc is None or length <= 0:
+        return None
+    address = _libc.mmap(None, length, mmap.PROT_READ, mmap.MAP_SHARED, fd, offset)
+    if address in (None, _MAP_FAILED):
+        return None
+    try:
+        pages = (length + mmap.PAGESIZE - 1) // mmap.PAGESIZE
+        vector = (ctypes.c_ubyte * pages)()
+        if _libc.mincore(address, length, vector) != 0:
+            return None
+        # Solo el bit bajo de cada byte indica si la página está en memoria
+        return bytes(vector).translate(_LOW_BIT).count(1), pages
+    finally:
+        _libc.munmap(address, length)
+
+
+def cached_fraction(path):
+    """Fracción (0-1) del fichero que está en la caché de páginas, o None si no se puede saber"""
+    try:
+        with open(path, "rb") as f:
+            size = os.fstat(f.fileno()).st_size
+            resident = total = 0
+            for offset in range(0, size, MINCORE_WINDOW):
+                counts = resident_pages(f.fileno(), offset, min(MINCORE_WINDOW, size - offset))
+                if counts is None:
+                    return None
+                resident += counts[0]
+                total += counts[1]
+    except OSError:
+        return None
+    return resident / total if total else 1.0
+
+
+class ModelPrefetcher:
+    """Lee un modelo en la caché de páginas desde un hilo, con progreso y cancelación
+
+    Los callbacks se ejecutan en el hilo de la precarga; la interfaz debe pasarlos a
+    su hilo principal (GLib.idle_add).
+    """
+
+    def __init__(self, path, on_progress=None, on_finished=None, chunk_size=PREFETCH_CHUNK):
+        """
+        Args:
+            path: Ruta al modelo .gguf
+            on_progress: Callback(fracción_recorrida) tras cada bloque
+            on_finished: Callback(fracción_en_caché, error); fracción_en_caché según
+                mincore (None si no se puede saber) y error None, "cancelled" o el mensaje
+            chunk_size: Bytes de cada lectura
+        """
+        self.path = path
+        self.on_progress = on_progress
+        self.on_finished = on_finished
+        self.chunk_size = chunk_size
+        self.cancel_event = threading.Event()
+        self.thread = None
+        self.skipped = 0  # Bytes que ya estaban en caché
+
+    def start(self):
+        self.thread = threading.Thread(target=self._run, name="model-prefetch", daemon=True)
+        self.thread.start()
+
+    def cancel(self):
+        self.cancel_event.set()
+
+    def is_running(self):
+        return self.thread is not None and self.thread.is_alive()
+
+    def _run(self):
+        error = None
+        try:
+            self._prefetch()
+        except OSError as e:
+            error = str(e)
+            logging.getLogger(__name__).warning(f"No se pudo precargar {self.path}: {e}")
+        if error is None and self.cancel_event.is_set():
+            error = "cancelled"
+        if self.on_finished is not None:
+            self.on_finished(cached_fraction(self.path), error)
+
+    def _prefetch(self):
+        with io.FileIO(self.path, "r") as f:
+            fd = f.fileno()
+            size = os.fstat(fd).st_size
+            advise = hasattr(os, "posix_fadvise")
+            if advise:
+                os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_SEQUENTIAL)
+            buffer = memoryview(bytearray(self.chunk_size))
+            for offset in range(0, size, self.chunk_size):
+                if self.cancel_event.is_set():
+                    return
+                length = min(self.chunk_size, size - offset)
+                following = offset + self.chunk_size
+                if advise and following < size:
+                    # El núcleo lee el bloque siguiente mientras se copia este
+                    os.posix_fadvise(fd, following, min(self.chunk_size, size - following), os.POSIX_FADV_WILLNEED)
+                counts = resident_pages(fd, offset, length)
+                if counts is not None and counts[0] == counts[1]:
+                    self.skipped += length
+                else:
+                    f.seek(offset)
+                    remaining = buffer[:length]
+                    while remaining and not self.cancel_event.is_set():
+                        read = f.readinto(remaining)
+                        if not read:
+                            break
+                        remaining = remaining[read:]
+                if self.on_progress is not None:
+                    self.on_progress((offset + length) / size)
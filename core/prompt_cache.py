@@ -0,0 +1,124 @@
+# Prefijo de sistema compartido: precarga tras el arranque y caché persistente de su estado KV
+#
+# llama-server reutiliza entre peticiones la caché KV del prefijo común (cache_prompt),
+# pero tras cada arranque hay que volver a procesarlo entero. Con --slot-save-path el
+# estado de una ranura se puede guardar en disco (POST /slots/N?action=save) y
+# restaurarlo en un arranque posterior (action=restore), mucho más rápido que
+# recalcularlo. Aprovechan la caché las peticiones cuyo prompt empieza por el mismo texto.
+import os
+import json
+import time
+import hashlib
+import logging
+import urllib.request
+import urllib.error
+
+# Directorio de los estados KV guardados (--slot-save-path)
+SLOT_CACHE_DIR = os.path.expanduser("~/.llama-server-gui/slot-cache")
+
+# Estados que se conservan (se borran los usados hace más tiempo)
+MAX_CACHE_FILES = 20
+
+# Segundos máximos de cada petición (procesar un prefijo largo en CPU puede tardar)
+REQUEST_TIMEOUT = 600.0
+
+# Argumentos de llama-server que cambian el formato de la caché KV guardada
+KV_FORMAT_ARGS = ("--cache-type-k", "--cache-type-v")
+
+
+def cache_filename(model_path, prompt, args=()):
+    """Nombre del estado guardado para un modelo, un prefijo y un formato de caché
+
+    El modelo se identifica por ruta, tamaño y fecha: si el fichero cambia, el
+    estado anterior deja de valer.
+    """
+    try:
+        stat = os.stat(model_path)
+        identity = f"{os.path.abspath(model_path)}|{stat.st_size}|{int(stat.st_mtime)}"
+    except OSError:
+        identity = os.path.abspath(model_path)
+    args = list(args)
+    kv_format = [f"{flag}={args[i + 1]}" for i, flag in enumerate(args[:-1]) if flag in KV_FORMAT_ARGS]
+    digest = hashlib.sha256("\0".join([identity, prompt] + kv_format).encode("utf-8")).hexdigest()
+    return f"prefix-{digest[:24]}.bin"
+
+
+def _request(port, path, payload=None, host="127.0.0.1", timeout=REQUEST_TIMEOUT):
+    data = json.dumps(payload).encode("utf-8") if payload is not None else None
+    request = urllib.request.Request(f"http://{host}:{port}{path}", data=data,
+                                     headers={"Content-Type": "application/json"})
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        return json.loads(response.read() or b"{}")
+
+
+def _slot_ids(port, host):
+    """Ranuras del servidor (una por --parallel); [0] si /slots está desactivado"""
+    try:
+        slots = _request(port, "/slots", host=host, timeout=10.0)
+        return [slot.get("id", i) for i, slot in enumerate(slots)] or [0]
+    except (urllib.error.URLError, OSError, ValueError, AttributeError):
+        return [0]
+
+
+def _prune(cache_dir, keep=MAX_CACHE_FILES):
+    try:
+        paths = [os.path.join(cache_dir, name) for name in os.listdir(cache_dir) if name.startswith("prefix-")]
+        paths.sort(key=os.path.getmtime, reverse=True)
+        for path in paths[keep:]:
+            os.remove(path)
+    except OSError as e:
+        logging.getLogger(__name__).warning(f"No se pudo limpiar {cache_dir}: {e}")
+
+
+def warm_prefix(port, model_path, prompt, args=(), cache_dir=None, host="127.0.0.1", log=None):
+    """Deja el prefijo en la caché KV de todas las ranuras de un servidor ya cargado
+
+    Si hay un estado guardado de un arranque anterior se restaura; si no, se procesa
+    el prefijo en la primera ranura, se guarda en disco y se copia al resto.
+
+    Args:
+        port: Puerto del servidor (lanzado con --slot-save-path cache_dir)
+        model_path: Modelo cargado
+        prompt: Texto del prefijo
+        args: Argumentos de llama-server (para el formato de la caché)
+        cache_dir: Directorio de --slot-save-path (por defecto, SLOT_CACHE_DIR)
+        log: Función que recibe los mensajes de progreso (por defecto, el registro)
+
+    Returns:
+        "restored", "prefilled" o "failed"
+    """
+    cache_dir = cache_dir or SLOT_CACHE_DIR
+    log = log or logging.getLogger(__name__).info
+    filename = cache_filename(model_path, prompt, args)
+    path = os.path.join(cache_dir, filename)
+    slots = _slot_ids(port, host)
+    if os.path.exists(path):
+        try:
+            restored = [_request(port, f"/slots/{slot}?action=restore", {"filename": filename}, host)
+                        for slot in slots]
+            ms = sum(r.get("timings", {}).get("restore_ms", 0) for r in restored)
+            log(f"⚡ Prefijo de sistema restaurado desde disco en {len(slots)} ranura(s): "
+                f"{restored[0].get('n_restored', '?')} tokens en {ms:.0f} ms")
+            os.utime(path)  # Usado ahora: es el último que se borra al limpiar
+            return "restored"
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            log(f"⚠ No se pudo restaurar el prefijo guardado ({e}): se procesa de nuevo")
+    try:
+        started = time.monotonic()
+        # Un token generado basta: las peticiones siguientes reutilizan el prefijo común
+        result = _request(port, "/completion", {"prompt": prompt, "n_predict": 1, "cache_prompt": True,
+                                                "id_slot": slots[0]}, host)
+        prompt_ms = result.get("timings", {}).get("prompt_ms") or (time.monotonic() - started) * 1000
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        log(f"⚠ No se pudo precargar el prefijo de sistema: {e}")
+        return "failed"
+    try:
+        saved = _request(port, f"/slots/{slots[0]}?action=save", {"filename": filename}, host)
+        for slot in slots[1:]:
+            _request(port, f"/slots/{slot}?action=restore", {"filename": filename}, host)
+        log(f"Prefijo de sistema procesado en {prompt_ms:.0f} ms y guardado en disco "
+            f"({saved.get('n_saved', '?')} tokens): los próximos arranques lo restaurarán")
+        _prune(cache_dir)
+    except (urllib.error.URLError, OSError, ValueError) as e:
+        log(f"Prefijo de sistema procesado en {prompt_ms:.0f} ms; no se pudo guardar en disco: {e}")
+    return "prefilled"
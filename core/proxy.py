@@ -0,0 +1,458 @@
+# Proxy inverso asyncio que reparte peticiones entre réplicas de llama-server
+import os
+import json
+import asyncio
+import logging
+import threading
+from collections import deque
+
+# Conexiones inactivas que se conservan por backend (keep-alive)
+MAX_IDLE_CONNECTIONS = 8
+
+# Tamaño máximo de la cabecera HTTP de una petición o respuesta
+MAX_HEADER_BYTES = 64 * 1024
+
+# Tamaño de los bloques que se reenvían en las respuestas en streaming
+CHUNK_SIZE = 64 * 1024
+
+# Cabeceras hop-by-hop que no se reenvían tal cual
+HOP_BY_HOP = {b"connection", b"keep-alive", b"proxy-connection", b"te", b"trailer", b"upgrade"}
+
+# Cabeceras de la petición que no se envían al backend: el proxy ya ha leído el cuerpo
+# (Expect: 100-continue lo responde él mismo al cliente)
+REQUEST_ONLY = {b"expect"}
+
+
+class ProxyError(Exception):
+    """El backend falló antes de enviar la cabecera de respuesta (se puede reintentar)"""
+
+
+class Backend:
+    """Una réplica de llama-server detrás del proxy"""
+
+    def __init__(self, host, port, key=None, model=None):
+        self.host = host
+        self.port = int(port)
+        self.key = key if key is not None else self.port  # Identificador (p. ej. id de instancia)
+        self.model = model  # Ruta del modelo: solo se reparte entre réplicas del mismo
+        self.accepting = True  # False: no recibe peticiones nuevas (drenado)
+        self.in_flight = 0  # Peticiones en curso (profundidad de cola)
+        self.total = 0
+        self.errors = 0
+        self.idle = deque()  # Conexiones keep-alive libres (reader, writer)
+
+    def describe(self):
+        return {
+            "key": self.key,
+            "host": self.host,
+            "port": self.port,
+            "model": self.model,
+            "accepting": self.accepting,
+            "in_flight": self.in_flight,
+            "total": self.total,
+            "errors": self.errors,
+        }
+
+
+def model_names(model):
+    """Nombres con los que una petición puede pedir un modelo: ruta, fichero y fichero sin .gguf"""
+    if not model:
+        return set()
+    filename = os.path.basename(model)
+    return {model, filename, os.path.splitext(filename)[0]}
+
+
+def _request_model(body):
+    """Campo "model" del cuerpo JSON de una petición, o None"""
+    if not body.lstrip().startswith(b"{"):
+        return None
+    try:
+        model = json.loads(body).get("model")
+    except ValueError:
+        return None
+    return model if isinstance(model, str) else None
+
+
+def _header(headers, name):
+    for key, value in headers:
+        if key.lower() == name:
+            return value
+    return None
+
+
+async def _read_head(reader):
+    """Lee la línea inicial y las cabeceras de un mensaje HTTP/1.x"""
+    data = await reader.readuntil(b"\r\n\r\n")
+    lines = data[:-4].split(b"\r\n")
+    headers = []
+    for line in lines[1:]:
+        name, _, value = line.partition(b":")
+        headers.append((name.strip(), value.strip()))
+    return lines[0], headers
+
+
+async def _read_body(reader, headers):
+    """Lee completo el cuerpo de una petición (los de la API son JSON pequeños)"""
+    transfer = _header(headers, b"transfer-encoding")
+    if transfer and b"chunked" in transfer.lower():
+        body = bytearray()
+        while True:
+            size = int((await reader.readuntil(b"\r\n")).split(b";")[0].strip(), 16)
+            if size == 0:
+                while await reader.readuntil(b"\r\n") != b"\r\n":
+                    pass
+                return bytes(body)
+            body += await reader.readexactly(size + 2)
+            del body[-2:]
+    length = _header(headers, b"content-length")
+    return await reader.readexactly(int(length)) if length else b""
+
+
+async def _relay_body(src, dst, headers, status, method):
+    """Reenvía el cuerpo de la respuesta bloque a bloque, sin acumularlo
+
+    Returns:
+        True si la conexión con el backend se puede reutilizar
+    """
+    if method == b"HEAD" or status in (204, 304) or 100 <= status < 200:
+        return True
+    transfer = _header(headers, b"transfer-encoding")
+    if transfer and b"chunked" in transfer.lower():
+        # Streaming (SSE): cada trozo se envía al cliente en cuanto llega
+        while True:
+            line = await src.readuntil(b"\r\n")
+            dst.write(line)
+            size = int(line.split(b";")[0].strip(), 16)
+            if size == 0:
+                while True:
+                    trailer = await src.readuntil(b"\r\n")
+                    dst.write(trailer)
+                    if trailer == b"\r\n":
+                        break
+                await dst.drain()
+                return True
+            remaining = size + 2
+            while remaining:
+                chunk = await src.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    raise ConnectionError("El backend cerró la conexión a mitad de respuesta")
+                dst.write(chunk)
+                remaining -= len(chunk)
+            await dst.drain()
+    length = _header(headers, b"content-length")
+    if length is not None:
+        remaining = int(length)
+        while remaining:
+            chunk = await src.read(min(CHUNK_SIZE, remaining))
+            if not chunk:
+                raise ConnectionError("El backend cerró la conexión a mitad de respuesta")
+            dst.write(chunk)
+            remaining -= len(chunk)
+            await dst.drain()
+        return True
+    # Sin longitud ni chunked: el final lo marca el cierre de la conexión
+    while True:
+        chunk = await src.read(CHUNK_SIZE)
+        if not chunk:
+            return False
+        dst.write(chunk)
+        await dst.drain()
+
+
+class LoadBalancingProxy:
+    """Proxy HTTP con un único puerto de entrada que envía cada petición a la réplica
+    con menos peticiones en curso
+
+    Funciona igual para la API compatible con OpenAI (/v1/...) y para la nativa
+    (/completion, /health, ...). Las respuestas en streaming (SSE) se reenvían
+    sin acumular, y hacia los backends se reutilizan conexiones keep-alive.
+    El bucle asyncio corre en su propio hilo para no bloquear la interfaz.
+    """
+
+    def __init__(self, port, host="0.0.0.0", max_idle=MAX_IDLE_CONNECTIONS):
+        self.port = int(port)
+        self.host = host
+        self.max_idle = max_idle
+        self.backends = []
+        self.lock = threading.Lock()
+        self.loop = None
+        self.server = None
+        self.thread = None
+        self.started = threading.Event()
+        self.start_error = None
+        self.round_robin = 0
+
+    # --- Gestión de backends (se puede llamar desde cualquier hilo) ---
+
+    def add_backend(self, host, port, key=None, model=None):
+        with self.lock:
+            backend = Backend(host, port, key, model)
+            if any(b.key == backend.key for b in self.backends):
+                return
+            self.backends.append(backend)
+        logging.getLogger(__name__).info(f"Proxy: backend {host}:{port} añadido")
+
+    def remove_backend(self, key):
+        with self.lock:
+            removed = [b for b in self.backends if b.key == key]
+            self.backends = [b for b in self.backends if b.key != key]
+        for backend in removed:
+            logging.getLogger(__name__).info(f"Proxy: backend {backend.host}:{backend.port} retirado")
+            if self.loop is not None:
+                self.loop.call_soon_threadsafe(self._close_idle, backend)
+
+    def set_accepting(self, key, accepting):
+        """Activa o desactiva el envío de peticiones nuevas a un backend"""
+        with self.lock:
+            for backend in self.backends:
+                if backend.key == key:
+                    backend.accepting = accepting
+
+    def in_flight(self, key):
+        with self.lock:
+            return sum(b.in_flight for b in self.backends if b.key == key)
+
+    def stats(self):
+        with self.lock:
+            return [b.describe() for b in self.backends]
+
+    def _pick_backend(self, exclude=(), model=None):
+        """Réplica con menos peticiones en curso entre las del modelo pedido
+
+        Si la petición no nombra un modelo con réplicas que acepten peticiones (no
+        indica ninguno, es desconocido o se está drenando tras un cambio de modelo),
+        se usa el de la réplica añadida más recientemente: tras un cambio, el nuevo.
+        """
+        with self.lock:
+            accepting = [b for b in self.backends if b.accepting]
+            group = [b for b in accepting if model is not None and model in model_names(b.model)]
+            candidates = [b for b in accepting if b not in exclude]
+            if group:
+                candidates = [b for b in group if b not in exclude]
+            elif candidates:
+                newest = candidates[-1].model
+                candidates = [b for b in candidates if b.model == newest]
+            if not candidates:
+                return None
+            # Menos peticiones en curso; a igualdad, turno rotatorio
+            self.round_robin += 1
+            offset = self.round_robin % len(candidates)
+            rotated = candidates[offset:] + candidates[:offset]
+            backend = min(rotated, key=lambda b: b.in_flight)
+            backend.in_flight += 1
+            backend.total += 1
+            return backend
+
+    def _release(self, backend, failed=False):
+        with self.lock:
+            backend.in_flight -= 1
+            if failed:
+                backend.errors += 1
+
+    # --- Ciclo de vida ---
+
+    def start(self, timeout=5.0):
+        """Arranca el proxy en un hilo propio y espera a que esté escuchando"""
+        self.thread = threading.Thread(target=self._run, daemon=True, name="llama-proxy")
+        self.thread.start()
+        self.started.wait(timeout)
+        if self.start_error is not None:
+            raise self.start_error
+        logging.getLogger(__name__).info(f"Proxy escuchando en {self.host}:{self.port}")
+
+    def _run(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        try:
+            self.server = self.loop.run_until_complete(
+                asyncio.start_server(self._handle_client, self.host, self.port, limit=MAX_HEADER_BYTES))
+            # Con puerto 0 el sistema asigna uno libre
+            self.port = self.server.sockets[0].getsockname()[1]
+        except OSError as e:
+            self.start_error = e
+            self.started.set()
+            return
+        self.started.set()
+        try:
+            self.loop.run_forever()
+        finally:
+            self.server.close()
+            # Se cancelan las conexiones de clientes que sigan abiertas
+            pending = asyncio.all_tasks(self.loop)
+            for task in pending:
+                task.cancel()
+            self.loop.run_until_complete(asyncio.gather(*pending, return_exceptions=True))
+            for backend in list(self.backends):
+                self._close_idle(backend)
+            self.loop.close()
+
+    def stop(self):
+        """Deja de aceptar conexiones y detiene el hilo del proxy"""
+        if self.loop is not None and self.loop.is_running():
+            self.loop.call_soon_threadsafe(self.loop.stop)
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        logging.getLogger(__name__).info("Proxy detenido")
+
+    # --- Conexiones hacia los backends ---
+
+    async def _acquire(self, backend):
+        while backend.idle:
+            reader, writer = backend.idle.pop()
+            if not writer.is_closing() and not reader.at_eof():
+                return reader, writer, True
+            writer.close()
+        reader, writer = await asyncio.open_connection(backend.host, backend.port, limit=MAX_HEADER_BYTES)
+        return reader, writer, False
+
+    def _park(self, backend, reader, writer):
+        if len(backend.idle) < self.max_idle and backend in self.backends:
+            backend.idle.append((reader, writer))
+        else:
+            writer.close()
+
+    def _close_idle(self, backend):
+        while backend.idle:
+            _, writer = backend.idle.pop()
+            writer.close()
+
+    # --- Peticiones de los clientes ---
+
+    async def _handle_client(self, client_reader, client_writer):
+        try:
+            while True:
+                try:
+                    request_line, headers = await _read_head(client_reader)
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                if (_header(headers, b"expect") or b"").lower() == b"100-continue":
+                    # El cliente espera permiso para enviar el cuerpo
+                    client_writer.write(b"HTTP/1.1 100 Continue\r\n\r\n")
+                    await client_writer.drain()
+                body = await _read_body(client_reader, headers)
+                keep_alive = await self._forward(request_line, headers, body, client_writer)
+                if not keep_alive:
+                    break
+        except (asyncio.LimitOverrunError, ValueError) as e:
+            logging.getLogger(__name__).warning(f"Proxy: petición mal formada: {e}")
+            await self._send_error(client_writer, 400, "Bad Request")
+        except (ConnectionError, asyncio.CancelledError):
+            pass
+        finally:
+            client_writer.close()
+
+    async def _forward(self, request_line, headers, body, client_writer):
+        """Envía la petición a un backend y reenvía su respuesta; devuelve si el cliente sigue vivo"""
+        method, _, rest = request_line.partition(b" ")
+        version = rest.rpartition(b" ")[2]
+        connection = (_header(headers, b"connection") or b"").lower()
+        client_keep_alive = connection != b"close" and (version == b"HTTP/1.1" or connection == b"keep-alive")
+
+        outgoing = [request_line]
+        for name, value in headers:
+            lname = name.lower()
+            if lname in HOP_BY_HOP or lname in REQUEST_ONLY or lname in (b"content-length", b"transfer-encoding"):
+                continue
+            outgoing.append(name + b": " + value)
+        outgoing.append(b"Content-Length: " + str(len(body)).encode())
+        outgoing.append(b"Connection: keep-alive")
+        request = b"\r\n".join(outgoing) + b"\r\n\r\n" + body
+
+        tried = []
+        model = _request_model(body)
+        while True:
+            backend = self._pick_backend(exclude=tried, model=model)
+            if backend is None:
+                await self._send_error(client_writer, 503, "No hay réplicas disponibles")
+                return client_keep_alive
+            tried.append(backend)
+            model = backend.model  # Los reintentos van a otra réplica del mismo modelo
+            try:
+                response = await self._send_to_backend(backend, request)
+            except ProxyError as e:
+                # Aún no se ha enviado nada al cliente: se prueba con otra réplica
+                logging.getLogger(__name__).warning(f"Proxy: {backend.host}:{backend.port} falló ({e}), reintentando")
+                self._release(backend, failed=True)
+                continue
+            break
+
+        reader, writer, status_line, resp_headers = response
+        status = int(status_line.split(b" ")[1])
+        failed = False
+        try:
+            backend_close = (_header(resp_headers, b"connection") or b"").lower() == b"close"
+            framed = (_header(resp_headers, b"content-length") is not None
+                      or b"chunked" in (_header(resp_headers, b"transfer-encoding") or b"").lower())
+            keep_client = client_keep_alive and (framed or method == b"HEAD")
+            out = [status_line]
+            out += [n + b": " + v for n, v in resp_headers if n.lower() not in HOP_BY_HOP]
+            out.append(b"Connection: " + (b"keep-alive" if keep_client else b"close"))
+            client_writer.write(b"\r\n".join(out) + b"\r\n\r\n")
+            reusable = await _relay_body(reader, client_writer, resp_headers, status, method)
+            await client_writer.drain()
+        except (ConnectionError, asyncio.IncompleteReadError) as e:
+            logging.getLogger(__name__).warning(f"Proxy: respuesta interrumpida de {backend.host}:{backend.port}: {e}")
+            failed = True
+            writer.close()
+            return False
+        finally:
+            self._release(backend, failed)
+        if reusable and not backend_close:
+            self._park(backend, reader, writer)
+        else:
+            writer.close()
+        return keep_client
+
+    async def _send_to_backend(self, backend, request):
+        """Envía la petición y lee la cabecera de respuesta (reintenta una vez si la conexión reutilizada estaba muerta)"""
+        for attempt in range(2):
+            try:
+                reader, writer, reused = await self._acquire(backend)
+            except OSError as e:
+                raise ProxyError(str(e))
+            try:
+                writer.write(request)
+                await writer.drain()
+                status_line, headers = await _read_head(reader)
+                while 100 <= int(status_line.split(b" ")[1]) < 200:
+                    # Respuesta provisional (p. ej. 100 Continue): la definitiva viene detrás
+                    status_line, headers = await _read_head(reader)
+                return reader, writer, status_line, headers
+            except (ConnectionError, asyncio.IncompleteReadError, OSError, ValueError, IndexError) as e:
+                writer.close()
+                if not reused or attempt:
+                    raise ProxyError(str(e))
+        raise ProxyError("sin respuesta")
+
+    async def _send_error(self, writer, status, message):
+        body = json.dumps({"error": {"code": status, "message": message}}).encode()
+        writer.write(b"HTTP/1.1 %d %s\r\nContent-Type: application/json\r\nContent-Length: %d\r\n\r\n%s"
+                     % (status, message.encode(), len(body), body))
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+
+def bind_supervisor(proxy, supervisor, host="127.0.0.1"):
+    """Mantiene los backends del proxy sincronizados con las instancias listas del supervisor
+
+    Cada instancia en estado "ready" es un backend (del modelo que sirve); las que se están drenando
+    siguen en la lista (para sus peticiones en curso) pero sin recibir nuevas, y
+    las demás se retiran.
+    """
+    from core.llama_server import STATE_READY, STATE_DRAINING
+
+    def sync(event, instance):
+        if event != "removed" and instance.state == STATE_READY:
+            proxy.add_backend(host, instance.port, key=instance.id, model=instance.model_path)
+            proxy.set_accepting(instance.id, True)
+        elif event != "removed" and instance.state == STATE_DRAINING:
+            proxy.set_accepting(instance.id, False)
+        else:
+            proxy.remove_backend(instance.id)
+
+    for instance in supervisor.list():
+        sync("state", instance)
+    supervisor.add_listener(sync)
+    return sync
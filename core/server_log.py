@@ -0,0 +1,291 @@
+# Registros en disco de las sesiones de llama-server (rotación, índice de líneas y búsqueda)
+import os
+import re
+import mmap
+import gzip
+import time
+import shutil
+import struct
+import bisect
+import logging
+import itertools
+import tempfile
+import threading
+
+# Directorio de los registros de sesión
+LOG_DIR = os.path.expanduser("~/.llama-server-gui/logs")
+
+# Tamaño máximo de cada fragmento antes de rotar (bytes)
+DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+
+# Número máximo de fragmentos que se conservan en LOG_DIR
+DEFAULT_MAX_FILES = 50
+
+# Cada entrada del índice es el offset (uint64) del comienzo de una línea
+INDEX_ENTRY = struct.Struct("<Q")
+
+# Intervalo máximo (segundos) entre volcados a disco mientras se escribe
+FLUSH_INTERVAL = 1.0
+
+# Patrones para filtrar por nivel (formatos antiguos y nuevos de los logs de llama.cpp)
+LEVEL_PATTERNS = {
+    "error": re.compile(rb"(?im)(^E |\berr(or)?\b|\bfailed\b|\bfatal\b)"),
+    "warning": re.compile(rb"(?im)(^W |\bwarn(ing)?\b)"),
+    "info": re.compile(rb"(?im)(^I |\binfo\b)"),
+}
+
+
+def index_path(log_path):
+    """Ruta del índice de líneas de un fichero de registro"""
+    if log_path.endswith(".gz"):
+        log_path = log_path[:-3]
+    return log_path + ".idx"
+
+
+def list_logs(log_dir=LOG_DIR):
+    """Lista los ficheros de registro (los más recientes primero)"""
+    if not os.path.isdir(log_dir):
+        return []
+    logs = [os.path.join(log_dir, name) for name in os.listdir(log_dir)
+            if name.endswith(".log") or name.endswith(".log.gz")]
+    logs.sort(reverse=True)
+    return logs
+
+
+class SessionLogWriter:
+    """Escribe la salida de una sesión del servidor en ficheros rotativos con índice de líneas
+
+    Cada sesión genera fragmentos server-AAAAMMDD-HHMMSS-NOMBRE.NNN.log de hasta max_bytes;
+    junto a cada uno se escribe un .idx con el offset de cada línea para que el
+    visor pueda saltar a cualquier línea sin leer el fichero entero. Los
+    fragmentos cerrados se pueden comprimir con gzip en segundo plano.
+    """
+
+    _sessions = itertools.count()
+
+    def __init__(self, log_dir=LOG_DIR, max_bytes=DEFAULT_MAX_BYTES, max_files=DEFAULT_MAX_FILES, compress=False,
+                 name=None):
+        """
+        Args:
+            name: Parte del nombre que distingue la sesión de otras que empiecen en el
+                mismo segundo (p. ej. instancia y puerto); por defecto, el pid y un contador
+        """
+        self.log_dir = log_dir
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.compress = compress
+        suffix = name or f"{os.getpid()}-{next(self._sessions)}"
+        self.session = time.strftime("server-%Y%m%d-%H%M%S") + f"-{suffix}"
+        self.part = 0
+        self.lock = threading.Lock()
+        self.log_file = None
+        self.index_file = None
+        self.offset = 0
+        self.last_flush = 0.0
+        os.makedirs(self.log_dir, exist_ok=True)
+        self._open_part()
+
+    @property
+    def path(self):
+        return os.path.join(self.log_dir, f"{self.session}.{self.part:03d}.log")
+
+    def _open_part(self):
+        self.log_file = open(self.path, "ab")
+        self.index_file = open(index_path(self.path), "ab")
+        self.offset = self.log_file.tell()
+        logging.getLogger(__name__).info(f"Registro de sesión en {self.path}")
+
+    def write(self, line):
+        """Añade una línea al registro (seguro entre hilos)"""
+        data = line.encode("utf-8", errors="replace")
+        if not data.endswith(b"\n"):
+            data += b"\n"
+        with self.lock:
+            if self.log_file is None:
+                return
+            if self.offset and self.offset + len(data) > self.max_bytes:
+                self._rotate()
+            self.index_file.write(INDEX_ENTRY.pack(self.offset))
+            self.log_file.write(data)
+            self.offset += len(data)
+            now = time.monotonic()
+            if now - self.last_flush >= FLUSH_INTERVAL:
+                self._flush()
+                self.last_flush = now
+
+    def _flush(self):
+        self.log_file.flush()
+        self.index_file.flush()
+
+    def _close_part(self):
+        self._flush()
+        self.log_file.close()
+        self.index_file.close()
+        finished = self.path
+        if self.compress:
+            threading.Thread(target=compress_log, args=(finished,), daemon=True).start()
+
+    def _rotate(self):
+        self._close_part()
+        self.part += 1
+        self._open_part()
+        prune_logs(self.log_dir, self.max_files)
+
+    def close(self):
+        """Cierra el fragmento actual"""
+        with self.lock:
+            if self.log_file is None:
+                return
+            self._close_part()
+            self.log_file = None
+        prune_logs(self.log_dir, self.max_files)
+
+
+def compress_log(log_path):
+    """Comprime un fragmento cerrado (log -> log.gz); el índice sigue siendo válido"""
+    try:
+        # Se comprime a un temporal y se renombra para que el visor nunca vea un .gz a medias
+        with open(log_path, "rb") as src, gzip.open(log_path + ".gz.tmp", "wb") as dst:
+            shutil.copyfileobj(src, dst, 1024 * 1024)
+        os.replace(log_path + ".gz.tmp", log_path + ".gz")
+        os.remove(log_path)
+    except OSError as e:
+        logging.getLogger(__name__).error(f"No se pudo comprimir {log_path}: {e}")
+
+
+def prune_logs(log_dir=LOG_DIR, max_files=DEFAULT_MAX_FILES):
+    """Borra los fragmentos más antiguos si hay más de max_files"""
+    for log_path in list_logs(log_dir)[max_files:]:
+        for path in (log_path, index_path(log_path)):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+
+class LogReader:
+    """Acceso aleatorio a un fichero de registro mediante mmap y su índice de líneas
+
+    Ni el registro ni el índice se cargan en memoria: ambos se proyectan con mmap.
+    Los fragmentos .gz se descomprimen a un fichero temporal al abrirlos.
+    """
+
+    def __init__(self, log_path):
+        self.log_path = log_path
+        self.temp_file = None
+        if log_path.endswith(".gz"):
+            self.temp_file = tempfile.TemporaryFile()
+            with gzip.open(log_path, "rb") as src:
+                shutil.copyfileobj(src, self.temp_file, 1024 * 1024)
+            self.temp_file.flush()
+            self.data_file = self.temp_file
+        else:
+            self.data_file = open(log_path, "rb")
+        self.size = os.fstat(self.data_file.fileno()).st_size
+        self.data = mmap.mmap(self.data_file.fileno(), 0, access=mmap.ACCESS_READ) if self.size else b""
+        self.index_file = None
+        self.index_map = None
+        self.offsets = self._load_index()
+
+    def _load_index(self):
+        path = index_path(self.log_path)
+        if os.path.exists(path):
+            size = os.path.getsize(path)
+            n_entries = size // INDEX_ENTRY.size
+            if n_entries:
+                self.index_file = open(path, "rb")
+                self.index_map = mmap.mmap(self.index_file.fileno(), n_entries * INDEX_ENTRY.size,
+                                           access=mmap.ACCESS_READ)
+                offsets = memoryview(self.index_map).cast("Q")
+                # El índice puede ir por detrás del registro si el servidor sigue escribiendo
+                if offsets[-1] < self.size:
+                    return offsets
+                offsets.release()
+                self.index_map.close()
+                self.index_file.close()
+                self.index_file = None
+        return self._build_index()
+
+    def _build_index(self):
+        """Reconstruye el índice recorriendo el fichero (registros sin .idx)"""
+        offsets = [0] if self.size else []
+        pos = self.data.find(b"\n") if self.size else -1
+        while pos != -1 and pos + 1 < self.size:
+            offsets.append(pos + 1)
+            pos = self.data.find(b"\n", pos + 1)
+        return offsets
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def _line_end(self, lineno):
+        if lineno + 1 < len(self.offsets):
+            return self.offsets[lineno + 1]
+        # Última línea indexada: puede haber texto posterior aún sin indexar
+        end = self.data.find(b"\n", self.offsets[lineno])
+        return self.size if end == -1 else end + 1
+
+    def get_line(self, lineno):
+        """Devuelve la línea indicada (empezando en 0) sin el salto de línea"""
+        start = self.offsets[lineno]
+        end = self._line_end(lineno)
+        return self.data[start:end].rstrip(b"\n").decode("utf-8", errors="replace")
+
+    def get_lines(self, start, count):
+        """Devuelve hasta count líneas a partir de start"""
+        end = min(len(self.offsets), start + count)
+        return [self.get_line(i) for i in range(max(0, start), end)]
+
+    def line_at(self, offset):
+        """Número de línea que contiene el offset indicado"""
+        return bisect.bisect_right(self.offsets, offset) - 1
+
+    def search(self, pattern=None, level=None, start_line=0, limit=1000, ignore_case=True):
+        """Busca líneas por expresión regular y/o nivel
+
+        Args:
+            pattern: Expresión regular (texto) o None para no filtrar por contenido
+            level: "error", "warning", "info" o None
+            start_line: Línea desde la que empezar a buscar
+            limit: Número máximo de resultados
+
+        Returns:
+            Lista de números de línea que cumplen los filtros
+        """
+        if not self.size or start_line >= len(self.offsets):
+            return []
+        level_re = LEVEL_PATTERNS.get(level) if level else None
+        if pattern:
+            flags = re.IGNORECASE if ignore_case else 0
+            regex = re.compile(pattern.encode("utf-8"), flags | re.MULTILINE)
+        else:
+            regex = level_re
+            level_re = None
+        if regex is None:
+            return list(range(start_line, min(len(self.offsets), start_line + limit)))
+
+        results = []
+        last_line = -1
+        # La búsqueda se hace directamente sobre el mmap y después se traduce offset -> línea
+        for match in regex.finditer(self.data, self.offsets[start_line]):
+            lineno = self.line_at(match.start())
+            if lineno == last_line:
+                continue
+            last_line = lineno
+            if level_re is not None:
+                line = self.data[self.offsets[lineno]:self._line_end(lineno)]
+                if not level_re.search(line):
+                    continue
+            results.append(lineno)
+            if len(results) >= limit:
+                break
+        return results
+
+    def close(self):
+        if isinstance(self.data, mmap.mmap):
+            self.data.close()
+        self.data_file.close()
+        if self.index_file is not None:
+            self.offsets.release()
+            self.index_map.close()
+            self.index_file.close()
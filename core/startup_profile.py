@@ -0,0 +1,52 @@
+# Medición del arranque de la aplicación por fases (--profile-startup)
+import sys
+import time
+import logging
+
+# Instante de referencia: importación de este módulo (lo primero que hace el lanzador)
+START = time.perf_counter()
+
+# Si es False, mark() no guarda nada y report() no imprime nada
+enabled = False
+
+# Fases registradas: [(nombre, segundos desde START)]
+phases = []
+
+
+def enable():
+    """Activa el registro de fases"""
+    global enabled
+    enabled = True
+
+
+def mark(phase):
+    """Registra el final de una fase del arranque
+
+    Args:
+        phase: Nombre de la fase (se muestra en el informe)
+    """
+    if enabled:
+        phases.append((phase, time.perf_counter() - START))
+
+
+def format_report():
+    """Tabla con la duración de cada fase y el tiempo acumulado
+
+    Returns:
+        Texto con una línea por fase
+    """
+    lines = [f"Arranque {'ms':>36} {'acumulado':>10}"]
+    previous = 0.0
+    for phase, elapsed in phases:
+        lines.append(f"  {phase:<34} {(elapsed - previous) * 1000:8.1f} {elapsed * 1000:10.1f}")
+        previous = elapsed
+    return "\n".join(lines)
+
+
+def report(stream=None):
+    """Imprime el informe de fases (solo si el registro está activo)"""
+    if not enabled or not phases:
+        return
+    text = format_report()
+    print(text, file=stream or sys.stderr)
+    logging.getLogger(__name__).info(text)
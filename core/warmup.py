@@ -0,0 +1,124 @@
+# Carga de calentamiento tras el arranque
+#
+# La primera petición real tras lanzar llama-server es lenta: los pesos se leen del
+# disco bajo demanda (mmap) y las cachés están frías. Antes de dar la instancia por
+# lista se envían unas cuantas peticiones cortas y se mide el primer token y la
+# velocidad de la primera (en frío) y de la última (en caliente).
+import json
+import time
+import logging
+import urllib.request
+import urllib.error
+
+# Peticiones de calentamiento por defecto
+DEFAULT_PROMPTS = ["Hola", "Resume en una frase qué es un modelo de lenguaje.", "Cuenta del uno al diez."]
+
+# Tokens que se generan en cada petición
+DEFAULT_TOKENS = 16
+
+# Segundos máximos de cada petición
+REQUEST_TIMEOUT = 300.0
+
+# Argumentos con los que llama-server activa el endpoint de embeddings
+EMBEDDING_ARGS = ("--embedding", "--embeddings")
+
+
+def measure_completion(port, prompt, n_predict=DEFAULT_TOKENS, host="127.0.0.1", timeout=REQUEST_TIMEOUT):
+    """Envía una petición /completion en streaming y mide su primer token
+
+    Returns:
+        {"first_token_ms": ..., "tokens_per_second": ..., "tokens": ...}
+    """
+    payload = {"prompt": prompt, "n_predict": n_predict, "stream": True, "cache_prompt": False}
+    request = urllib.request.Request(f"http://{host}:{port}/completion", data=json.dumps(payload).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    started = time.monotonic()
+    first_token = None
+    tokens = 0
+    timings = {}
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        for raw in response:
+            if not raw.startswith(b"data:"):
+                continue
+            event = json.loads(raw[5:])
+            if event.get("content"):
+                tokens += 1
+                if first_token is None:
+                    first_token = time.monotonic()
+            if event.get("stop"):
+                timings = event.get("timings") or {}
+                break
+    finished = time.monotonic()
+    first_token = first_token or finished
+    tokens_per_second = timings.get("predicted_per_second")
+    if tokens_per_second is None and tokens > 1 and finished > first_token:
+        tokens_per_second = (tokens - 1) / (finished - first_token)
+    return {
+        "first_token_ms": (first_token - started) * 1000,
+        "tokens_per_second": tokens_per_second or 0.0,
+        "tokens": timings.get("predicted_n", tokens),
+    }
+
+
+def measure_embedding(port, text, host="127.0.0.1", timeout=REQUEST_TIMEOUT):
+    """Latencia de una petición /embedding en milisegundos"""
+    request = urllib.request.Request(f"http://{host}:{port}/embedding",
+                                     data=json.dumps({"content": text}).encode("utf-8"),
+                                     headers={"Content-Type": "application/json"})
+    started = time.monotonic()
+    with urllib.request.urlopen(request, timeout=timeout) as response:
+        response.read()
+    return (time.monotonic() - started) * 1000
+
+
+def run_warmup(port, prompts=None, n_predict=DEFAULT_TOKENS, embeddings=False, host="127.0.0.1", log=None):
+    """Envía la carga de calentamiento y resume la primera y la última medición
+
+    Args:
+        port: Puerto del servidor (ya responde a /health)
+        prompts: Textos de las peticiones (por defecto, DEFAULT_PROMPTS)
+        n_predict: Tokens que se generan en cada una
+        embeddings: Calentar también /embedding (servidor lanzado con --embedding)
+        log: Función que recibe los mensajes de progreso (por defecto, el registro)
+
+    Returns:
+        Informe {"requests", "failed", "cold", "warm", "embedding_ms"}; cold y warm son
+        las mediciones de measure_completion de la primera y la última petición
+        (None si ninguna salió bien)
+    """
+    log = log or logging.getLogger(__name__).info
+    prompts = list(prompts or DEFAULT_PROMPTS)
+    results = []
+    failed = 0
+    embedding_ms = []
+    for prompt in prompts:
+        try:
+            results.append(measure_completion(port, prompt, n_predict, host))
+            if embeddings:
+                embedding_ms.append(measure_embedding(port, prompt, host))
+        except (urllib.error.URLError, OSError, ValueError) as e:
+            failed += 1
+            log(f"⚠ Petición de calentamiento fallida: {e}")
+    report = {
+        "requests": len(prompts),
+        "failed": failed,
+        "cold": results[0] if results else None,
+        "warm": results[-1] if results else None,
+        "embedding_ms": [embedding_ms[0], embedding_ms[-1]] if embedding_ms else None,
+    }
+    log(format_report(report))
+    return report
+
+
+def format_report(report):
+    """Resumen en una línea: primer token y velocidad en frío -> en caliente"""
+    cold, warm = report["cold"], report["warm"]
+    if cold is None:
+        return f"🔥 Calentamiento sin respuestas ({report['failed']} de {report['requests']} peticiones fallidas)"
+    text = (f"🔥 Calentamiento ({report['requests']} peticiones): primer token {cold['first_token_ms']:.0f} → "
+            f"{warm['first_token_ms']:.0f} ms, {cold['tokens_per_second']:.1f} → {warm['tokens_per_second']:.1f} t/s")
+    if report["embedding_ms"]:
+        text += f", embedding {report['embedding_ms'][0]:.0f} → {report['embedding_ms'][1]:.0f} ms"
+    if report["failed"]:
+        text += f" ({report['failed']} fallidas)"
+    return text
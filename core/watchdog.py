@@ -0,0 +1,166 @@
+# Vigilancia de instancias de llama-server: detecta caídas y bloqueos y las reinicia
+import time
+import logging
+import threading
+from collections import deque, namedtuple
+from core.llama_server import (probe_health, STATE_READY, STATE_EXITED, STATE_FAILED, STATE_STOPPED,
+                               STATE_RESTARTING)
+
+# Registro de una caída
+#   timestamp: time.time() del momento en que se detectó
+#   reason: "exit" (el proceso terminó), "hang" (/health dejó de responder) o "failed" (no llegó a estar listo)
+#   exit_code: Código de salida del proceso (negativo si lo mató una señal, p. ej. -9 por OOM)
+#   last_lines: Últimas líneas de salida antes de la caída
+CrashRecord = namedtuple("CrashRecord", ["timestamp", "reason", "exit_code", "last_lines"])
+
+# Líneas de salida que se guardan con cada caída
+CRASH_TAIL_LINES = 20
+
+
+class Watchdog:
+    """Vigila una ServerInstance y la reinicia si se cae o se queda colgada
+
+    - Caída: el proceso termina sin que nadie lo haya detenido (estado "exited")
+      o no llega a responder en /health ("failed").
+    - Bloqueo: con la instancia lista, /health no responde durante hang_timeout segundos;
+      el proceso se detiene y se trata como una caída.
+
+    Los reinicios esperan base_delay * 2^n segundos (hasta max_delay), siendo n el
+    número de caídas recientes. Si hay max_restarts caídas dentro de crash_window
+    segundos se deja de reiniciar (protección contra bucles de caídas) hasta que el
+    usuario vuelva a arrancar la instancia.
+    """
+
+    def __init__(self, instance, hang_timeout=30.0, check_interval=5.0, base_delay=1.0, max_delay=60.0,
+                 max_restarts=5, crash_window=300.0, health_host="127.0.0.1"):
+        """
+        Args:
+            instance: ServerInstance que se vigila
+            hang_timeout: Segundos sin respuesta de /health para considerar la instancia colgada (0 = no vigilar)
+            check_interval: Segundos entre comprobaciones de /health
+            base_delay: Espera antes del primer reinicio
+            max_delay: Espera máxima entre reinicios
+            max_restarts: Caídas dentro de crash_window a partir de las cuales se deja de reiniciar
+            crash_window: Ventana (segundos) para contar caídas recientes
+        """
+        self.instance = instance
+        self.hang_timeout = hang_timeout
+        self.check_interval = check_interval
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.max_restarts = max_restarts
+        self.crash_window = crash_window
+        self.health_host = health_host
+        self.crashes = deque(maxlen=50)
+        self.restarts = 0
+        self.gave_up = False
+        self.next_restart_delay = None
+        self.restart_timer = None
+        self.restarting = False  # Detención provocada por el propio watchdog
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.monitor = None
+        instance.add_state_listener(self._on_state)
+        if hang_timeout:
+            self.monitor = threading.Thread(target=self._monitor_health, daemon=True)
+            self.monitor.start()
+
+    def recent_crashes(self):
+        """Caídas dentro de la ventana de crash_window segundos"""
+        limit = time.time() - self.crash_window
+        return [crash for crash in self.crashes if crash.timestamp >= limit]
+
+    def _on_state(self, instance):
+        state = instance.state
+        if state == STATE_STOPPED and not self.restarting:
+            # Parada manual: se cancela cualquier reinicio pendiente y se empieza de cero
+            self._cancel_timer()
+            self.gave_up = False
+        elif state in (STATE_EXITED, STATE_FAILED) and not self.restarting:
+            reason = "exit" if state == STATE_EXITED else "failed"
+            self._handle_crash(reason)
+
+    def _handle_crash(self, reason):
+        instance = self.instance
+        crash = CrashRecord(time.time(), reason, instance.exit_code, instance.log_buffer.tail(CRASH_TAIL_LINES))
+        with self.lock:
+            self.crashes.append(crash)
+            recent = len(self.recent_crashes())
+            if recent >= self.max_restarts:
+                self.gave_up = True
+                self.next_restart_delay = None
+            else:
+                self.next_restart_delay = min(self.max_delay, self.base_delay * 2 ** (recent - 1))
+        logging.getLogger(__name__).warning(
+            f"Instancia {instance.id} ({instance.name}:{instance.port}) caída: {reason}, código {crash.exit_code}")
+        if self.gave_up:
+            instance.log(f"🛑 {recent} caídas en {self.crash_window:.0f} s: no se reiniciará automáticamente")
+            return
+        delay = self.next_restart_delay
+        instance.log(f"🔁 Reinicio automático en {delay:.0f} s (caída {recent} de {self.max_restarts})")
+        instance._set_state(STATE_RESTARTING)
+        with self.lock:
+            self.restart_timer = threading.Timer(delay, self._restart)
+            self.restart_timer.daemon = True
+            self.restart_timer.start()
+
+    def _restart(self):
+        with self.lock:
+            self.restart_timer = None
+        if self.stop_event.is_set() or self.instance.state != STATE_RESTARTING:
+            return
+        self.restarts += 1
+        if self.instance.is_running():
+            # "failed" con el proceso vivo: hay que detenerlo antes de relanzarlo
+            self.restarting = True
+            try:
+                self.instance.stop(drain=0)
+            finally:
+                self.restarting = False
+        self.instance.start()
+
+    def _cancel_timer(self):
+        with self.lock:
+            if self.restart_timer is not None:
+                self.restart_timer.cancel()
+                self.restart_timer = None
+
+    def _monitor_health(self):
+        last_ok = time.monotonic()
+        while not self.stop_event.wait(self.check_interval):
+            instance = self.instance
+            if instance.state != STATE_READY:
+                last_ok = time.monotonic()
+                continue
+            if probe_health(instance.port, self.health_host, timeout=min(self.check_interval, 5.0)) == 200:
+                last_ok = time.monotonic()
+                continue
+            if time.monotonic() - last_ok < self.hang_timeout:
+                continue
+            instance.log(f"⚠ /health sin respuesta durante {self.hang_timeout:.0f} s: se reinicia el servidor")
+            self.restarting = True
+            try:
+                instance.stop(drain=0)  # Colgado: no atiende peticiones que drenar
+            finally:
+                self.restarting = False
+            self._handle_crash("hang")
+            last_ok = time.monotonic()
+
+    def close(self):
+        """Deja de vigilar la instancia (no la detiene)"""
+        self.stop_event.set()
+        self._cancel_timer()
+        if self._on_state in self.instance.state_listeners:
+            self.instance.state_listeners.remove(self._on_state)
+
+    def describe(self):
+        """Resumen serializable del historial de caídas"""
+        last = self.crashes[-1] if self.crashes else None
+        return {
+            "restarts": self.restarts,
+            "crash_count": len(self.crashes),
+            "recent_crashes": len(self.recent_crashes()),
+            "gave_up": self.gave_up,
+            "next_restart_delay": self.next_restart_delay,
+            "last_crash": last._asdict() if last else None,
+        }
@@ -1,4 +1,22 @@
 #!/usr/bin/env python3
+import sys
+from core import startup_profile
+
+# --daemon: sin interfaz gráfica, solo el supervisor y la API de control (no necesita GTK)
+if "--daemon" in sys.argv:
+    from core.daemon import main as daemon_main
+    sys.exit(daemon_main([arg for arg in sys.argv[1:] if arg != "--daemon"]))
+
+# --profile-startup: imprime cuánto tarda cada fase del arranque
+if "--profile-startup" in sys.argv:
+    startup_profile.enable()
+
+# El catálogo del idioma configurado se lee en un hilo mientras se importa GTK
+from core.config import load_config
+from core.i18n import set_language, preload_translations
+set_language(load_config().get("language", "es"))
+preload_translations()
+
 # Comprobación de dependencias de sistema para PyGObject/GTK
 try:
     import gi
@@ -17,17 +35,23 @@ Por favor, instala los siguientes paquetes del sistema antes de ejecutar esta ap
 Luego, vuelve a ejecutar la aplicación dentro de tu entorno virtual si lo usas.
 """)
     exit(1)
+startup_profile.mark("importar GTK")
 
 from gui.main_window import create_main_window
 import logging
 logger = logging.getLogger(__name__)
+startup_profile.mark("importar la interfaz")
 
 def on_activate(app):
+    startup_profile.mark("Gtk.Application activa")
+
     # Crear la ventana principal
     window = create_main_window(app)
+    startup_profile.mark("construir la ventana")
     
     # Mostrar la ventana
     window.present()
+    startup_profile.mark("present()")
 
 def main():
     logger.info("Starting LLaMA Server GUI application")
@@ -36,4 +60,4 @@ def main():
     app.run()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,126 @@
+# Panel con la lista de instancias de llama-server gestionadas por el supervisor
+from gi.repository import Gtk, Pango, GObject
+from core.llama_server import (STATE_STARTING, STATE_WARMING, STATE_READY, STATE_DRAINING, STATE_STOPPING,
+                               STATE_RESTARTING)
+
+# Icono para cada estado de instancia
+STATE_ICONS = {
+    "stopped": "⚪",
+    "starting": "⏳",
+    "warming": "🔥",
+    "ready": "🟢",
+    "draining": "⏳",
+    "stopping": "⏹",
+    "exited": "🔴",
+    "failed": "❌",
+    "restarting": "🔁",
+}
+
+
+class InstancesPanel(Gtk.Box):
+    """Lista de instancias con botones para arrancar, detener, inspeccionar y eliminar"""
+
+    def __init__(self, supervisor, on_inspect, on_add, on_proxy_toggled=None, proxy_port=8000):
+        """
+        Args:
+            supervisor: ServerSupervisor (o RemoteSupervisor del demonio) con las instancias
+            on_inspect: Callback(instancia) para mostrar su salida y métricas
+            on_add: Callback() para crear una instancia con la configuración del formulario
+            on_proxy_toggled: Callback(activo, puerto) del interruptor del proxy de reparto
+            proxy_port: Puerto inicial del proxy
+        """
+        super().__init__(orientation=Gtk.Orientation.VERTICAL, spacing=5)
+        self.supervisor = supervisor
+        self.on_inspect = on_inspect
+
+        title = Gtk.Label(xalign=0)
+        title.set_markup("<b>Instancias</b>")
+        self.append(title)
+
+        self.list_box = Gtk.ListBox()
+        self.list_box.set_selection_mode(Gtk.SelectionMode.NONE)
+        self.append(self.list_box)
+
+        add_button = Gtk.Button(label="➕ Nueva instancia con la configuración actual")
+        add_button.connect("clicked", lambda button: on_add())
+        self.append(add_button)
+
+        # Proxy de reparto: un único puerto para todas las instancias listas
+        if on_proxy_toggled is not None:
+            proxy_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
+            self.proxy_check = Gtk.CheckButton(label="⚖ Repartir peticiones entre réplicas en el puerto")
+            self.proxy_check.set_tooltip_text("Envía cada petición a la instancia lista con menos peticiones en curso")
+            self.proxy_port_spin = Gtk.SpinButton.new_with_range(1, 65535, 1)
+            self.proxy_port_spin.set_value(proxy_port)
+            self.proxy_check.connect(
+                "toggled", lambda check: on_proxy_toggled(check.get_active(), int(self.proxy_port_spin.get_value())))
+            self.proxy_check.bind_property("active", self.proxy_port_spin, "sensitive",
+                                         GObject.BindingFlags.SYNC_CREATE | GObject.BindingFlags.INVERT_BOOLEAN)
+            proxy_box.append(self.proxy_check)
+            proxy_box.append(self.proxy_port_spin)
+            self.append(proxy_box)
+            self.proxy_label = Gtk.Label(xalign=0)
+            self.proxy_label.set_visible(False)
+            self.append(self.proxy_label)
+        self.refresh()
+
+    def refresh(self):
+        """Vuelve a dibujar las filas (hay pocas instancias, no merece la pena un modelo)"""
+        child = self.list_box.get_first_child()
+        while child:
+            next_child = child.get_next_sibling()
+            self.list_box.remove(child)
+            child = next_child
+        instances = self.supervisor.list()
+        for instance in instances:
+            self.list_box.append(self._build_row(instance))
+        self.list_box.set_visible(bool(instances))
+
+    def set_proxy_status(self, text):
+        """Muestra (o con None oculta) el estado del proxy debajo del interruptor"""
+        self.proxy_label.set_visible(text is not None)
+        if text is not None:
+            self.proxy_label.set_text(text)
+
+    def _build_row(self, instance):
+        row = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
+        icon = STATE_ICONS.get(instance.state, "")
+        label = Gtk.Label(label=f"{icon} #{instance.id} {instance.name} :{instance.port}", xalign=0)
+        label.set_hexpand(True)
+        label.set_ellipsize(Pango.EllipsizeMode.END)
+        watchdog = instance.watchdog.describe() if instance.watchdog is not None else None
+        if watchdog and watchdog["last_crash"]:
+            # Última caída: código de salida y últimas líneas de salida
+            crash = watchdog["last_crash"]
+            label.set_tooltip_text(f"Caídas: {watchdog['crash_count']} · última: {crash['reason']}, "
+                                   f"código {crash['exit_code']}\n" + "".join(crash["last_lines"][-8:]))
+        row.append(label)
+
+        running = instance.state in (STATE_STARTING, STATE_WARMING, STATE_READY, STATE_DRAINING, STATE_STOPPING,
+                                     STATE_RESTARTING)
+        toggle = Gtk.Button(label="■" if running else "▶")
+        if instance.state == STATE_DRAINING:
+            toggle.set_tooltip_text("Detener ya, sin esperar a las peticiones en curso")
+        else:
+            toggle.set_tooltip_text("Detener" if running else "Arrancar")
+        toggle.set_sensitive(instance.state != STATE_STOPPING)
+        toggle.connect("clicked", self._on_toggle, instance.id, running, instance.state == STATE_DRAINING)
+        row.append(toggle)
+
+        inspect = Gtk.Button(label="🔍")
+        inspect.set_tooltip_text("Ver salida y métricas")
+        inspect.connect("clicked", lambda button: self.on_inspect(self.supervisor.get(instance.id)))
+        row.append(inspect)
+
+        remove = Gtk.Button(label="✖")
+        remove.set_tooltip_text("Eliminar instancia")
+        remove.connect("clicked", lambda button: self.supervisor.remove(instance.id, wait=False))
+        row.append(remove)
+        return row
+
+    def _on_toggle(self, button, instance_id, running, draining=False):
+        if running:
+            # El estado "stopped" llega por el supervisor; durante el drenado, se corta
+            self.supervisor.stop(instance_id, wait=False, drain=0 if draining else None)
+        else:
+            self.supervisor.start(instance_id)
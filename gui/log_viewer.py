@@ -0,0 +1,179 @@
+# Visor de registros de sesión del servidor (búsqueda y salto a línea sin cargar el fichero entero)
+import os
+import logging
+import threading
+from gi.repository import Gtk, GLib
+from core.server_log import LogReader, list_logs, LOG_DIR
+from gui.dialogs import show_error
+
+# Líneas que se muestran por página
+PAGE_LINES = 500
+
+# Resultados máximos de una búsqueda
+MAX_RESULTS = 2000
+
+# Niveles del filtro (clave interna, texto mostrado)
+LEVELS = [(None, "Todos los niveles"), ("error", "Errores"), ("warning", "Avisos"), ("info", "Información")]
+
+
+class LogViewerWindow(Gtk.Window):
+    def __init__(self, parent=None, log_dir=LOG_DIR):
+        super().__init__(title="Registros del servidor")
+        if parent is not None:
+            self.set_transient_for(parent)
+        self.set_default_size(900, 600)
+        self.log_dir = log_dir
+        self.reader = None
+        self.results = []
+        self.generation = 0  # Solo se muestra el resultado del último trabajo en segundo plano
+        self.jobs = {}  # Lector -> trabajos que lo están usando (no se cierra hasta que terminen)
+
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        box.set_margin_top(6)
+        box.set_margin_bottom(6)
+        box.set_margin_start(6)
+        box.set_margin_end(6)
+        self.set_child(box)
+
+        # Selector de fichero de registro
+        self.log_paths = list_logs(self.log_dir)
+        self.file_choice = Gtk.DropDown(model=Gtk.StringList.new([os.path.basename(p) for p in self.log_paths]))
+        self.file_choice.connect("notify::selected", self.on_file_selected)
+        box.append(self.file_choice)
+
+        # Barra de búsqueda: expresión regular, nivel y salto a línea
+        search_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self.search_entry = Gtk.SearchEntry()
+        self.search_entry.set_placeholder_text("Expresión regular")
+        self.search_entry.set_hexpand(True)
+        self.search_entry.connect("activate", self.on_search)
+        self.level_choice = Gtk.DropDown(model=Gtk.StringList.new([label for _, label in LEVELS]))
+        search_button = Gtk.Button(label="Buscar")
+        search_button.connect("clicked", self.on_search)
+        self.line_spin = Gtk.SpinButton.new_with_range(1, 1, 1)
+        goto_button = Gtk.Button(label="Ir a línea")
+        goto_button.connect("clicked", self.on_goto_line)
+        for widget in (self.search_entry, self.level_choice, search_button, self.line_spin, goto_button):
+            search_box.append(widget)
+        box.append(search_box)
+
+        self.info_label = Gtk.Label(xalign=0)
+        box.append(self.info_label)
+
+        scroll = Gtk.ScrolledWindow()
+        scroll.set_vexpand(True)
+        self.text_view = Gtk.TextView()
+        self.text_view.set_editable(False)
+        self.text_view.set_cursor_visible(False)
+        self.text_view.set_monospace(True)
+        scroll.set_child(self.text_view)
+        box.append(scroll)
+
+        self.connect("close-request", self.on_close_request)
+        if self.log_paths:
+            self.open_log(self.log_paths[0])
+        else:
+            self.info_label.set_text(f"No hay registros en {self.log_dir}")
+
+    def run_job(self, reader, work, done):
+        """Ejecuta work() en un hilo y done(resultado, error) en el hilo de GTK
+
+        Búsquedas en registros de varios GB y la descompresión de los .gz no deben
+        bloquear la ventana. Si entretanto se pide otro trabajo, el resultado de
+        este se descarta. El lector que usa el hilo no se cierra hasta que acaba.
+        """
+        self.generation += 1
+        generation = self.generation
+        if reader is not None:
+            self.jobs[reader] = self.jobs.get(reader, 0) + 1
+
+        def finish(result, error):
+            if reader is not None:
+                self.jobs[reader] -= 1
+                if not self.jobs[reader]:
+                    del self.jobs[reader]
+                    if reader is not self.reader:
+                        reader.close()  # Se cambió de registro mientras el hilo lo usaba
+            if generation == self.generation:
+                done(result, error)
+            elif isinstance(result, LogReader):
+                result.close()
+            return False
+
+        def worker():
+            try:
+                result, error = work(), None
+            except Exception as e:
+                result, error = None, e
+            GLib.idle_add(finish, result, error)
+
+        threading.Thread(target=worker, name="log-viewer", daemon=True).start()
+
+    def release_reader(self):
+        """Deja de mostrar el registro actual y lo cierra si ningún hilo lo está usando"""
+        reader, self.reader = self.reader, None
+        if reader is not None and reader not in self.jobs:
+            reader.close()
+
+    def open_log(self, log_path):
+        """Abre un registro en segundo plano y muestra su primera página"""
+        self.release_reader()
+        self.text_view.get_buffer().set_text("")
+        self.info_label.set_text(f"Abriendo {os.path.basename(log_path)}…")
+
+        def done(reader, error):
+            if error is not None:
+                self.info_label.set_text("")
+                show_error(self, f"No se pudo abrir {log_path}: {error}")
+                return
+            self.reader = reader
+            self.line_spin.set_range(1, max(1, len(reader)))
+            self.show_page(0)
+            logging.getLogger(__name__).info(f"Registro abierto: {log_path} ({len(reader)} líneas)")
+
+        self.run_job(None, lambda: LogReader(log_path), done)
+
+    def show_page(self, first_line):
+        """Muestra PAGE_LINES líneas a partir de first_line (empezando en 0)"""
+        lines = self.reader.get_lines(first_line, PAGE_LINES)
+        text = "\n".join(f"{first_line + i + 1:>8}  {line}" for i, line in enumerate(lines))
+        self.text_view.get_buffer().set_text(text)
+        self.info_label.set_text(f"Líneas {first_line + 1}-{first_line + len(lines)} de {len(self.reader)}")
+
+    def on_file_selected(self, dropdown, _param):
+        selected = dropdown.get_selected()
+        if 0 <= selected < len(self.log_paths):
+            self.open_log(self.log_paths[selected])
+
+    def on_goto_line(self, button):
+        if self.reader is not None:
+            self.show_page(max(0, int(self.line_spin.get_value()) - 1))
+
+    def on_search(self, widget):
+        if self.reader is None:
+            return
+        reader = self.reader
+        pattern = self.search_entry.get_text() or None
+        level = LEVELS[self.level_choice.get_selected()][0]
+        self.info_label.set_text("Buscando…")
+
+        def search():
+            results = reader.search(pattern, level, limit=MAX_RESULTS)
+            return results, "\n".join(f"{n + 1:>8}  {reader.get_line(n)}" for n in results)
+
+        def done(found, error):
+            if error is not None:
+                self.info_label.set_text("")
+                show_error(self, f"Búsqueda no válida: {error}")
+                return
+            self.results, text = found
+            self.text_view.get_buffer().set_text(text)
+            more = " (límite alcanzado)" if len(self.results) >= MAX_RESULTS else ""
+            self.info_label.set_text(f"{len(self.results)} coincidencias{more}")
+
+        self.run_job(reader, search, done)
+
+    def on_close_request(self, window):
+        self.generation += 1  # Los trabajos pendientes ya no tienen dónde mostrarse
+        self.release_reader()
+        return False
@@ -1,22 +1,111 @@
 # Ventana principal y eventos
 import os
-from gi.repository import Gtk, Gdk
-from core.config import load_config, save_config
-from core.utils import find_models
-from gui.model_selector import update_model_list, get_selected_model_path
+import threading
+import subprocess
+from gi.repository import Gtk, Gdk, GLib
+from core.config import load_config, update_config
+from gui.model_selector import ModelDirWatcher, create_model_choice, get_selected_model_path
 from gui.dialogs import show_error, show_info_dialog
-from core.i18n import get_text, set_language, get_current_language, LANGUAGES
+from core.i18n import get_text, set_language, get_current_language, LANGUAGES, TextBindings
+from core.log_buffer import LogRingBuffer, DEFAULT_MAX_LINES
+from core.metrics import format_metrics
+from core.llama_server import (check_server_running, kill_server, STOP_GRACE_SECONDS, STATE_WARMING,
+                               STATE_READY, STATE_DRAINING, STATE_EXITED, STATE_FAILED, STATE_RESTARTING)
+from core.warmup import format_report as format_warmup_report
+from gui.log_viewer import LogViewerWindow
+from gui.instances_panel import InstancesPanel
+from gui.profile_editor import ProfileEditorWindow
+from core.proxy import LoadBalancingProxy, bind_supervisor
+from core.autotune import Autotuner, load_tuned_profile
+from core.memory_fit import estimate_memory, describe_advice, gpu_offload_available, MODE_OPTIONS, MODE_MLOCK
+from core.launch_profile import ProfileStore, build_launch_profile
+from core.model_index import get_model_index
+from core.prefetch import ModelPrefetcher
+from core.daemon_client import connect_supervisor
+from core import startup_profile
 import logging
 
+# Directorios donde se buscan temas GTK
+THEME_DIRS = [
+    "/usr/share/themes",
+    os.path.expanduser("~/.themes"),
+    os.path.expanduser("~/.local/share/themes"),
+]
+
+# Temas de respaldo si no se pueden listar los directorios
+FALLBACK_THEMES = ["Adwaita", "Adwaita-dark", "HighContrast"]
+
+# Milisegundos sin cambios de selección antes de empezar a precargar el modelo
+PREFETCH_DELAY_MS = 500
+
+
+def get_available_gtk_themes():
+    """Temas GTK instalados (los que tienen un directorio gtk-3.0 o gtk-4.0), en orden alfabético
+
+    Recorre varios directorios del disco, así que se llama desde un hilo en segundo plano.
+    """
+    themes = []
+    try:
+        for theme_dir in THEME_DIRS:
+            if os.path.exists(theme_dir):
+                for theme in os.listdir(theme_dir):
+                    if (os.path.exists(os.path.join(theme_dir, theme, "gtk-3.0")) or
+                            os.path.exists(os.path.join(theme_dir, theme, "gtk-4.0"))):
+                        if theme not in themes:
+                            themes.append(theme)
+        themes.sort()
+    except Exception as e:
+        logging.getLogger(__name__).warning(f"Error al obtener temas GTK: {e}")
+        themes = list(FALLBACK_THEMES)
+    return themes
+
+
+def resolve_theme_name(theme, system_theme, available_themes):
+    """Convierte los temas antiguos de la configuración (light, dark, system) en un tema GTK
+
+    Args:
+        theme: Tema guardado en la configuración
+        system_theme: Tema GTK actual del sistema
+        available_themes: Temas instalados (puede estar vacío si aún no se han buscado)
+    """
+    if theme == "light" and "dark" in system_theme.lower():
+        # Intentar encontrar la versión clara del tema
+        light_theme = system_theme.replace("dark", "").replace("Dark", "").strip()
+        if light_theme and light_theme in available_themes:
+            return light_theme
+    elif theme == "dark" and "dark" not in system_theme.lower():
+        # Intentar encontrar la versión oscura del tema
+        for candidate in available_themes:
+            if system_theme in candidate and "dark" in candidate.lower():
+                return candidate
+        return "Adwaita-dark" if "Adwaita-dark" in available_themes else system_theme
+    elif theme == "system":
+        return system_theme
+    return theme
+
 class MainWindow(Gtk.ApplicationWindow):
     def __init__(self, app):
         # --- Establecer el idioma antes de crear widgets para que todos los textos se muestren correctamente ---
+        # La configuración se lee una sola vez para todo el arranque
         config = load_config()
+        self.startup_config = config
         set_language(config.get("language", "es"))
         super().__init__(application=app)
         self.server_running = False
-        self.process = None
-        self.set_title(get_text("app_title"))
+        # Todas las instancias de llama-server las gestiona el supervisor (el del demonio si está
+        # en marcha, así los servidores sobreviven a la ventana); self.instance es la del botón principal
+        self.supervisor = connect_supervisor()
+        self.instance = None
+        self.swap_target = None  # Instancia nueva de un cambio de modelo en caliente en curso
+        self.inspected = None
+        self.proxy = None  # Proxy de reparto opcional delante de las instancias
+        self.proxy_binding = None
+        self.autotuner = None  # Ajuste automático en curso
+        self.profile_store = ProfileStore()  # Perfiles de lanzamiento con nombre por modelo
+        self.supervisor.add_listener(lambda event, inst: GLib.idle_add(self.on_supervisor_event, event, inst))
+        # Textos fijos traducibles: se vuelven a aplicar juntos al cambiar de idioma
+        self.texts = TextBindings()
+        self.texts.bind(self.set_title, "app_title")
         self.set_default_size(450, 450)
         self.set_decorated(True)
 
@@ -29,85 +118,71 @@ class MainWindow(Gtk.ApplicationWindow):
 
         # Entradas y estado
         self.models_dir_entry = Gtk.Entry()
-        self.models_dir_entry.set_placeholder_text(get_text("models_dir_placeholder"))
-        self.select_folder_button = Gtk.Button(label=get_text("select_folder_button"))
+        self.texts.bind(self.models_dir_entry.set_placeholder_text, "models_dir_placeholder")
+        self.select_folder_button = Gtk.Button()
+        self.texts.bind(self.select_folder_button.set_label, "select_folder_button")
         self.bin_dir_entry = Gtk.Entry()
-        self.bin_dir_entry.set_placeholder_text(get_text("bin_dir_placeholder"))
+        self.texts.bind(self.bin_dir_entry.set_placeholder_text, "bin_dir_placeholder")
         self.ngl_entry = Gtk.Entry()
-        self.ngl_entry.set_placeholder_text(get_text("ngl_placeholder"))
+        self.texts.bind(self.ngl_entry.set_placeholder_text, "ngl_placeholder")
         self.port_entry = Gtk.Entry()
-        self.port_entry.set_placeholder_text(get_text("port_placeholder"))
+        self.texts.bind(self.port_entry.set_placeholder_text, "port_placeholder")
         self.prompt_entry = Gtk.Entry()
-        self.prompt_entry.set_placeholder_text(get_text("prompt_placeholder"))
+        self.texts.bind(self.prompt_entry.set_placeholder_text, "prompt_placeholder")
         self.temp_entry = Gtk.Entry()
-        self.temp_entry.set_placeholder_text(get_text("temp_placeholder"))
+        self.texts.bind(self.temp_entry.set_placeholder_text, "temp_placeholder")
         self.top_k_entry = Gtk.Entry()
-        self.top_k_entry.set_placeholder_text(get_text("top_k_placeholder"))
+        self.texts.bind(self.top_k_entry.set_placeholder_text, "top_k_placeholder")
         self.top_p_entry = Gtk.Entry()
-        self.top_p_entry.set_placeholder_text(get_text("top_p_placeholder"))
+        self.texts.bind(self.top_p_entry.set_placeholder_text, "top_p_placeholder")
         self.repeat_penalty_entry = Gtk.Entry()
-        self.repeat_penalty_entry.set_placeholder_text(get_text("repeat_penalty_placeholder"))
+        self.texts.bind(self.repeat_penalty_entry.set_placeholder_text, "repeat_penalty_placeholder")
         self.threads_entry = Gtk.Entry()
-        self.threads_entry.set_placeholder_text(get_text("threads_placeholder"))
+        self.texts.bind(self.threads_entry.set_placeholder_text, "threads_placeholder")
         self.ctx_size_entry = Gtk.Entry()
-        self.ctx_size_entry.set_placeholder_text(get_text("ctx_size_placeholder"))
+        self.texts.bind(self.ctx_size_entry.set_placeholder_text, "ctx_size_placeholder")
         self.max_tokens_entry = Gtk.Entry()
-        self.max_tokens_entry.set_placeholder_text(get_text("max_tokens_placeholder"))
-
-        # Crea el modelo y el selector de modelos
-        models_dir = self.models_dir_entry.get_text() or os.path.dirname(os.path.realpath(__file__))
-        models = find_models(models_dir)
-        model_store = Gtk.StringList()
-        for model in models:
-            model_store.append(os.path.basename(model))
-        self.model_choice = Gtk.DropDown(model=model_store)
-        self.model_choice.set_selected(0)
-
-        # ... aquí iría el código que añade todos los widgets a self.box ...
-
-        # --- IMPORTANTE ---
-        # Asigna los valores de configuración SOLO después de añadir los widgets al contenedor,
-        # para que los valores sean visibles en la interfaz GTK.
-        config = load_config()
-        print("[DEBUG] Configuración cargada:", config)
-        # Convertir todos los valores a string antes de asignarlos al widget (por si vienen como int/float)
-        if config.get("models_dir"):
-            print("[DEBUG] models_dir:", config["models_dir"])
-            self.models_dir_entry.set_text(str(config["models_dir"]))
-        if config.get("bin_base"):
-            print("[DEBUG] bin_base:", config["bin_base"])
-            self.bin_dir_entry.set_text(str(config["bin_base"]))
-        if config.get("ngl"):
-            print("[DEBUG] ngl:", config["ngl"])
-            self.ngl_entry.set_text(str(config["ngl"]))
-        if config.get("port"):
-            print("[DEBUG] port:", config["port"])
-            self.port_entry.set_text(str(config["port"]))
-        if config.get("prompt"):
-            print("[DEBUG] prompt:", config["prompt"])
-            self.prompt_entry.set_text(str(config["prompt"]))
-        if config.get("temp"):
-            print("[DEBUG] temp:", config["temp"])
-            self.temp_entry.set_text(str(config["temp"]))
-        if config.get("top_k"):
-            print("[DEBUG] top_k:", config["top_k"])
-            self.top_k_entry.set_text(str(config["top_k"]))
-        if config.get("top_p"):
-            print("[DEBUG] top_p:", config["top_p"])
-            self.top_p_entry.set_text(str(config["top_p"]))
-        if config.get("repeat_penalty"):
-            print("[DEBUG] repeat_penalty:", config["repeat_penalty"])
-            self.repeat_penalty_entry.set_text(str(config["repeat_penalty"]))
-        if config.get("threads"):
-            print("[DEBUG] threads:", config["threads"])
-            self.threads_entry.set_text(str(config["threads"]))
-        if config.get("ctx_size"):
-            print("[DEBUG] ctx_size:", config["ctx_size"])
-            self.ctx_size_entry.set_text(str(config["ctx_size"]))
-        if config.get("max_tokens"):
-            print("[DEBUG] max_tokens:", config["max_tokens"])
-            self.max_tokens_entry.set_text(str(config["max_tokens"]))
+        self.texts.bind(self.max_tokens_entry.set_placeholder_text, "max_tokens_placeholder")
 
+        # Crea el selector de modelos (vacío: lo rellena el vigilante del directorio de modelos)
+        self.model_choice = create_model_choice()
+        self.model_watcher = ModelDirWatcher(
+            self.model_choice,
+            on_updated=self.on_model_list_updated,
+            root_timeout=float(config.get("models_scan_timeout", 30)),
+        )
+
+        # Precarga del modelo seleccionado en la caché de páginas (acelera el arranque desde discos lentos)
+        self.prefetcher = None
+        self.prefetch_timer = None
+        self.prefetch_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
+        self.prefetch_check = Gtk.CheckButton(label="📥 Precargar en memoria el modelo seleccionado")
+        self.prefetch_check.set_tooltip_text(
+            "Lee el fichero del modelo en segundo plano para que el sistema lo tenga en caché al arrancar")
+        self.prefetch_check.set_active(str(config.get("model_prefetch", "false")).lower() in ("1", "true", "yes"))
+        self.prefetch_label = Gtk.Label(xalign=0)
+        self.prefetch_label.set_hexpand(True)
+        self.prefetch_cancel_button = Gtk.Button(label="✖")
+        self.prefetch_cancel_button.set_tooltip_text("Cancelar la precarga")
+        self.prefetch_cancel_button.set_visible(False)
+        self.prefetch_box.append(self.prefetch_check)
+        self.prefetch_box.append(self.prefetch_label)
+        self.prefetch_box.append(self.prefetch_cancel_button)
+        self.prefetch_check.connect("toggled", self.on_prefetch_toggled)
+        self.prefetch_cancel_button.connect("clicked", lambda button: self.cancel_prefetch())
+        self.model_choice.connect("notify::selected", self.on_model_highlighted)
+
+        # Asigna los valores de configuración a las entradas
+        for key, entry in (
+            ("models_dir", self.models_dir_entry), ("bin_base", self.bin_dir_entry), ("ngl", self.ngl_entry),
+            ("port", self.port_entry), ("prompt", self.prompt_entry), ("temp", self.temp_entry),
+            ("top_k", self.top_k_entry), ("top_p", self.top_p_entry),
+            ("repeat_penalty", self.repeat_penalty_entry), ("threads", self.threads_entry),
+            ("ctx_size", self.ctx_size_entry), ("max_tokens", self.max_tokens_entry),
+        ):
+            if config.get(key):
+                entry.set_text(str(config[key]))
+        logging.getLogger(__name__).debug(f"Configuración cargada: {config}")
 
         # No necesitamos CSS personalizado, usamos las clases estándar de GTK
 
@@ -124,7 +199,6 @@ class MainWindow(Gtk.ApplicationWindow):
         }
         
         # Obtener el idioma actual
-        config = load_config()
         current_lang = config.get("language", "es")
         
         # Crear un contenedor horizontal para la bandera y el nombre del idioma
@@ -148,82 +222,27 @@ class MainWindow(Gtk.ApplicationWindow):
         # Conectar el evento de clic al selector de idiomas
         self.language_button.connect("clicked", self.on_language_button_clicked)
         
-        # Establecer el idioma actual
-        config = load_config()
-        current_lang = config.get("language", "es")
-        current_theme = config.get("theme", "system")
-        
-        # Aplicar el idioma guardado en la configuración
-        set_language(current_lang)
-        
-        # Aplicar el tema guardado en la configuración
-        self.apply_theme(current_theme)
-        
-        # Función para obtener los temas GTK disponibles
-        def get_available_gtk_themes():
-            themes = []
-            try:
-                # Buscar temas en las ubicaciones estándar
-                theme_dirs = [
-                    "/usr/share/themes",
-                    os.path.expanduser("~/.themes"),
-                    os.path.expanduser("~/.local/share/themes")
-                ]
-                
-                for theme_dir in theme_dirs:
-                    if os.path.exists(theme_dir):
-                        for theme in os.listdir(theme_dir):
-                            # Verificar si es un tema GTK válido (debe tener un directorio gtk-3.0 o gtk-4.0)
-                            if (os.path.exists(os.path.join(theme_dir, theme, "gtk-3.0")) or 
-                               os.path.exists(os.path.join(theme_dir, theme, "gtk-4.0"))):
-                                if theme not in themes:
-                                    themes.append(theme)
-                
-                # Ordenar los temas alfabéticamente
-                themes.sort()
-            except Exception as e:
-                print(f"[DEBUG] Error al obtener temas GTK: {e}")
-                # Temas predeterminados como respaldo
-                themes = ["Adwaita", "Adwaita-dark", "HighContrast"]
-            
-            return themes
-        
-        # Obtener los temas disponibles
-        self.available_themes = get_available_gtk_themes()
-        print(f"[DEBUG] Temas GTK disponibles: {self.available_themes}")
-        
+        # Aplicar el tema guardado en la configuración (aún no hay nada dibujado: sin refresco forzado)
+        configured_theme = config.get("theme", "system")
+        self.apply_theme(configured_theme, force_refresh=False)
+
+        # Los temas instalados se buscan después de mostrar la ventana (start_deferred_work)
+        self.available_themes = []
+
         # Crear el botón de tema
         self.theme_button = Gtk.Button()
-        
+
         # Crear el contenedor para el botón de tema
         theme_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=5)
-        
-        # Obtener el tema actual
-        current_theme = config.get("theme", "system")
-        
+
         # Obtener el tema actual del sistema
         settings = Gtk.Settings.get_default()
-        system_theme = settings.get_property("gtk-theme-name") or "Adwaita"
-        print(f"[DEBUG] Tema actual del sistema: {system_theme}")
-        
-        # Si el tema guardado es uno de los antiguos (light, dark, system), convertirlo
-        if current_theme in ["light", "dark", "system"]:
-            if current_theme == "light" and "dark" in system_theme.lower():
-                # Intentar encontrar la versión clara del tema
-                light_theme = system_theme.replace("dark", "").replace("Dark", "").strip()
-                if light_theme and light_theme in self.available_themes:
-                    current_theme = light_theme
-            elif current_theme == "dark" and "dark" not in system_theme.lower():
-                # Intentar encontrar la versión oscura del tema
-                for theme in self.available_themes:
-                    if system_theme in theme and ("dark" in theme.lower() or "Dark" in theme):
-                        current_theme = theme
-                        break
-                else:
-                    current_theme = "Adwaita-dark" if "Adwaita-dark" in self.available_themes else system_theme
-            elif current_theme == "system":
-                current_theme = system_theme
-        
+        self.system_theme = settings.get_property("gtk-theme-name") or "Adwaita"
+
+        # Si el tema guardado es uno de los antiguos (light, dark, system), convertirlo;
+        # se vuelve a resolver cuando se conozcan los temas instalados
+        current_theme = resolve_theme_name(configured_theme, self.system_theme, self.available_themes)
+
         # Guardar el tema actual para usarlo en la aplicación
         self.current_theme = current_theme
         
@@ -236,6 +255,7 @@ class MainWindow(Gtk.ApplicationWindow):
         theme_name_label = Gtk.Label()
         theme_name_label.set_name("theme_name_label")
         theme_name_label.set_text(current_theme)
+        self.theme_name_label = theme_name_label
         
         # Añadir las etiquetas al contenedor
         theme_box.append(theme_icon_label)
@@ -267,6 +287,13 @@ class MainWindow(Gtk.ApplicationWindow):
         # Estilo de terminal (fondo oscuro, texto claro)
         self.terminal_view.get_style_context().add_class("monospace")
         self.terminal_buffer = self.terminal_view.get_buffer()
+        # Marca al final del texto para el auto-desplazamiento
+        self.terminal_end_mark = self.terminal_buffer.create_mark("end", self.terminal_buffer.get_end_iter(), False)
+        # Búfer circular acotado: el hilo lector escribe aquí y la vista se vuelca en el siguiente
+        # fotograma, solo cuando hay líneas nuevas (sin servidor activo no se despierta el reloj)
+        self.terminal_flush_scheduled = False
+        self.log_buffer = LogRingBuffer(int(config.get("log_max_lines", DEFAULT_MAX_LINES)),
+                                        on_pending=self.on_terminal_pending)
         
         # Crear un proveedor de CSS para el estilo de terminal
         css_terminal = b'''
@@ -307,6 +334,7 @@ class MainWindow(Gtk.ApplicationWindow):
         self.box.append(self.models_dir_entry)
         self.box.append(self.select_folder_button)
         self.box.append(self.model_choice)
+        self.box.append(self.prefetch_box)
         self.box.append(self.ngl_entry)
         self.box.append(self.threads_entry)
         self.box.append(self.port_entry)
@@ -319,16 +347,46 @@ class MainWindow(Gtk.ApplicationWindow):
         self.box.append(self.max_tokens_entry)
         
         self.box.append(self.start_button)
+        # Cambio de modelo en caliente: solo con el servidor en marcha
+        self.swap_button = Gtk.Button(label="🔄 Cambiar al modelo seleccionado sin cortes")
+        self.swap_button.set_tooltip_text(
+            "Carga el modelo seleccionado en otro puerto y, cuando está listo, retira el actual tras terminar "
+            "sus peticiones en curso. Los clientes que usan el puerto del proxy no notan el cambio.")
+        self.swap_button.set_visible(False)
+        self.swap_button.connect("clicked", self.on_swap_clicked)
+        self.box.append(self.swap_button)
         self.box.append(self.status_label)
+        # Métricas de rendimiento en vivo de la instancia inspeccionada
+        self.metrics_version = 0
+        self.metrics_label = Gtk.Label()
+        self.metrics_label.set_visible(False)
+        self.box.append(self.metrics_label)
         self.box.append(self.terminal_scroll)  # Añadir terminal al layout
 
-        # Actualizar el selector de modelos con la ruta cargada de la configuración
-        if config.get("models_dir") and os.path.isdir(config["models_dir"]):
-            update_model_list(self.models_dir_entry, self.model_choice)
-            if self.model_choice.get_model().get_n_items() > 0:
-                self.status_label.set_label(get_text("status_models_loaded"))
-            else:
-                self.status_label.set_label(get_text("status_no_models"))
+        # Lista de instancias (varios modelos a la vez en distintos puertos)
+        self.instances_panel = InstancesPanel(self.supervisor, on_inspect=self.on_inspect_instance,
+                                              on_add=self.on_add_instance,
+                                              on_proxy_toggled=self.on_proxy_toggled,
+                                              proxy_port=int(config.get("proxy_port", "8000")))
+        self.box.append(self.instances_panel)
+
+        # Botón para abrir el visor de registros guardados en disco
+        self.logs_button = Gtk.Button(label="📜 Registros del servidor")
+        self.logs_button.connect("clicked", self.on_logs_button_clicked)
+        self.box.append(self.logs_button)
+
+        # Ajuste automático de hilos y lotes para el modelo seleccionado
+        self.autotune_button = Gtk.Button(label="⚙ Autotune del modelo seleccionado")
+        self.autotune_button.set_tooltip_text(
+            "Prueba varias combinaciones de --threads, --threads-batch, --batch-size/--ubatch-size y --parallel "
+            "y guarda la más rápida para los próximos arranques de este modelo")
+        self.autotune_button.connect("clicked", self.on_autotune_clicked)
+        self.box.append(self.autotune_button)
+
+        # Perfiles de lanzamiento del modelo seleccionado (--parallel, lotes, caché KV, NUMA...)
+        self.profiles_button = Gtk.Button(label="🛠 Opciones avanzadas del modelo")
+        self.profiles_button.connect("clicked", self.on_profiles_button_clicked)
+        self.box.append(self.profiles_button)
 
         # Vincular evento del botón
         self.start_button.connect("clicked", self.on_start_button_clicked)
@@ -337,8 +395,58 @@ class MainWindow(Gtk.ApplicationWindow):
         self.models_dir_entry.connect("changed", self.on_models_dir_changed)
         self.select_folder_button.connect("clicked", self.on_select_folder_clicked)
 
+        # Lo que no hace falta para el primer fotograma se hace después de mostrar la ventana
+        # (la prioridad de GLib.idle_add es menor que la del redibujado)
+        self.pending_startup = set()
+        GLib.idle_add(self.start_deferred_work)
+
         logging.getLogger(__name__).info("MainWindow creada y configurada")
 
+    def start_deferred_work(self):
+        """Trabajo del arranque que se aplaza hasta que la ventana ya se ha dibujado
+
+        Búsqueda de temas GTK (en un hilo), escaneo de la carpeta de modelos (en
+        segundo plano, por el vigilante) y arranque del proxy si estaba activado.
+        """
+        startup_profile.mark("primer fotograma")
+        config = self.startup_config
+        self.startup_config = None
+
+        self.pending_startup.add("themes")
+        threading.Thread(target=lambda: GLib.idle_add(self.on_themes_discovered, get_available_gtk_themes()),
+                         name="theme-discovery", daemon=True).start()
+
+        # Buscar modelos en segundo plano en las rutas cargadas de la configuración
+        # (el estado se actualiza desde on_model_list_updated según llegan resultados)
+        if config.get("models_dir"):
+            self.pending_startup.add("models")
+            self.model_watcher.set_directory(config["models_dir"], immediate=True)
+
+        if config.get("proxy_enabled") == "true":
+            self.instances_panel.proxy_check.set_active(True)
+            startup_profile.mark("proxy")
+        return False
+
+    def finish_startup_task(self, name, phase):
+        """Marca como terminada una tarea aplazada del arranque y, con la última, imprime el informe"""
+        if name not in self.pending_startup:
+            return
+        self.pending_startup.discard(name)
+        startup_profile.mark(phase)
+        if not self.pending_startup:
+            startup_profile.report()
+
+    def on_themes_discovered(self, themes):
+        """Recibe los temas instalados y resuelve de nuevo los nombres antiguos de la configuración"""
+        self.available_themes = themes
+        logging.getLogger(__name__).debug(f"Temas GTK disponibles: {themes}")
+        configured_theme = load_config().get("theme", "system")
+        if configured_theme in ("light", "dark", "system"):
+            self.current_theme = resolve_theme_name(configured_theme, self.system_theme, themes)
+            self.theme_name_label.set_text(self.current_theme)
+        self.finish_startup_task("themes", f"temas GTK ({len(themes)})")
+        return False
+
     def on_start_button_clicked(self, button):
         if not self.server_running:
             # Solo cambiamos el botón si start_server() devuelve True (éxito)
@@ -348,24 +456,93 @@ class MainWindow(Gtk.ApplicationWindow):
                 self.start_button.get_style_context().add_class("destructive-action")  # Botón rojo (acción destructiva)
         else:
             self.stop_server()
-            self.start_button.set_label(get_text("start_button"))
-            self.start_button.get_style_context().remove_class("destructive-action")
-            self.start_button.get_style_context().add_class("suggested-action")
+            self.reset_start_button()
+
+    def reset_start_button(self):
+        """Vuelve a poner el botón principal en modo "Iniciar"."""
+        self.start_button.set_label(get_text("start_button"))
+        self.start_button.get_style_context().remove_class("destructive-action")
+        self.start_button.get_style_context().add_class("suggested-action")
 
 
     def on_models_dir_changed(self, entry):
-        """Actualiza el selector de modelos cuando cambia la ruta de modelos."""
-        from gi.repository import GLib
-        models_dir = entry.get_text()
-        if not os.path.isdir(models_dir):
-            self.model_choice.set_model(Gtk.StringList())
-            self.status_label.set_label("❌ Carpeta inválida. Selecciona una carpeta válida de modelos GGUF.")
+        """Programa el cambio de directorio de modelos (con debounce mientras se escribe)."""
+        self.model_watcher.set_directory(entry.get_text())
+
+    def on_model_list_updated(self, valid, scanning):
+        """Actualiza el estado cuando el vigilante aplica cambios al selector de modelos."""
+        if self.server_running:
             return
-        update_model_list(entry, self.model_choice)
-        if self.model_choice.get_model().get_n_items() == 0:
+        n_models = self.model_choice.get_model().get_n_items()
+        if not valid:
+            self.status_label.set_label("❌ Carpeta inválida. Selecciona una carpeta válida de modelos GGUF.")
+        elif scanning:
+            self.status_label.set_label(f"🔎 Buscando modelos GGUF... ({n_models})")
+        elif n_models == 0:
             self.status_label.set_label("⚠️ No hay modelos GGUF en la carpeta configurada.")
         else:
             self.status_label.set_label("Modelos actualizados para la ruta seleccionada.")
+        if not scanning:
+            self.finish_startup_task("models", f"escaneo de modelos ({n_models})")
+
+    def on_model_highlighted(self, *args):
+        """Cambio del modelo seleccionado: reprograma la precarga (con un retardo, por si sigue cambiando)."""
+        if self.prefetch_timer is not None:
+            GLib.source_remove(self.prefetch_timer)
+        self.prefetch_timer = GLib.timeout_add(PREFETCH_DELAY_MS, self.start_prefetch)
+
+    def on_prefetch_toggled(self, check):
+        update_config({"model_prefetch": "true" if check.get_active() else "false"})
+        if check.get_active():
+            self.start_prefetch()
+        else:
+            # Se olvida antes de cancelarla: su aviso de fin llegará después y no debe escribir en la etiqueta
+            prefetcher, self.prefetcher = self.prefetcher, None
+            if prefetcher is not None:
+                prefetcher.cancel()
+            self.prefetch_cancel_button.set_visible(False)
+            self.prefetch_label.set_text("")
+
+    def start_prefetch(self):
+        """Empieza a leer el modelo seleccionado en la caché de páginas (cancelando la precarga anterior)."""
+        self.prefetch_timer = None
+        self.cancel_prefetch()
+        path = get_selected_model_path(self.model_choice, self.models_dir_entry.get_text())
+        if not self.prefetch_check.get_active() or not path or not os.path.isfile(path):
+            return False
+        prefetcher = ModelPrefetcher(
+            path,
+            on_progress=lambda fraction: GLib.idle_add(self.on_prefetch_progress, prefetcher, fraction),
+            on_finished=lambda cached, error: GLib.idle_add(self.on_prefetch_finished, prefetcher, cached, error),
+        )
+        self.prefetcher = prefetcher
+        self.prefetch_label.set_text("📥 0 %")
+        self.prefetch_cancel_button.set_visible(True)
+        prefetcher.start()
+        return False
+
+    def cancel_prefetch(self):
+        if self.prefetcher is not None:
+            self.prefetcher.cancel()
+
+    def on_prefetch_progress(self, prefetcher, fraction):
+        if prefetcher is self.prefetcher:
+            self.prefetch_label.set_text(f"📥 {fraction * 100:.0f} %")
+        return False
+
+    def on_prefetch_finished(self, prefetcher, cached, error):
+        """Fin de la precarga: porcentaje del modelo que está en la caché según mincore()."""
+        if prefetcher is not self.prefetcher:
+            return False  # Sustituida por la de otro modelo
+        self.prefetcher = None
+        self.prefetch_cancel_button.set_visible(False)
+        text = f"en caché: {cached * 100:.0f} %" if cached is not None else "leído"
+        if error == "cancelled":
+            text = f"cancelada ({text})"
+        elif error is not None:
+            text = f"error: {error}"
+        self.prefetch_label.set_text(f"📥 {text}")
+        return False
 
     def on_select_folder_clicked(self, button):
         self.folder_dialog = Gtk.FileChooserNative(
@@ -384,9 +561,6 @@ class MainWindow(Gtk.ApplicationWindow):
 
     def start_server(self):
         # Crear o reutilizar un botón para abrir el servidor en el navegador
-        from gi.repository import Gtk, Gio, GLib
-        import subprocess
-        
         # Obtener el puerto configurado
         port = int(self.port_entry.get_text()) if self.port_entry.get_text() else 8080
         
@@ -400,7 +574,7 @@ class MainWindow(Gtk.ApplicationWindow):
                 subprocess.Popen(["xdg-open", self.link_url])
             except Exception as e:
                 print(f"Error al abrir el navegador: {e}")
-                show_error(self, f"{get_text("error_prefix").format(e)}")
+                show_error(self, get_text("error_prefix").format(e))
         
         # Verificar si ya existe el botón
         if not hasattr(self, 'link_widget') or self.link_widget is None:
@@ -422,8 +596,6 @@ class MainWindow(Gtk.ApplicationWindow):
         try:
             self.status_label.set_label(get_text("status_server_starting"))
             # --- Comprobación de servidor activo en el puerto seleccionado ---
-            from core.llama_server import check_server_running, kill_server
-            from gi.repository import Gtk
             port = int(self.port_entry.get_text()) if self.port_entry.get_text() else 8080
             pid = check_server_running(port)
             if pid:
@@ -447,129 +619,53 @@ class MainWindow(Gtk.ApplicationWindow):
                     
                 # Esperamos a que se cierre el diálogo (esto bloquea hasta que se destruya)
                 while dialog.get_visible():
-                    from gi.repository import GLib
                     GLib.MainContext.default().iteration(True)
                         
                 if response_yes[0]:  # Si el usuario hizo clic en SÍ
-                    exito = kill_server(pid)
-                    if not exito:
-                        self.status_label.set_label("❔ No se pudo detener el servidor anterior.")
-                        return False  # Fallo al detener el servidor existente
+                    # Se detiene en segundo plano; al terminar se vuelve a pulsar "Iniciar"
+                    self.status_label.set_label("Deteniendo el servidor anterior...")
+                    self.start_button.set_sensitive(False)
+                    kill_server(pid, float(load_config().get("stop_grace", STOP_GRACE_SECONDS)),
+                                on_done=lambda ok: GLib.idle_add(self.on_previous_server_stopped, ok))
+                    return False
                 else:
                     self.status_label.set_label("Operación cancelada por el usuario.")
                     return False  # Operación cancelada por el usuario
             # --- Fin comprobación de servidor activo ---
-            # Obtención completa de parámetros desde los widgets
-            # Obtener la ruta absoluta al modelo seleccionado usando la función especializada
-            models_dir = self.models_dir_entry.get_text()
-            model_path = get_selected_model_path(self.model_choice, models_dir)
-            ngl = int(self.ngl_entry.get_text()) if hasattr(self, 'ngl_entry') else 0
-            bin_base = self.bin_dir_entry.get_text()
-            port = self.port_entry.get_text()
-            prompt = self.prompt_entry.get_text()
-            temp = self.temp_entry.get_text()
-            top_k = self.top_k_entry.get_text()
-            top_p = self.top_p_entry.get_text()
-            repeat_penalty = self.repeat_penalty_entry.get_text()
-            threads = self.threads_entry.get_text()
-            ctx_size = self.ctx_size_entry.get_text()
-            max_tokens = self.max_tokens_entry.get_text()
-
-            # Guardar configuración al iniciar servidor
-            save_config(models_dir, bin_base, ngl, port, prompt, temp, top_k, top_p, repeat_penalty, threads, ctx_size, max_tokens)
-
-            # Lanzar el servidor como proceso
-            import subprocess
-            import threading
-            
+            settings = self.collect_launch_settings()
+
+            # Guardar configuración al iniciar servidor (se escribe en segundo plano)
+            self.save_current_config()
+
             # Mostrar el terminal y añadir una línea separadora antes de iniciar un nuevo servidor
             self.terminal_scroll.set_visible(True)  # Hacer visible el terminal
             
-            # Añadir separador si ya hay contenido
-            if self.terminal_buffer.get_char_count() > 0:
-                self.add_terminal_text("\n" + "-"*50 + "\n\nNueva sesión del servidor:\n")
-            else:
-                # Si está vacío, simplemente inicializar
-                self.add_terminal_text("Iniciando servidor LLaMA...\n")
-            
-            # Construir el comando con los parámetros correctos para llama-server
-            cmd = [
-                os.path.join(bin_base, "llama-server"),
-                "--model", model_path,
-                "--host", "0.0.0.0",
-                "--port", str(port),
-                "--n-gpu-layers", str(ngl),
-                "--temp", str(temp),
-                "--top-k", str(top_k),
-                "--top-p", str(top_p),
-                "--repeat-penalty", str(repeat_penalty),
-                "--threads", str(threads),
-                "--ctx-size", str(ctx_size),
-                "--n-predict", str(max_tokens),
-                "--mlock",
-                "--cont-batching",
-                "--flash-attn"
-            ]
-            
-            # Guardar el prompt en la configuración pero no usarlo como parámetro directo
-            # ya que --system-prompt no es un parámetro válido para llama-server
-            
-            # Mostrar el comando en el terminal
-            self.add_terminal_text("Ejecutando: " + " ".join(cmd) + "\n\n")
-            
-            # Iniciar el proceso de forma segura, desconectado del proceso principal
+            # La instancia principal la gestiona el supervisor, igual que las demás;
+            # la de la sesión anterior se retira para liberar su puerto
+            if self.instance is not None:
+                self.supervisor.remove(self.instance.id)
+                self.instance = None
             try:
-                # Iniciar el proceso de forma segura
-                self.process = subprocess.Popen(
-                    cmd, 
-                    stdout=subprocess.PIPE, 
-                    stderr=subprocess.STDOUT, 
-                    text=True, 
-                    bufsize=1
-                )
-                print(f"Servidor iniciado con PID {self.process.pid}")
-            except Exception as e:
-                print(f"Error al iniciar el proceso: {e}")
+                instance = self.create_instance(settings, port=int(settings["port"] or 8080), name="principal")
+            except RuntimeError as e:
                 self.status_label.set_label(f"❔ Error al iniciar el servidor: {e}")
                 return False
+            self.instance = instance
+            self.inspect_instance(instance)
+            instance.log("\n" + "-"*50 + "\n\nNueva sesión del servidor:" if self.terminal_buffer.get_char_count() > 0
+                         else "Iniciando servidor LLaMA...")
+            # A partir de aquí el modelo lo lee llama-server: la precarga solo competiría por el disco
+            self.cancel_prefetch()
+            if not instance.start():
+                self.status_label.set_label("❔ Error al iniciar el servidor.")
+                return False
+            print(f"Servidor iniciado con PID {instance.describe()['pid']}")
             self.server_running = True
             self.set_inputs_sensitive(False)
-            
-            # Función para leer la salida del proceso en segundo plano
-            def read_output():
-                try:
-                    for line in iter(self.process.stdout.readline, ''):
-                        if line:  # Si la línea no está vacía
-                            # Imprimir en la terminal normal
-                            print(line, end='', flush=True)
-                            
-                            # Usar GLib.idle_add para actualizar la UI desde otro hilo
-                            from gi.repository import GLib
-                            # Usar una función auxiliar para capturar correctamente el valor de line
-                            def add_line_to_terminal(text):
-                                self.add_terminal_text(text)
-                                return False  # Importante: devolver False para que GLib.idle_add no lo llame repetidamente
-                            
-                            GLib.idle_add(add_line_to_terminal, line)
-                        else:
-                            break
-                except Exception as e:
-                    from gi.repository import GLib
-                    error_msg = f"Error leyendo salida: {e}\n"
-                    
-                    def add_error_to_terminal(text):
-                        self.add_terminal_text(text)
-                        return False
-                    
-                    GLib.idle_add(add_error_to_terminal, error_msg)
-            
-            # Iniciar hilo para leer la salida
-            output_thread = threading.Thread(target=read_output)
-            output_thread.daemon = True  # El hilo se cerrará cuando el programa principal termine
-            output_thread.start()
-            # Mostrar mensaje claro y actualizar botón
-            url = f"http://localhost:{port}"
-            self.status_label.set_label(get_text("status_server_started").format(port))
+
+            # El proceso está lanzado, pero el modelo aún se está cargando: la instancia espera a /health
+            url = f"http://localhost:{instance.port}"
+            self.status_label.set_label("⏳ " + get_text("status_server_starting"))
             self.link_url = url  # Actualizar la URL por si cambió el puerto
             self.link_widget.set_label(f"Abrir en navegador ({url})")
             self.link_widget.set_sensitive(True)
@@ -581,10 +677,262 @@ class MainWindow(Gtk.ApplicationWindow):
             show_error(self, get_text("error_server_start").format(e))
             return False  # Error al iniciar el servidor
 
+    def collect_launch_settings(self):
+        """Lee del formulario todos los parámetros de lanzamiento."""
+        models_dir = self.models_dir_entry.get_text()
+        return {
+            "models_dir": models_dir,
+            # Obtener la ruta absoluta al modelo seleccionado usando la función especializada
+            "model_path": get_selected_model_path(self.model_choice, models_dir),
+            "ngl": self.ngl_entry.get_text() or "0",
+            "bin_base": self.bin_dir_entry.get_text(),
+            "port": self.port_entry.get_text(),
+            "prompt": self.prompt_entry.get_text(),
+            "temp": self.temp_entry.get_text(),
+            "top_k": self.top_k_entry.get_text(),
+            "top_p": self.top_p_entry.get_text(),
+            "repeat_penalty": self.repeat_penalty_entry.get_text(),
+            "threads": self.threads_entry.get_text(),
+            "ctx_size": self.ctx_size_entry.get_text(),
+            "max_tokens": self.max_tokens_entry.get_text(),
+        }
+
+    def build_launch_profile(self, settings):
+        """Perfil de lanzamiento efectivo: formulario, Autotune y perfil con nombre activo del modelo."""
+        # El prompt no es un argumento (--system-prompt no existe en llama-server): es el
+        # prefijo de sistema que la instancia precarga al arrancar (prompt_prefix)
+        model_path = settings.get("model_path")
+        tuned = load_tuned_profile(model_path) if model_path else None
+        named = self.profile_store.active(model_path) if model_path else None
+        return build_launch_profile(settings, tuned=tuned, named=named)
+
+    def create_instance(self, settings, port=None, name=None):
+        """Crea en el supervisor una instancia con los parámetros dados (sin arrancarla)."""
+        config = load_config()
+        profile = self.build_launch_profile(settings)
+        memory_report = self.plan_memory(settings["model_path"], profile, config)
+        # Registro en disco de la sesión (rotativo, con índice de líneas para el visor)
+        log_options = {
+            "max_bytes": int(float(config.get("log_max_mb", 64)) * 1024 * 1024),
+            "max_files": int(config.get("log_max_files", 50)),
+            "compress": str(config.get("log_compress", "false")).lower() in ("1", "true", "yes"),
+        }
+        instance = self.supervisor.create_instance(
+            settings["model_path"],
+            profile.to_argv(),
+            port=port,
+            bin_base=settings["bin_base"],
+            name=name,
+            settings=settings,
+            log_max_lines=int(config.get("log_max_lines", DEFAULT_MAX_LINES)),
+            log_options=log_options,
+            watchdog=self.watchdog_options(config),
+            stop_grace=float(config.get("stop_grace", STOP_GRACE_SECONDS)),
+            drain_timeout=float(config.get("drain_timeout", 0)),
+            prompt_prefix=settings.get("prompt") or None,
+            warmup=self.warmup_options(config),
+        )
+        for line in memory_report:
+            instance.log(line)
+        return instance
+
+    def plan_memory(self, model_path, profile, config):
+        """Elige el modo de carga (mlock/mmap/no-mmap) y el contexto según la memoria disponible.
+
+        Modifica el perfil salvo en lo que el usuario haya fijado en él (--mlock/--no-mmap).
+
+        Returns:
+            Líneas de informe para la salida del servidor
+        """
+        mode = config.get("memory_mode", "auto")
+        fixed = profile.is_set("mlock") or profile.is_set("no_mmap")
+        if not fixed:
+            profile.update(MODE_OPTIONS.get(mode, MODE_OPTIONS[MODE_MLOCK]))
+        summary = get_model_index().get(model_path)
+        if not summary or "error" in summary:
+            return []
+        try:
+            advice = estimate_memory(model_path, summary, profile.get("ctx_size") or 0,
+                                     parallel=profile.get("parallel") or 1,
+                                     n_gpu_layers=profile.get("ngl") or 0,
+                                     cache_type_k=profile.get("cache_type_k") or "f16",
+                                     cache_type_v=profile.get("cache_type_v") or "f16",
+                                     gpu_offload=self.gpu_offload(config))
+        except (OSError, ValueError) as e:
+            logging.getLogger(__name__).warning(f"No se pudo estimar la memoria: {e}")
+            return []
+        report = describe_advice(advice)
+        if mode == "auto" and not fixed:
+            profile.update(MODE_OPTIONS[advice.mode])
+        auto_fit = str(config.get("ctx_auto_fit", "true")).lower() in ("1", "true", "yes")
+        if auto_fit and advice.max_ctx and advice.ctx_size > advice.max_ctx:
+            profile.update({"ctx_size": advice.max_ctx})
+            report.append(f"🧮 --ctx-size reducido de {advice.ctx_size} a {advice.max_ctx} para que quepa en memoria")
+        return report
+
+    def gpu_offload(self, config):
+        """True si las capas de --n-gpu-layers se descuentan de la RAM al estimar la memoria."""
+        value = str(config.get("gpu_offload", "auto")).lower()
+        if value == "auto":
+            return gpu_offload_available()
+        return value in ("1", "true", "yes")
+
+    def watchdog_options(self, config):
+        """Parámetros del watchdog según la configuración (None si está desactivado)."""
+        if str(config.get("watchdog", "true")).lower() not in ("1", "true", "yes"):
+            return None
+        return {
+            "hang_timeout": float(config.get("watchdog_hang_timeout", 30)),
+            "max_restarts": int(config.get("watchdog_max_restarts", 5)),
+        }
+
+    def warmup_options(self, config):
+        """Carga de calentamiento según la configuración (None si está desactivada)."""
+        if str(config.get("warmup", "true")).lower() not in ("1", "true", "yes"):
+            return None
+        prompts = [prompt.strip() for prompt in str(config.get("warmup_prompts", "")).split("|") if prompt.strip()]
+        return {"prompts": prompts or None, "n_predict": int(config.get("warmup_tokens", 16))}
+
+    def on_add_instance(self):
+        """Crea y arranca una instancia adicional con la configuración del formulario (puerto libre automático)."""
+        settings = self.collect_launch_settings()
+        if not settings["model_path"]:
+            show_error(self, get_text("error_no_model"))
+            return
+        try:
+            instance = self.create_instance(settings)
+        except RuntimeError as e:
+            show_error(self, str(e))
+            return
+        self.terminal_scroll.set_visible(True)
+        self.inspect_instance(instance)
+        instance.start()
+
+    def inspect_instance(self, instance):
+        """Muestra en el terminal y en las métricas la salida de la instancia indicada."""
+        if instance is None:
+            return
+        self.inspected = instance
+        self.log_buffer.on_pending = None
+        self.log_buffer = instance.log_buffer
+        self.log_buffer.on_pending = self.on_terminal_pending
+        self.metrics_version = -1
+        self.metrics_label.set_visible(True)
+        # Volcar lo que ya tenía la instancia y seguir desde ahí en on_terminal_tick (lo nuevo lo avisa on_pending)
+        text, _ = self.log_buffer.drain(full=True)
+        self.terminal_buffer.set_text(text)
+        self.terminal_view.scroll_to_mark(self.terminal_end_mark, 0.0, False, 0.0, 0.0)
+
+    def on_swap_clicked(self, button):
+        """Sustituye la instancia principal por el modelo seleccionado sin cortar el servicio."""
+        settings = self.collect_launch_settings()
+        if self.instance is None or self.instance.state != STATE_READY:
+            show_error(self, "El servidor tiene que estar listo para cambiar de modelo en caliente.")
+            return
+        if not settings["model_path"] or settings["model_path"] == self.instance.model_path:
+            show_error(self, "Selecciona un modelo distinto del que está cargado.")
+            return
+        if self.proxy is None:
+            # Sin proxy el modelo nuevo quedaría en otro puerto y los clientes perderían el servicio
+            show_error(self, "Activa el proxy en el panel de instancias para cambiar de modelo sin cortes: "
+                             "los clientes deben usar su puerto, que se mantiene durante el cambio.")
+            return
+        profile = self.build_launch_profile(settings)
+        memory_report = self.plan_memory(settings["model_path"], profile, load_config())
+        try:
+            new = self.supervisor.swap(self.instance.id, settings["model_path"], profile.to_argv(),
+                                       settings=settings, wait=False)
+        except RuntimeError as e:
+            show_error(self, str(e))
+            return
+        for line in memory_report:
+            new.log(line)
+        self.swap_target = new
+        button.set_sensitive(False)
+        self.status_label.set_label(f"🔄 Cargando {new.name} en el puerto {new.port}; "
+                                    f"el modelo actual sigue atendiendo peticiones...")
+
+    def on_swap_progress(self, event, instance):
+        """Estado de la instancia nueva de un cambio en caliente."""
+        if event == "state" and instance.state == STATE_READY:
+            # Lista: pasa a ser la principal (la anterior se drena y se retira por su cuenta)
+            self.swap_target = None
+            self.instance = instance
+            self.inspect_instance(instance)
+            self.link_url = f"http://localhost:{instance.port}"
+            self.link_widget.set_label(f"Abrir en navegador ({self.link_url})")
+            self.swap_button.set_sensitive(True)
+            self.status_label.set_label(f"🔄 Modelo cambiado a {instance.name} (puerto {instance.port}) "
+                                        f"· ⏱ {instance.ready_seconds:.1f} s")
+        elif event == "removed":
+            self.swap_target = None
+            self.swap_button.set_sensitive(True)
+            self.status_label.set_label(f"❌ {instance.name} no llegó a estar listo; sigue el modelo anterior.")
+
+    def on_supervisor_event(self, event, instance):
+        """Cambios en las instancias (llega por GLib.idle_add desde cualquier hilo)."""
+        self.instances_panel.refresh()
+        self.update_proxy_status()
+        if instance is self.swap_target:
+            self.on_swap_progress(event, instance)
+            return False
+        if event == "removed" and instance is self.instance:
+            self.instance = None
+        if instance is not self.instance or event != "state":
+            return False
+        if instance.state == STATE_READY:
+            text = get_text("status_server_started").format(instance.port)
+            text += f" · ⏱ {instance.ready_seconds:.1f} s"
+            if instance.previous_ready_seconds is not None:
+                text += f" (media anterior {instance.previous_ready_seconds:.1f} s)"
+            if instance.warmup_report is not None:
+                text += "\n" + format_warmup_report(instance.warmup_report)
+            self.status_label.set_label(text)
+        elif instance.state == STATE_WARMING:
+            self.status_label.set_label(f"🔥 Modelo cargado en {instance.ready_seconds:.1f} s; "
+                                        f"calentando antes de servir peticiones...")
+        elif instance.state == STATE_DRAINING:
+            self.status_label.set_label(f"⏳ Esperando a que terminen las peticiones en curso "
+                                        f"(máximo {instance.drain_timeout:.0f} s)...")
+        elif instance.state == STATE_RESTARTING:
+            delay = instance.watchdog.next_restart_delay
+            self.status_label.set_label(f"🔁 El servidor se cayó (código {instance.exit_code}); "
+                                        f"reinicio automático en {delay:.0f} s.")
+        elif instance.state in (STATE_EXITED, STATE_FAILED):
+            if instance.state == STATE_EXITED:
+                text = f"❌ El servidor terminó (código {instance.exit_code})."
+            else:
+                text = "❌ El servidor no respondió a tiempo en /health."
+            watchdog = instance.watchdog
+            if watchdog is not None and not watchdog.gave_up:
+                return False  # El watchdog lo reiniciará (llegará el estado "restarting")
+            if watchdog is not None:
+                text += f" Demasiadas caídas seguidas ({watchdog.describe()['recent_crashes']}): no se reinicia."
+            # Nadie lo va a relanzar: la interfaz vuelve al estado de servidor detenido
+            self.server_running = False
+            self.set_inputs_sensitive(True)
+            self.reset_start_button()
+            if getattr(self, "link_widget", None) is not None:
+                self.link_widget.set_sensitive(False)
+            self.status_label.set_label(text)
+        return False
+
+    def on_previous_server_stopped(self, ok):
+        """Fin de la detención del servidor que ocupaba el puerto (en el hilo de la interfaz)."""
+        self.start_button.set_sensitive(True)
+        if ok:
+            self.on_start_button_clicked(self.start_button)
+        else:
+            self.status_label.set_label("❔ No se pudo detener el servidor anterior.")
+        return False
+
     def stop_server(self):
+        """Pide la detención de la instancia principal sin bloquear la interfaz.
+
+        La señal, la espera y la recogida del proceso se hacen en otro hilo; el botón
+        principal queda desactivado hasta que llega el aviso (on_server_stopped).
+        """
         # Deshabilitar el botón del navegador cuando el servidor se detiene
-        from gi.repository import Gtk, GLib
-        
         if hasattr(self, 'link_widget') and self.link_widget is not None:
             # Deshabilitar el botón en lugar de eliminarlo
             self.link_widget.set_sensitive(False)
@@ -593,97 +941,48 @@ class MainWindow(Gtk.ApplicationWindow):
 
         # Actualizar la interfaz para mostrar el estado
         self.status_label.set_label("Deteniendo servidor...")
-        
-        # Verificar si hay un proceso activo para detener
-        if self.process is not None:
-            try:
-                print("Intentando detener el servidor...")
-                
-                # Obtener el PID del proceso si está disponible
-                pid = None
-                if hasattr(self.process, 'pid'):
-                    pid = self.process.pid
-                
-                if pid is not None:
-                    print(f"Deteniendo servidor con PID {pid}...")
-                    
-                    # Usar nuestra función kill_server
-                    try:
-                        from core.llama_server import kill_server
-                        exito = kill_server(pid)
-                        if exito:
-                            print("Servidor detenido correctamente")
-                        else:
-                            print("No se pudo detener el servidor completamente")
-                    except Exception as e:
-                        print(f"No se pudo detener el servidor: {e}")
-                
-                # Importante: Limpiar las referencias al proceso cuidadosamente
-                if hasattr(self.process, 'stdout') and self.process.stdout is not None:
-                    try:
-                        self.process.stdout.close()
-                    except Exception as e:
-                        print(f"Error al cerrar stdout: {e}")
-                
-                if hasattr(self.process, 'stderr') and self.process.stderr is not None:
-                    try:
-                        self.process.stderr.close()
-                    except Exception as e:
-                        print(f"Error al cerrar stderr: {e}")
-                
-                print("Proceso de detención del servidor completado")
-            except Exception as e:
-                print(f"Error general al detener el servidor: {e}")
-            finally:
-                # Siempre ejecutar estas acciones al final, incluso si hubo errores
-                # Desconectar el proceso de la aplicación principal
-                self.process = None
-                self.server_running = False
-                
-                # Actualizar la interfaz
-                self.set_inputs_sensitive(True)
-        
+
+        if self.swap_target is not None:
+            # Cambio en caliente a medias: se descarta el modelo nuevo
+            self.supervisor.remove(self.swap_target.id, wait=False)
+            self.swap_target = None
+        if self.instance is None:
+            self.on_server_stopped(True)
+            return True
+        self.start_button.set_sensitive(False)
+        try:
+            logging.getLogger(__name__).info(f"Deteniendo servidor en el puerto {self.instance.port}...")
+            self.instance.stop(wait=False, on_stopped=lambda ok: GLib.idle_add(self.on_server_stopped, ok))
+        except Exception as e:
+            logging.getLogger(__name__).error(f"Error general al detener el servidor: {e}")
+            self.on_server_stopped(False)
+        return True
+
+    def on_server_stopped(self, ok):
+        """Fin de stop_server (en el hilo de la interfaz)."""
+        if not ok:
+            logging.getLogger(__name__).warning("No se pudo detener el servidor completamente")
+        self.start_button.set_sensitive(True)
+        self.server_running = False
+        self.set_inputs_sensitive(True)
+
         # Mantener el terminal visible para que se pueda ver el historial
         self.status_label.set_label(get_text("status_server_stopped"))
-        
+
         # Solicitar que la ventana se ajuste a su tamaño natural
         self.queue_resize()
-        
-        # Forzar actualización inmediata de la interfaz
-        while GLib.MainContext.default().pending():
-            GLib.MainContext.default().iteration(True)
-        
-        # Operación exitosa
-        return True  # Servidor detenido correctamente
+        return False
 
     def save_current_config(self):
+        """Guarda el formulario, el idioma y el tema (la escritura en disco es diferida y atómica)."""
+        settings = self.collect_launch_settings()
+        del settings["model_path"]
+        settings["language"] = get_current_language()
         # Usar el tema actual guardado en la variable de instancia
-        theme = getattr(self, 'current_theme', 'system')  # Usar 'system' como valor por defecto si no existe
-        
-        # Guardar la configuración actual
-        save_config(
-            self.models_dir_entry.get_text(),
-            self.bin_dir_entry.get_text(),
-            self.ngl_entry.get_text(),
-            self.port_entry.get_text(),
-            self.prompt_entry.get_text(),
-            self.temp_entry.get_text(),
-            self.top_k_entry.get_text(),
-            self.top_p_entry.get_text(),
-            self.repeat_penalty_entry.get_text(),
-            self.threads_entry.get_text(),
-            self.ctx_size_entry.get_text(),
-            self.max_tokens_entry.get_text(),
-            get_current_language(),
-            theme
-        )
-        from gi.repository import GLib
-        while GLib.MainContext.default().pending():
-            GLib.MainContext.default().iteration(True)
+        settings["theme"] = getattr(self, 'current_theme', 'system')
+        update_config(settings)
         return True
-        
 
-    
     def on_language_button_clicked(self, button):
         # Mostrar menú emergente con todos los idiomas disponibles
         popover = Gtk.Popover()
@@ -744,6 +1043,10 @@ class MainWindow(Gtk.ApplicationWindow):
         # Contenedor para los botones de tema
         themes_box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=5)
         
+        # La búsqueda de temas termina poco después del arranque
+        if not self.available_themes:
+            themes_box.append(Gtk.Label(label="🔎 ..."))
+
         # Crear un botón para cada tema GTK disponible
         for theme_name in self.available_themes:
             # Crear el botón directamente con el nombre del tema
@@ -796,21 +1099,8 @@ class MainWindow(Gtk.ApplicationWindow):
                 child.set_text(get_text(f"language_{lang_code}"))
             child = child.get_next_sibling()
         
-        # Actualizar todos los textos de la interfaz
-        self.set_title(get_text("app_title"))
-        self.models_dir_entry.set_placeholder_text(get_text("models_dir_placeholder"))
-        self.select_folder_button.set_label(get_text("select_folder_button"))
-        self.bin_dir_entry.set_placeholder_text(get_text("bin_dir_placeholder"))
-        self.ngl_entry.set_placeholder_text(get_text("ngl_placeholder"))
-        self.port_entry.set_placeholder_text(get_text("port_placeholder"))
-        self.prompt_entry.set_placeholder_text(get_text("prompt_placeholder"))
-        self.temp_entry.set_placeholder_text(get_text("temp_placeholder"))
-        self.top_k_entry.set_placeholder_text(get_text("top_k_placeholder"))
-        self.top_p_entry.set_placeholder_text(get_text("top_p_placeholder"))
-        self.repeat_penalty_entry.set_placeholder_text(get_text("repeat_penalty_placeholder"))
-        self.threads_entry.set_placeholder_text(get_text("threads_placeholder"))
-        self.ctx_size_entry.set_placeholder_text(get_text("ctx_size_placeholder"))
-        self.max_tokens_entry.set_placeholder_text(get_text("max_tokens_placeholder"))
+        # Actualizar todos los textos de la interfaz de una vez
+        self.texts.refresh()
         
         # Actualizar botones y etiquetas
         if not self.server_running:
@@ -840,11 +1130,13 @@ class MainWindow(Gtk.ApplicationWindow):
         # Guardar la preferencia de idioma
         self.save_current_config()
     
-    def apply_theme(self, theme_name):
+    def apply_theme(self, theme_name, force_refresh=True):
         """Aplica el tema GTK seleccionado a la aplicación
         
         Args:
             theme_name: El nombre del tema GTK a aplicar
+            force_refresh: Procesar los eventos pendientes entre el cambio de modo y el de tema
+                para forzar el redibujado (innecesario antes de mostrar la ventana)
         """
         print(f"[DEBUG] Aplicando tema GTK: {theme_name}")
         
@@ -862,8 +1154,7 @@ class MainWindow(Gtk.ApplicationWindow):
             settings.set_property("gtk-application-prefer-dark-theme", not is_dark_theme)
             
             # Procesar eventos pendientes
-            from gi.repository import GLib
-            while GLib.MainContext.default().pending():
+            while force_refresh and GLib.MainContext.default().pending():
                 GLib.MainContext.default().iteration(True)
             
             # Establecer el tema GTK
@@ -904,58 +1195,156 @@ class MainWindow(Gtk.ApplicationWindow):
         
         # Guardar la preferencia de tema
         self.save_current_config()
-    
-        # Actualizar todos los textos de la interfaz
-        self.set_title(get_text("app_title"))
-        
-        self.models_dir_entry.set_placeholder_text(get_text("models_dir_placeholder"))
-        self.select_folder_button.set_label(get_text("select_folder_button"))
-        self.bin_dir_entry.set_placeholder_text(get_text("bin_dir_placeholder"))
-        self.ngl_entry.set_placeholder_text(get_text("ngl_placeholder"))
-        self.port_entry.set_placeholder_text(get_text("port_placeholder"))
-        self.prompt_entry.set_placeholder_text(get_text("prompt_placeholder"))
-        self.temp_entry.set_placeholder_text(get_text("temp_placeholder"))
-        self.top_k_entry.set_placeholder_text(get_text("top_k_placeholder"))
-        self.top_p_entry.set_placeholder_text(get_text("top_p_placeholder"))
-        self.repeat_penalty_entry.set_placeholder_text(get_text("repeat_penalty_placeholder"))
-        self.threads_entry.set_placeholder_text(get_text("threads_placeholder"))
-        self.ctx_size_entry.set_placeholder_text(get_text("ctx_size_placeholder"))
-        self.max_tokens_entry.set_placeholder_text(get_text("max_tokens_placeholder"))
-        
-        # Actualizar botones y etiquetas
-        if not self.server_running:
-            self.start_button.set_label(get_text("start_button"))
-            if self.model_choice.get_model().get_n_items() > 0:
-                self.status_label.set_label(get_text("status_models_loaded"))
-            else:
-                self.status_label.set_label(get_text("status_no_models"))
-        else:
-            self.start_button.set_label(get_text("stop_button"))
-            port = self.port_entry.get_text() or "8080"
-            self.status_label.set_label(get_text("status_server_started").format(port))
-        
-        # Guardar la preferencia de idioma
-        self.save_current_config()
 
         # Ahora sí, cerrar el popover tras aplicar el tema y actualizar la interfaz
         popover.popdown()
 
-    def add_terminal_text(self, text, tag=None):
-        """Añade texto al terminal con formato opcional."""
-        end_iter = self.terminal_buffer.get_end_iter()
-        if tag:
-            self.terminal_buffer.insert_with_tags(end_iter, text, tag)
-        else:
-            self.terminal_buffer.insert(end_iter, text)
-        # Desplazar a la última línea
-        self.terminal_view.scroll_to_iter(self.terminal_buffer.get_end_iter(), 0.0, False, 0.0, 0.0)
+    def on_inspect_instance(self, instance):
+        """Botón 🔍 del panel de instancias."""
+        self.terminal_scroll.set_visible(True)
+        self.inspect_instance(instance)
+
+    def on_proxy_toggled(self, enabled, port):
+        """Arranca o detiene el proxy de reparto entre las instancias listas."""
+        if self.proxy is not None:
+            self.supervisor.remove_listener(self.proxy_binding)
+            self.proxy.stop()
+            self.proxy = None
+            self.proxy_binding = None
+        if enabled:
+            proxy = LoadBalancingProxy(port)
+            try:
+                proxy.start()
+            except OSError as e:
+                show_error(self, f"No se pudo arrancar el proxy en el puerto {port}: {e}")
+                self.instances_panel.proxy_check.set_active(False)
+                return
+            self.proxy = proxy
+            self.proxy_binding = bind_supervisor(proxy, self.supervisor)
+        update_config({"proxy_enabled": "true" if enabled else "false", "proxy_port": str(port)})
+        self.update_proxy_status()
+
+    def update_proxy_status(self):
+        """Resumen de réplicas y peticiones en curso del proxy."""
+        if self.proxy is None:
+            self.instances_panel.set_proxy_status(None)
+            return
+        stats = self.proxy.stats()
+        queued = " · ".join(f":{b['port']} {b['in_flight']}" for b in stats)
+        text = f"⚖ Proxy en :{self.proxy.port} → {len(stats)} réplicas listas"
+        self.instances_panel.set_proxy_status(f"{text} ({queued})" if stats else text)
+
+    def on_autotune_clicked(self, button):
+        """Lanza (o cancela) el ajuste automático del modelo seleccionado."""
+        if self.autotuner is not None:
+            self.autotuner.cancel()
+            self.autotune_button.set_sensitive(False)
+            return
+        settings = self.collect_launch_settings()
+        if not settings["model_path"]:
+            show_error(self, get_text("error_no_model"))
+            return
+        self.autotuner = Autotuner(
+            settings["model_path"],
+            bin_base=settings["bin_base"],
+            base_args=["--n-gpu-layers", str(settings["ngl"]), "--ctx-size", str(settings["ctx_size"])],
+            on_progress=lambda text, step, total: GLib.idle_add(self.on_autotune_progress, text, step, total),
+            on_finished=lambda profile, error: GLib.idle_add(self.on_autotune_finished, profile, error),
+        )
+        self.autotune_button.set_label("✖ Cancelar autotune")
+        self.start_button.set_sensitive(False)
+        self.set_inputs_sensitive(False)
+        self.autotuner.start()
+
+    def on_autotune_progress(self, text, step, total):
+        self.status_label.set_label(f"⚙ Autotune {step}/{total}: {text}")
+        return False
+
+    def on_autotune_finished(self, profile, error):
+        self.autotuner = None
+        self.autotune_button.set_label("⚙ Autotune del modelo seleccionado")
+        self.autotune_button.set_sensitive(True)
+        self.start_button.set_sensitive(True)
+        self.set_inputs_sensitive(not self.server_running)
+        if profile is None:
+            self.status_label.set_label(f"⚙ Autotune sin terminar: {error}")
+            return False
+        self.status_label.set_label("⚙ Autotune completado; el perfil se usará en los próximos arranques.")
+        show_info_dialog(self, "Autotune completado",
+                         f"Hilos: {profile['threads']} · Hilos de lote: {profile['threads_batch']}\n"
+                         f"Lote: {profile['batch_size']} / {profile['ubatch_size']} · Paralelo: {profile['parallel']}\n"
+                         f"Prompt: {profile.get('prompt_tps') or 0:.1f} t/s · "
+                         f"Generación: {profile.get('gen_tps') or 0:.1f} t/s")
+        return False
+
+    def on_profiles_button_clicked(self, button):
+        """Abre el editor de perfiles de lanzamiento del modelo seleccionado."""
+        model_path = get_selected_model_path(self.model_choice, self.models_dir_entry.get_text())
+        if not model_path:
+            show_error(self, get_text("error_no_model"))
+            return
+
+        def on_changed():
+            active = self.profile_store.active_name(model_path)
+            text = f"perfil «{active}»" if active else "sin perfil"
+            self.status_label.set_label(f"🛠 {os.path.basename(model_path)}: {text} en el próximo arranque.")
+
+        ProfileEditorWindow(self, self.profile_store, model_path, on_changed=on_changed).present()
+
+    def on_logs_button_clicked(self, button):
+        """Abre el visor de registros de sesión."""
+        LogViewerWindow(parent=self).present()
+
+    def add_terminal_text(self, text):
+        """Añade texto al terminal (se muestra en el siguiente fotograma)."""
+        self.log_buffer.append(text)
+
+    def on_terminal_pending(self):
+        """Hay líneas nuevas en el búfer (desde cualquier hilo): se vuelcan en el siguiente fotograma."""
+        GLib.idle_add(self.schedule_terminal_flush)
+
+    def schedule_terminal_flush(self):
+        if not self.terminal_flush_scheduled:
+            self.terminal_flush_scheduled = True
+            self.terminal_view.add_tick_callback(self.on_terminal_tick)
+        return False
+
+    def on_terminal_tick(self, widget, frame_clock):
+        """Vuelca al terminal, en un solo bloque, el texto acumulado desde que se programó el volcado."""
+        self.terminal_flush_scheduled = False
+        text, dropped = self.log_buffer.drain()
+        if not text:
+            return GLib.SOURCE_REMOVE
+        # Solo se desplaza automáticamente si el usuario ya estaba al final
+        vadj = self.terminal_scroll.get_vadjustment()
+        at_bottom = vadj.get_value() + vadj.get_page_size() >= vadj.get_upper() - 1
+        if dropped:
+            text = f"[... {dropped} líneas omitidas ...]\n" + text
+        self.terminal_buffer.insert(self.terminal_buffer.get_end_iter(), text)
+        # Recortar las líneas más antiguas para no superar el límite
+        excess = self.terminal_buffer.get_line_count() - self.log_buffer.max_lines
+        if excess > 0:
+            start = self.terminal_buffer.get_start_iter()
+            end = self.terminal_buffer.get_iter_at_line(excess)
+            end = end[1] if isinstance(end, tuple) else end
+            self.terminal_buffer.delete(start, end)
+        if at_bottom:
+            self.terminal_view.scroll_to_mark(self.terminal_end_mark, 0.0, False, 0.0, 0.0)
+        # Las métricas solo cambian con líneas nuevas: se refrescan en el mismo fotograma
+        if self.inspected is not None and self.inspected.metrics.version != self.metrics_version:
+            metrics = self.inspected.metrics
+            self.metrics_version = metrics.version
+            self.metrics_label.set_label(f"#{self.inspected.id} " + format_metrics(metrics.snapshot()))
+        return GLib.SOURCE_REMOVE
     
     def set_inputs_sensitive(self, sensitive):
         """Habilita o deshabilita los campos de entrada y el selector."""
         self.models_dir_entry.set_sensitive(sensitive)
         self.select_folder_button.set_sensitive(sensitive)
         self.bin_dir_entry.set_sensitive(sensitive)
-        self.model_choice.set_sensitive(sensitive)
+        # Con el servidor en marcha el selector de modelos sigue activo, para el cambio en caliente
+        self.model_choice.set_sensitive(sensitive or self.server_running)
+        self.swap_button.set_visible(self.server_running)
         self.ngl_entry.set_sensitive(sensitive)
         self.port_entry.set_sensitive(sensitive)
         self.prompt_entry.set_sensitive(sensitive)
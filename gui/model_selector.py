@@ -1,16 +1,26 @@
 # Selector y gestión de modelos GGUF
 import os
+import bisect
+from concurrent.futures import ThreadPoolExecutor
 from core.utils import find_models
-from gi.repository import Gtk, GObject
+from core.discovery import ModelDiscovery, split_roots, DEFAULT_ROOT_TIMEOUT
+from core.gguf import format_param_count
+from core.model_index import get_model_index
+from gi.repository import Gtk, Gio, GLib, GObject
 import logging
 import math
 
 # Creamos un modelo personalizado para almacenar tanto el nombre para mostrar como la ruta real
 class ModelItem(GObject.GObject):
-    def __init__(self, path, display_name):
+    # Propiedades GObject para que el Gtk.DropDown pueda mostrarlas mediante una expresión
+    path = GObject.Property(type=str, default="")  # Ruta completa al archivo
+    display_name = GObject.Property(type=str, default="")  # Nombre con tamaño para mostrar
+
+    def __init__(self, path, display_name, info=None):
         super().__init__()
-        self.path = path  # Ruta completa al archivo
-        self.display_name = display_name  # Nombre con tamaño para mostrar
+        self.path = path
+        self.display_name = display_name
+        self.info = info or {}  # Metadatos GGUF del índice de modelos
     
     def get_path(self):
         return self.path
@@ -18,9 +28,21 @@ class ModelItem(GObject.GObject):
     def get_display_name(self):
         return self.display_name
 
+def create_model_choice():
+    """Crea el selector de modelos respaldado por un Gio.ListStore de ModelItem"""
+    store = Gio.ListStore(item_type=ModelItem)
+    expression = Gtk.PropertyExpression.new(ModelItem, None, "display_name")
+    model_choice = Gtk.DropDown(model=store, expression=expression)
+    model_choice.set_enable_search(True)
+    model_choice.model_order = []
+    return model_choice
+
 def get_file_size_gb(file_path):
     """Obtiene el tamaño del archivo en GB con un decimal"""
-    size_bytes = os.path.getsize(file_path)
+    return format_file_size(os.path.getsize(file_path))
+
+def format_file_size(size_bytes):
+    """Formatea un tamaño en bytes como GB (o MB para ficheros pequeños) con un decimal"""
     size_gb = size_bytes / (1024 * 1024 * 1024)  # Convertir bytes a GB
     # Redondear a 1 decimal
     if size_gb < 0.1:
@@ -29,6 +51,31 @@ def get_file_size_gb(file_path):
         return f"{size_mb:.1f} MB"
     return f"{size_gb:.1f} GB"
 
+def format_model_label(model_path, info):
+    """Construye el texto del selector con el tamaño y los datos del modelo
+
+    Args:
+        model_path: Ruta completa al fichero .gguf
+        info: Entrada del índice de modelos (puede ser None)
+
+    Returns:
+        Texto del tipo "(4.1 GB) - modelo.gguf · llama · Q4_K_M · 7.2B · ctx 8192"
+    """
+    model_name = os.path.basename(model_path)
+    if not info:
+        return f"({get_file_size_gb(model_path)}) - {model_name}"
+    label = f"({format_file_size(info['size'])}) - {model_name}"
+    facts = [
+        info.get("architecture"),
+        info.get("quantization"),
+        format_param_count(info.get("n_params")),
+        f"ctx {info['context_length']}" if info.get("context_length") else "",
+    ]
+    facts = [fact for fact in facts if fact]
+    if facts:
+        label += " · " + " · ".join(facts)
+    return label
+
 # Función para obtener el modelo seleccionado (path completo)
 def get_selected_model_path(model_choice, models_dir=None):
     """Obtiene la ruta completa del modelo seleccionado
@@ -40,6 +87,10 @@ def get_selected_model_path(model_choice, models_dir=None):
     Returns:
         La ruta completa al modelo seleccionado o una cadena vacía si no hay selección
     """
+    item = model_choice.get_selected_item()
+    if isinstance(item, ModelItem):
+        return item.path
+
     selected = model_choice.get_selected()
     if selected < 0:
         return ""  # No hay selección
@@ -70,32 +121,320 @@ def get_selected_model_path(model_choice, models_dir=None):
     # La ruta completa es el directorio de modelos + nombre del archivo
     return os.path.join(models_dir, model_name)
     
+def _ensure_model_store(model_choice):
+    """Devuelve el Gio.ListStore del selector (y la lista de rutas en el mismo orden)"""
+    store = model_choice.get_model()
+    if not isinstance(store, Gio.ListStore):
+        store = Gio.ListStore(item_type=ModelItem)
+        model_choice.set_model(store)
+        model_choice.set_expression(Gtk.PropertyExpression.new(ModelItem, None, "display_name"))
+        model_choice.model_order = []
+    # model_order: rutas en el mismo orden que las filas del ListStore
+    if not hasattr(model_choice, "model_order"):
+        model_choice.model_order = [item.path for item in store]
+    return store
+
+def add_model(model_choice, model_path, info=None):
+    """Inserta (o actualiza) un modelo en su posición ordenada sin reconstruir la lista
+
+    Args:
+        model_choice: El widget de selección de modelos
+        model_path: Ruta completa al fichero .gguf
+        info: Entrada del índice ya obtenida (si es None se consulta el índice)
+    """
+    store = _ensure_model_store(model_choice)
+    if info is None:
+        info = get_model_index().get(model_path)
+    display_name = format_model_label(model_path, info)
+    order = model_choice.model_order
+    pos = bisect.bisect_left(order, model_path)
+    if pos < len(order) and order[pos] == model_path:
+        # Ya estaba: solo cambia la etiqueta (p. ej. el fichero terminó de copiarse)
+        item = store.get_item(pos)
+        item.info = info or {}
+        if item.display_name != display_name:
+            item.display_name = display_name
+    else:
+        order.insert(pos, model_path)
+        store.insert(pos, ModelItem(model_path, display_name, info))
+
+def remove_model(model_choice, model_path):
+    """Elimina un modelo del selector si está presente"""
+    store = _ensure_model_store(model_choice)
+    order = model_choice.model_order
+    pos = bisect.bisect_left(order, model_path)
+    if pos < len(order) and order[pos] == model_path:
+        del order[pos]
+        store.remove(pos)
+
+def select_first_if_empty(model_choice):
+    """Selecciona el primer modelo si todavía no hay ninguno seleccionado"""
+    if model_choice.get_selected() == Gtk.INVALID_LIST_POSITION and model_choice.model_order:
+        model_choice.set_selected(0)
+
+def sync_model_list(model_choice, models):
+    """Aplica al selector solo las diferencias con la lista de modelos indicada
+
+    Args:
+        model_choice: El widget de selección de modelos
+        models: Rutas completas de los modelos que deben aparecer
+    """
+    _ensure_model_store(model_choice)
+    wanted = set(models)
+    for model in [m for m in model_choice.model_order if m not in wanted]:
+        remove_model(model_choice, model)
+    for model in sorted(wanted):
+        add_model(model_choice, model)
+    get_model_index().save()
+    select_first_if_empty(model_choice)
+
 def update_model_list(entry, model_choice):
     models_dir = entry.get_text()
     if models_dir and os.path.isdir(models_dir):
         models = find_models(models_dir)
-        model_store = Gtk.StringList()
-        
-        # Guardar las rutas completas como un atributo del modelo_choice para uso posterior
-        if not hasattr(model_choice, "model_paths"):
-            model_choice.model_paths = {}
-            
-        model_choice.model_paths.clear()
-        
-        for model in models:
-            model_name = os.path.basename(model)
-            model_size = get_file_size_gb(model)
-            display_name = f"({model_size}) - {model_name}"
-            model_store.append(display_name)
-            # Guardar la relación entre el nombre mostrado y la ruta real
-            model_choice.model_paths[display_name] = model
-            
-        model_choice.set_model(model_store)
-        if model_store.get_n_items() > 0:
-            model_choice.set_selected(0)
+        # Los metadatos salen del índice: solo se leen las cabeceras de los ficheros nuevos o modificados
+        sync_model_list(model_choice, models)
+        get_model_index().prune(models_dir, models)
+        get_model_index().save()
         logging.getLogger(__name__).info(f"Updated model list with {len(models)} models")
     else:
-        model_choice.set_model(Gtk.StringList())
-        if hasattr(model_choice, "model_paths"):
-            model_choice.model_paths.clear()
+        sync_model_list(model_choice, [])
         logging.getLogger(__name__).warning("Invalid or empty models directory, cleared model list")
+
+
+class ModelDirWatcher:
+    """Busca modelos en las raíces configuradas y mantiene el selector al día
+
+    Los cambios de ruta mientras se escribe se agrupan (debounce). La búsqueda
+    recursiva se hace en segundo plano (core.discovery) y sus resultados se van
+    insertando en el Gio.ListStore según llegan. Después, los cambios del sistema
+    de ficheros llegan por Gio.FileMonitor (inotify) en todos los directorios
+    recorridos y se aplican como altas, bajas y renombrados, sin volver a recorrer
+    el árbol (solo los directorios nuevos). Las cabeceras de los modelos nuevos y
+    el guardado del índice se hacen en un hilo aparte, sin bloquear la interfaz.
+    """
+
+    def __init__(self, model_choice, on_updated=None, debounce_ms=400, root_timeout=DEFAULT_ROOT_TIMEOUT):
+        """
+        Args:
+            model_choice: El widget de selección de modelos
+            on_updated: Callback(valid, scanning) tras aplicar cambios al selector
+            debounce_ms: Espera tras la última pulsación antes de cambiar de directorio
+            root_timeout: Segundos máximos para recorrer cada raíz
+        """
+        self.model_choice = model_choice
+        self.on_updated = on_updated
+        self.debounce_ms = debounce_ms
+        self.root_timeout = root_timeout
+        self.roots = []
+        self.monitors = {}
+        self.discovery = None
+        self.generation = 0
+        self.seen = set()
+        self.timed_out_roots = set()  # Raíces abandonadas por root_timeout en la búsqueda actual
+        self.pending_source = None
+        self.save_source = None
+        self.subscans = []  # Búsquedas en directorios creados después de la inicial
+        # Lecturas de cabeceras de modelos nuevos y guardados del índice, fuera del hilo de GTK
+        self.metadata_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model-metadata")
+
+    def set_directory(self, models_dir, immediate=False):
+        """Programa el cambio a las raíces indicadas (separadas por ':'), cancelando el anterior"""
+        if self.pending_source is not None:
+            GLib.source_remove(self.pending_source)
+            self.pending_source = None
+        if immediate:
+            self._switch_roots(models_dir)
+        else:
+            self.pending_source = GLib.timeout_add(self.debounce_ms, self._on_debounce_timeout, models_dir)
+
+    def _on_debounce_timeout(self, models_dir):
+        self.pending_source = None
+        self._switch_roots(models_dir)
+        return False
+
+    def _switch_roots(self, models_dir):
+        roots = [root for root in split_roots(models_dir) if os.path.isdir(root)]
+        if roots == self.roots and self.monitors:
+            return
+        self.stop()
+        self.roots = roots
+        self.generation += 1
+        self.seen = set()
+        self.timed_out_roots = set()
+        if not roots:
+            sync_model_list(self.model_choice, [])
+            self._notify(False, False)
+            return
+        # Lo que no cuelga de ninguna raíz nueva se quita ya; el resto se confirma al terminar la búsqueda
+        prefixes = tuple(os.path.join(root, "") for root in roots)
+        for path in [p for p in self.model_choice.model_order if not p.startswith(prefixes)]:
+            remove_model(self.model_choice, path)
+        for root in roots:
+            self._watch(root)
+        generation = self.generation
+        # Los callbacks llegan desde los hilos del pool: se pasan al hilo de GTK con idle_add
+        self.discovery = ModelDiscovery(
+            on_batch=lambda root, batch: GLib.idle_add(self._apply_batch, generation, batch),
+            on_directory=lambda root, directory: GLib.idle_add(self._watch_directory, generation, directory),
+            on_root_done=lambda root, paths, timed_out: GLib.idle_add(self._root_done, generation, root, timed_out),
+            on_finished=lambda: GLib.idle_add(self._finish_scan, generation),
+            root_timeout=self.root_timeout,
+        )
+        self.discovery.start(roots)
+        self._notify(True, True)
+
+    def _apply_batch(self, generation, batch):
+        if generation != self.generation:
+            return False
+        for path, info in batch:
+            self.seen.add(path)
+            add_model(self.model_choice, path, info)
+        select_first_if_empty(self.model_choice)
+        self._notify(True, self.discovery is not None)
+        return False
+
+    def _root_done(self, generation, root, timed_out):
+        if generation == self.generation and timed_out:
+            self.timed_out_roots.add(root)
+        return False
+
+    def _watch_directory(self, generation, directory):
+        if generation == self.generation:
+            self._watch(directory)
+        return False
+
+    def _scan_new_directory(self, directory):
+        """Busca modelos en un directorio que apareció después de la búsqueda inicial (y lo vigila)"""
+        generation = self.generation
+        subscan = ModelDiscovery(
+            on_batch=lambda root, batch: GLib.idle_add(self._apply_batch, generation, batch),
+            on_directory=lambda root, directory: GLib.idle_add(self._watch_directory, generation, directory),
+            on_finished=lambda: GLib.idle_add(self._finish_subscan, generation, subscan),
+            root_timeout=self.root_timeout,
+        )
+        self.subscans.append(subscan)
+        subscan.start([directory])
+
+    def _finish_subscan(self, generation, subscan):
+        if subscan in self.subscans:
+            self.subscans.remove(subscan)
+        if generation == self.generation:
+            self._notify(True, self.discovery is not None)
+        return False
+
+    def _finish_scan(self, generation):
+        if generation != self.generation:
+            return False
+        # Lo que estaba en la lista y no ha aparecido en la búsqueda ya no existe, salvo en
+        # las raíces que no se terminaron de recorrer (p. ej. un recurso de red lento)
+        partial = tuple(os.path.join(root, "") for root in self.timed_out_roots)
+        for path in [p for p in self.model_choice.model_order if p not in self.seen]:
+            if partial and path.startswith(partial):
+                continue
+            remove_model(self.model_choice, path)
+        self.discovery = None
+        self._notify(True, False)
+        return False
+
+    def _notify(self, valid, scanning):
+        if self.on_updated:
+            self.on_updated(valid, scanning)
+
+    def _watch(self, directory):
+        if directory in self.monitors:
+            return
+        try:
+            monitor = Gio.File.new_for_path(directory).monitor_directory(Gio.FileMonitorFlags.WATCH_MOVES, None)
+            monitor.connect("changed", self._on_monitor_changed)
+            self.monitors[directory] = monitor
+        except GLib.Error as e:
+            logging.getLogger(__name__).warning(f"No se puede vigilar {directory}: {e}")
+
+    def _on_monitor_changed(self, monitor, file, other_file, event_type):
+        path = file.get_path() if file else None
+        other_path = other_file.get_path() if other_file else None
+        changed = False
+        if event_type in (Gio.FileMonitorEvent.CHANGES_DONE_HINT, Gio.FileMonitorEvent.MOVED_IN,
+                          Gio.FileMonitorEvent.CREATED):
+            # CHANGES_DONE_HINT llega cuando termina la escritura: evita leer cabeceras a medio copiar
+            if event_type != Gio.FileMonitorEvent.CREATED:
+                self._add(path)
+            self._add_directory(path)
+        elif event_type in (Gio.FileMonitorEvent.DELETED, Gio.FileMonitorEvent.MOVED_OUT):
+            changed = self._remove(path)
+        elif event_type == Gio.FileMonitorEvent.RENAMED:
+            changed = self._remove(path)
+            self._add(other_path)
+            self._add_directory(other_path)
+        if changed:
+            select_first_if_empty(self.model_choice)
+            self._notify(True, self.discovery is not None)
+
+    def _add(self, path):
+        """Alta de un modelo: la cabecera se lee en segundo plano y se inserta al terminar"""
+        if path and path.endswith(".gguf") and os.path.isfile(path):
+            self.seen.add(path)
+            generation = self.generation
+            future = self.metadata_pool.submit(get_model_index().get, path)
+            future.add_done_callback(lambda f: GLib.idle_add(self._apply_added, generation, path, f))
+
+    def _apply_added(self, generation, path, future):
+        if generation != self.generation or path not in self.seen:
+            return False  # Se cambió de raíces o el fichero desapareció mientras tanto
+        try:
+            info = future.result()
+        except Exception as e:
+            logging.getLogger(__name__).warning(f"No se pudo leer {path}: {e}")
+            info = None
+        if info is None:
+            return False  # Ya no existe
+        add_model(self.model_choice, path, info)
+        select_first_if_empty(self.model_choice)
+        self._notify(True, self.discovery is not None)
+        self._schedule_save()
+        return False
+
+    def _add_directory(self, path):
+        """Directorio nuevo (creado, movido o renombrado): se vigila y se buscan modelos en él"""
+        if path and path not in self.monitors and os.path.isdir(path) and not os.path.basename(path).startswith("."):
+            self._watch(path)
+            self._scan_new_directory(path)
+
+    def _remove(self, path):
+        if path and path.endswith(".gguf"):
+            self.seen.discard(path)
+            remove_model(self.model_choice, path)
+            return True
+        # Un directorio borrado o movido se lleva sus modelos
+        prefix = os.path.join(path, "") if path else None
+        gone = [p for p in self.model_choice.model_order if prefix and p.startswith(prefix)]
+        for model in gone:
+            self.seen.discard(model)
+            remove_model(self.model_choice, model)
+        for directory in [d for d in self.monitors if prefix and (d == path or d.startswith(prefix))]:
+            self.monitors.pop(directory).cancel()
+        return bool(gone)
+
+    def _schedule_save(self):
+        """Guarda el índice tras la última alta de una tanda (debounce), desde el hilo de metadatos"""
+        if self.save_source is not None:
+            GLib.source_remove(self.save_source)
+        self.save_source = GLib.timeout_add(self.debounce_ms, self._on_save_timeout)
+
+    def _on_save_timeout(self):
+        self.save_source = None
+        self.metadata_pool.submit(get_model_index().save)
+        return False
+
+    def stop(self):
+        """Cancela la búsqueda en curso y deja de vigilar los directorios"""
+        if self.discovery is not None:
+            self.discovery.cancel()
+            self.discovery = None
+        for subscan in self.subscans:
+            subscan.cancel()
+        self.subscans = []
+        for monitor in self.monitors.values():
+            monitor.cancel()
+        self.monitors = {}
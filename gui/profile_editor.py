@@ -0,0 +1,189 @@
+# Editor de perfiles de lanzamiento con nombre (opciones avanzadas de llama-server)
+import os
+import logging
+from gi.repository import Gtk
+from core.launch_profile import SCHEMA, LaunchProfile, TYPE_FLAG, TYPE_CHOICE
+from gui.dialogs import show_error
+
+# Texto de la opción "sin valor" en los desplegables
+DEFAULT_LABEL = "(por defecto)"
+
+# Valores de las opciones sí/no: (texto, valor)
+FLAG_CHOICES = [(DEFAULT_LABEL, None), ("Sí", True), ("No", False)]
+
+
+class ProfileEditorWindow(Gtk.Window):
+    """Ventana para crear, editar, activar y borrar los perfiles de un modelo
+
+    Solo muestra las opciones avanzadas del esquema; las del formulario principal
+    se siguen editando allí. Las opciones que se dejan "(por defecto)" no se guardan.
+    """
+
+    def __init__(self, parent, store, model_path, on_changed=None):
+        """
+        Args:
+            parent: Ventana principal
+            store: ProfileStore con los perfiles
+            model_path: Modelo cuyos perfiles se editan
+            on_changed: Callback() tras guardar, borrar o cambiar el perfil activo
+        """
+        super().__init__(title=f"Opciones avanzadas · {os.path.basename(model_path)}")
+        self.set_transient_for(parent)
+        self.set_default_size(520, 600)
+        self.store = store
+        self.model_path = model_path
+        self.on_changed = on_changed
+        self.widgets = {}
+
+        box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL, spacing=6)
+        box.set_margin_top(10)
+        box.set_margin_bottom(10)
+        box.set_margin_start(10)
+        box.set_margin_end(10)
+        self.set_child(box)
+
+        # Perfil: desplegable con los existentes y nombre con el que se guarda
+        name_box = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        self.profile_choice = Gtk.DropDown()
+        self.profile_choice.connect("notify::selected", self.on_profile_selected)
+        self.name_entry = Gtk.Entry()
+        self.name_entry.set_placeholder_text("Nombre del perfil")
+        self.name_entry.set_hexpand(True)
+        name_box.append(self.profile_choice)
+        name_box.append(self.name_entry)
+        box.append(name_box)
+
+        self.active_label = Gtk.Label(xalign=0)
+        box.append(self.active_label)
+
+        grid = Gtk.Grid(column_spacing=10, row_spacing=4)
+        for row, option in enumerate(o for o in SCHEMA if o.advanced):
+            label = Gtk.Label(label=option.label, xalign=0)
+            label.set_tooltip_text(option.flag)
+            grid.attach(label, 0, row, 1, 1)
+            widget = self._build_widget(option)
+            widget.set_hexpand(True)
+            grid.attach(widget, 1, row, 1, 1)
+            self.widgets[option.key] = widget
+        scroll = Gtk.ScrolledWindow()
+        scroll.set_vexpand(True)
+        scroll.set_child(grid)
+        box.append(scroll)
+
+        self.preview_label = Gtk.Label(xalign=0, wrap=True, selectable=True)
+        box.append(self.preview_label)
+
+        buttons = Gtk.Box(orientation=Gtk.Orientation.HORIZONTAL, spacing=6)
+        save_button = Gtk.Button(label="💾 Guardar y usar")
+        save_button.connect("clicked", self.on_save)
+        delete_button = Gtk.Button(label="🗑 Eliminar")
+        delete_button.connect("clicked", self.on_delete)
+        none_button = Gtk.Button(label="No usar ningún perfil")
+        none_button.connect("clicked", self.on_deactivate)
+        for button in (save_button, delete_button, none_button):
+            buttons.append(button)
+        box.append(buttons)
+
+        self.reload(select=store.active_name(model_path))
+
+    def _build_widget(self, option):
+        if option.type == TYPE_FLAG:
+            widget = Gtk.DropDown(model=Gtk.StringList.new([label for label, _ in FLAG_CHOICES]))
+            widget.connect("notify::selected", lambda *args: self.update_preview())
+        elif option.type == TYPE_CHOICE:
+            widget = Gtk.DropDown(model=Gtk.StringList.new([DEFAULT_LABEL] + list(option.choices)))
+            widget.connect("notify::selected", lambda *args: self.update_preview())
+        else:
+            widget = Gtk.Entry()
+            widget.set_placeholder_text(DEFAULT_LABEL)
+            widget.connect("changed", lambda *args: self.update_preview())
+        return widget
+
+    def reload(self, select=None):
+        """Vuelve a cargar la lista de perfiles y muestra el indicado"""
+        self.names = self.store.names(self.model_path)
+        self.profile_choice.set_model(Gtk.StringList.new(["(nuevo perfil)"] + self.names))
+        index = self.names.index(select) + 1 if select in self.names else 0
+        self.profile_choice.set_selected(index)
+        self.on_profile_selected(self.profile_choice, None)
+        active = self.store.active_name(self.model_path)
+        self.active_label.set_text(f"Perfil en uso: {active}" if active else "Sin perfil: se usan los valores por defecto")
+
+    def on_profile_selected(self, dropdown, _param):
+        index = dropdown.get_selected()
+        name = self.names[index - 1] if 0 < index <= len(self.names) else ""
+        profile = self.store.get(self.model_path, name) if name else LaunchProfile()
+        self.name_entry.set_text(name)
+        self.show_profile(profile)
+
+    def show_profile(self, profile):
+        for option in SCHEMA:
+            widget = self.widgets.get(option.key)
+            if widget is None:
+                continue
+            value = profile.values.get(option.key)
+            if option.type == TYPE_FLAG:
+                widget.set_selected([v for _, v in FLAG_CHOICES].index(value))
+            elif option.type == TYPE_CHOICE:
+                widget.set_selected(option.choices.index(value) + 1 if value in option.choices else 0)
+            else:
+                widget.set_text("" if value is None else str(value))
+        self.update_preview()
+
+    def read_profile(self):
+        """Perfil con los valores del formulario
+
+        Raises:
+            ValueError: Si algún valor no es válido
+        """
+        values = {}
+        for option in SCHEMA:
+            widget = self.widgets.get(option.key)
+            if widget is None:
+                continue
+            if option.type == TYPE_FLAG:
+                values[option.key] = FLAG_CHOICES[widget.get_selected()][1]
+            elif option.type == TYPE_CHOICE:
+                selected = widget.get_selected()
+                values[option.key] = option.choices[selected - 1] if selected > 0 else None
+            else:
+                values[option.key] = widget.get_text().strip()
+        return LaunchProfile(values)
+
+    def update_preview(self):
+        try:
+            argv = self.read_profile().to_argv()
+        except ValueError as e:
+            self.preview_label.set_text(f"⚠ {e}")
+            return
+        self.preview_label.set_text("Argumentos: " + " ".join(argv))
+
+    def on_save(self, button):
+        name = self.name_entry.get_text().strip()
+        if not name:
+            show_error(self, "Escribe un nombre para el perfil")
+            return
+        try:
+            profile = self.read_profile()
+        except ValueError as e:
+            show_error(self, str(e))
+            return
+        self.store.save(self.model_path, name, profile, activate=True)
+        self.reload(select=name)
+        self._changed()
+
+    def on_delete(self, button):
+        name = self.name_entry.get_text().strip()
+        if name and self.store.delete(self.model_path, name):
+            logging.getLogger(__name__).info(f"Perfil '{name}' eliminado")
+            self.reload()
+            self._changed()
+
+    def on_deactivate(self, button):
+        self.store.set_active(self.model_path, None)
+        self.reload()
+        self._changed()
+
+    def _changed(self):
+        if self.on_changed is not None:
+            self.on_changed()
@@ -47,6 +47,10 @@ if [ -f requirements.txt ]; then
     pip install -r requirements.txt
 fi
 
+# 5b. Compilar los catálogos de traducción (uno por idioma)
+echo "[INFO] Compilando catálogos de traducción..."
+python3 -m core.i18n
+
 # 6. Instalar dependencias del sistema (GTK y utilidades)
 echo "[INFO] Instalando dependencias del sistema (requiere sudo)..."
 sudo apt-get update
@@ -0,0 +1,150 @@
+# Sustituto mínimo de llama-server para las pruebas (responde a /health e imprime registros)
+import os
+import sys
+import time
+import json
+import signal
+import argparse
+import subprocess
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--model", default="")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    # Segundos que /health responde 503 simulando la carga del modelo
+    parser.add_argument("--fake-load", type=float, default=0.0)
+    # Código de salida inmediata (simula un fallo al arrancar)
+    parser.add_argument("--fake-exit", type=int, default=None)
+    # Segundos tras los que /health deja de responder (simula un servidor colgado)
+    parser.add_argument("--fake-hang", type=float, default=None)
+    # Ignorar SIGTERM y lanzar un hijo que también lo ignora (solo se detienen con SIGKILL al grupo)
+    parser.add_argument("--fake-ignore-term", action="store_true")
+    # Segundos que tarda cada /completion (mientras, /slots la muestra en curso)
+    parser.add_argument("--fake-slow", type=float, default=0.0)
+    # /completion responde siempre con error 500 (simula un servidor que carga pero no genera)
+    parser.add_argument("--fake-completion-error", action="store_true")
+    # Directorio donde /slots/N?action=save|restore guardan el estado de las ranuras
+    parser.add_argument("--slot-save-path", default=None)
+    # Parámetros de rendimiento: determinan las velocidades que devuelve /completion
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--threads-batch", type=int, default=None)
+    parser.add_argument("--batch-size", type=int, default=2048)
+    parser.add_argument("--parallel", type=int, default=1)
+    args, _ = parser.parse_known_args()
+
+    print(f"main: loading model {args.model}", flush=True)
+    if args.fake_exit is not None:
+        print("E failed to load model", flush=True)
+        sys.exit(args.fake_exit)
+    if args.fake_ignore_term:
+        signal.signal(signal.SIGTERM, signal.SIG_IGN)
+        child = subprocess.Popen([sys.executable, "-c", "import signal, time; "
+                                  "signal.signal(signal.SIGTERM, signal.SIG_IGN); time.sleep(3600)"])
+        print(f"main: worker pid {child.pid}", flush=True)
+    started = time.monotonic()
+    active = []  # Peticiones /completion en curso
+    slot_prompts = {}  # Prompt en la caché de cada ranura (simulada)
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send_json(self, code, payload):
+            body = json.dumps(payload).encode()
+            self.send_response(code)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/health":
+                if args.fake_hang is not None and time.monotonic() - started > args.fake_hang:
+                    time.sleep(3600)
+                if time.monotonic() - started < args.fake_load:
+                    self._send_json(503, {"error": {"message": "Loading model"}})
+                else:
+                    self._send_json(200, {"status": "ok"})
+            elif self.path == "/slots":
+                self._send_json(200, [{"id": i, "is_processing": i < len(active)} for i in range(args.parallel)])
+            else:
+                self._send_json(404, {"error": "not found"})
+
+        def _slot_action(self, slot, action, filename):
+            if args.slot_save_path is None:
+                self._send_json(501, {"error": {"message": "slot save is disabled"}})
+                return
+            path = os.path.join(args.slot_save_path, filename)
+            if action == "save":
+                with open(path, "w") as f:
+                    json.dump({"prompt": slot_prompts.get(slot, "")}, f)
+                self._send_json(200, {"id_slot": slot, "n_saved": len(slot_prompts.get(slot, "").split()),
+                                      "timings": {"save_ms": 1.0}})
+            elif action == "restore" and os.path.exists(path):
+                with open(path) as f:
+                    slot_prompts[slot] = json.load(f)["prompt"]
+                self._send_json(200, {"id_slot": slot, "n_restored": len(slot_prompts[slot].split()),
+                                      "timings": {"restore_ms": 1.0}})
+            else:
+                self._send_json(400, {"error": {"message": "invalid slot action"}})
+
+        def do_POST(self):
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+            if self.path.startswith("/slots/"):
+                slot, _, query = self.path[len("/slots/"):].partition("?action=")
+                self._slot_action(int(slot), query, request.get("filename", ""))
+                return
+            if self.path == "/embedding":
+                self._send_json(200, [{"index": 0, "embedding": [[0.1, 0.2, 0.3]]}])
+                return
+            if self.path != "/completion":
+                self._send_json(404, {"error": "not found"})
+                return
+            if args.fake_completion_error:
+                self._send_json(500, {"error": {"code": 500, "message": "failed to decode"}})
+                return
+            if args.fake_slow:
+                active.append(self)
+                time.sleep(args.fake_slow)
+                active.remove(self)
+            # Velocidades ficticias: la generación escala hasta 4 hilos y el prompt con el lote
+            n_predict = request.get("n_predict", 16)
+            # Solo se procesa la parte del prompt que no está ya en la caché de la ranura
+            prompt = request.get("prompt", "")
+            slot = request.get("id_slot", 0)
+            cached = slot_prompts.get(slot, "")
+            prompt_n = len(prompt.split()) - (len(cached.split()) if cached and prompt.startswith(cached) else 0)
+            slot_prompts[slot] = prompt
+            timings = {
+                "prompt_per_second": args.batch_size / 10 * min(args.threads_batch or args.threads, 4),
+                "predicted_per_second": 10.0 * min(args.threads, 4),
+                "predicted_n": n_predict,
+                "predicted_ms": n_predict / (10.0 * min(args.threads, 4)) * 1000,
+                "prompt_n": prompt_n,
+            }
+            if not request.get("stream"):
+                self._send_json(200, {"content": "hola " * n_predict, "model": args.model, "timings": timings})
+                return
+            # Streaming SSE: un evento por token y uno final con las velocidades
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Connection", "close")
+            self.end_headers()
+            for _ in range(n_predict):
+                self.wfile.write(b"data: " + json.dumps({"content": "hola ", "stop": False}).encode() + b"\n\n")
+            self.wfile.write(b"data: " + json.dumps({"content": "", "stop": True, "timings": timings}).encode()
+                             + b"\n\n")
+            self.close_connection = True
+
+        def log_message(self, *log_args):
+            pass
+
+    server = ThreadingHTTPServer((args.host, args.port), Handler)
+    print(f"main: server is listening on http://{args.host}:{args.port} (pid {os.getpid()})", flush=True)
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+# Pruebas del ajuste automático de parámetros
+import json
+from core.autotune import parse_llama_bench_output
+
+
+def test_parse_llama_bench_output():
+    output = json.dumps([
+        {"n_prompt": 512, "n_gen": 0, "avg_ts": 812.5},
+        {"n_prompt": 0, "n_gen": 128, "avg_ts": 24.25},
+    ])
+    assert parse_llama_bench_output(output) == (812.5, 24.25)
+
+
+def test_autotuner_sweeps_and_saves_profile(tmp_path, monkeypatch):
+    import core.autotune as autotune
+    import core.llama_server as llama_server
+    from tests.test_llama_server import make_fake_bin
+    monkeypatch.setattr(autotune, "PROFILES_FILE", str(tmp_path / "profiles.json"))
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    model = tmp_path / "model.gguf"
+    model.write_bytes(b"GGUF")
+    progress = []
+    tuner = autotune.Autotuner(str(model), bin_base=make_fake_bin(tmp_path), threads=[2, 4, 8],
+                               batches=[(512, 512), (2048, 512)], parallels=[1, 2], gen_tokens=8,
+                               on_progress=lambda text, step, total: progress.append((step, total)))
+    profile = tuner.run()
+    # La generación deja de mejorar a partir de 4 hilos: se queda el primer máximo
+    assert profile["threads"] == 4
+    assert profile["batch_size"] == 2048
+    assert profile["parallel"] in (1, 2)
+    assert progress[-1] == (tuner.total_steps, tuner.total_steps)
+    assert autotune.load_tuned_profile(str(model))["threads"] == 4
+
+
+def test_parallel_candidates_use_the_same_throughput_measure(monkeypatch):
+    import io
+    import json
+    import core.autotune as autotune
+
+    def urlopen(request, timeout=None):
+        # Cada petición genera 8 tokens en 800 ms, aunque tarde más por el prompt y el HTTP
+        return io.BytesIO(json.dumps({"timings": {"predicted_n": 8, "predicted_ms": 800.0,
+                                                  "predicted_per_second": 10.0,
+                                                  "prompt_per_second": 100.0}}).encode())
+
+    monkeypatch.setattr(autotune.urllib.request, "urlopen", urlopen)
+    tuner = autotune.Autotuner("model.gguf", threads=[1], gen_tokens=8)
+    assert tuner._run_completions(0, 1) == (100.0, 10.0)
+    # Dos peticiones que generan a la vez: el doble de tokens en la misma ventana
+    assert tuner._run_completions(0, 2) == (100.0, 20.0)
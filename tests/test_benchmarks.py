@@ -0,0 +1,20 @@
+# Pruebas de la suite de rendimiento (tamaños pequeños, una repetición)
+from benchmarks.hot_paths import run_benchmarks, compare, save_baselines, load_baselines
+
+
+def test_benchmarks_run_and_flag_regressions(tmp_path):
+    results = run_benchmarks(["find_models", "log_ingestion", "config_save_load"], quick=True, repeat=1)
+    assert [r.name for r in results] == ["find_models", "log_ingestion", "config_save_load"]
+    assert all(r.median > 0 and not r.skipped for r in results)
+
+    path = str(tmp_path / "baselines.json")
+    save_baselines(results, quick=True, path=path)
+    baselines = load_baselines(path)
+    assert set(baselines["quick"]["results"]) == {"find_models", "log_ingestion", "config_save_load"}
+
+    # El doble de lento que la referencia es una regresión con la tolerancia por defecto
+    slower = [r._replace(median=r.median * 2) for r in results]
+    assert all(regression for _, _, regression in compare(slower, baselines, quick=True))
+    assert not any(regression for _, _, regression in compare(results, baselines, quick=True))
+    # Sin referencia para los tamaños completos no hay nada que comparar
+    assert all(ratio is None for _, ratio, _ in compare(results, baselines, quick=False))
@@ -1 +1,72 @@
 # Pruebas de configuración
+import json
+import threading
+from core.config import ConfigStore, CONFIG_VERSION, DEFAULT_CONFIG
+
+
+def test_config_migrates_flat_file_and_keeps_unknown_keys(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"ngl": 20, "theme": "Adwaita-dark", "hand_edited": "x"}))
+    store = ConfigStore(str(path), save_delay=0)
+    assert store.get("ngl") == "20"
+    assert store.get("ctx_size") == DEFAULT_CONFIG["ctx_size"]
+    store.update({"language": "de"})
+    data = json.loads(path.read_text())
+    assert data["version"] == CONFIG_VERSION
+    assert data["settings"]["hand_edited"] == "x"
+    assert data["settings"]["language"] == "de"
+
+
+def test_config_coalesces_writes_and_persists_model_sections(tmp_path, monkeypatch):
+    import core.config as config
+    path = tmp_path / "config.json"
+    store = ConfigStore(str(path), save_delay=60)
+    writes = []
+    original_replace = config.os.replace
+    monkeypatch.setattr(config.os, "replace", lambda src, dst: (writes.append(dst), original_replace(src, dst)))
+
+    # Muchos cambios desde varios hilos: ninguno escribe hasta que vence el temporizador
+    threads = [threading.Thread(target=store.set, args=("threads", str(n))) for n in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    store.update_model_section("m.gguf", {"launch_profiles": {"active": "a", "profiles": {"a": {"parallel": 2}}}})
+    assert writes == [] and not path.exists()
+
+    store.flush()
+    assert writes == [str(path)]
+    store.flush()  # Sin cambios pendientes no se vuelve a escribir
+    assert len(writes) == 1
+    assert not (tmp_path / "config.json.tmp").exists()
+
+    reloaded = ConfigStore(str(path))
+    assert reloaded.get("threads") == store.get("threads")
+    assert reloaded.model_section("m.gguf")["launch_profiles"]["active"] == "a"
+
+
+def test_config_never_writes_an_older_snapshot_last(tmp_path):
+    import time
+    path = tmp_path / "config.json"
+    store = ConfigStore(str(path), save_delay=60)
+    for n in range(5):
+        # Dos guardados toman su instantánea mientras otro escribe; entran a escribir en cualquier orden
+        with store.write_lock:
+            flushes = []
+            for value in (f"{n}-viejo", f"{n}-nuevo"):
+                taken = store.snapshots
+                store.set("threads", value)
+                flushes.append(threading.Thread(target=store.flush))
+                flushes[-1].start()
+                while store.snapshots == taken:
+                    time.sleep(0.001)
+        for t in flushes:
+            t.join()
+        assert json.loads(path.read_text())["settings"]["threads"] == f"{n}-nuevo"
+
+
+def test_config_survives_corrupt_file(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text("{ truncado")
+    store = ConfigStore(str(path))
+    assert store.as_dict() == DEFAULT_CONFIG
@@ -0,0 +1,91 @@
+# Pruebas del demonio y de su API de control
+import pytest
+import core.llama_server as llama_server
+from core.daemon import ControlServer, DaemonError
+from core.daemon_client import DaemonClient, RemoteSupervisor
+from core.llama_server import ServerSupervisor, STATE_READY, STATE_STOPPED
+from tests.test_llama_server import make_fake_bin, _wait_for
+
+
+@pytest.fixture
+def daemon(tmp_path, monkeypatch):
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    supervisor = ServerSupervisor()
+    server = ControlServer(supervisor, str(tmp_path / "d.sock"))
+    server.start()
+    yield server, DaemonClient(server.path, timeout=10)
+    server.stop()
+    supervisor.stop_all()
+
+
+def test_control_api_start_status_logs_metrics_stop(tmp_path, daemon):
+    server, client = daemon
+    assert client.is_running()
+    with pytest.raises(DaemonError):
+        ControlServer(server.supervisor, server.path).start()  # Ya hay uno escuchando
+
+    response = client.call("create", model_path="a.gguf", bin_base=make_fake_bin(tmp_path), host="127.0.0.1",
+                           start=True)
+    instance_id = response["instance"]["id"]
+    assert response["started"]
+    assert _wait_for(lambda: client.call("status")["instances"][0]["state"] == STATE_READY)
+    assert any("loading model a.gguf" in line for line in client.call("logs", id=instance_id)["lines"])
+    assert "gen_tps" in client.call("metrics", id=instance_id)["metrics"]
+
+    assert client.call("stop", id=instance_id)["instance"]["state"] == STATE_STOPPED
+    with pytest.raises(DaemonError, match="no existe"):
+        client.call("stop", id=999)
+    with pytest.raises(DaemonError, match="desconocida"):
+        client.call("explode")
+
+
+def test_remote_supervisor_mirrors_daemon_instances(tmp_path, daemon):
+    server, client = daemon
+    remote = RemoteSupervisor(client, poll_interval=0.05)
+    events = []
+    remote.add_listener(lambda event, inst: events.append((event, inst.state)))
+    try:
+        instance = remote.create_instance("b.gguf", ["--fake-load", "0.2"], bin_base=make_fake_bin(tmp_path),
+                                          host="127.0.0.1")
+        instance.log("mensaje de la interfaz")
+        assert instance.start()
+        assert _wait_for(lambda: instance.state == STATE_READY)
+        assert _wait_for(lambda: any("loading model b.gguf" in line for line in instance.log_buffer.tail(20)))
+        assert any("mensaje de la interfaz" in line for line in instance.log_buffer.tail(20))
+        assert ("state", STATE_READY) in events
+
+        # La instancia es del demonio: otro cliente la ve y sigue viva aunque este se cierre
+        remote.close()
+        other = RemoteSupervisor(client, poll_interval=0.05)
+        try:
+            assert [inst.id for inst in other.list()] == [instance.id]
+            assert other.list()[0].state == STATE_READY
+            assert other.remove(instance.id)
+            assert other.list() == [] and server.supervisor.list() == []
+        finally:
+            other.close()
+    finally:
+        remote.close()
+
+
+def test_remote_poll_keeps_instance_created_during_poll(tmp_path, daemon):
+    server, client = daemon
+    remote = RemoteSupervisor(client, poll_interval=60)
+    created = []
+    real_call = client.call
+
+    def call(command, **params):
+        response = real_call(command, **params)
+        if command == "poll" and not created:
+            # Se crea otra instancia mientras la respuesta del poll va de camino
+            created.append(remote.create_instance("c.gguf", bin_base=make_fake_bin(tmp_path)))
+        return response
+
+    client.call = call
+    try:
+        remote.poll()
+        assert remote.list() == created
+        remote.poll()
+        assert remote.list() == created
+    finally:
+        remote.close()
@@ -0,0 +1,103 @@
+# Pruebas del lector de cabeceras GGUF y del índice de modelos
+import os
+import struct
+
+from core.gguf import (read_gguf, summarize_gguf, format_param_count, GGUFError,
+                       GGUF_TYPE_UINT32, GGUF_TYPE_STRING, GGUF_TYPE_ARRAY)
+from core.model_index import ModelIndex
+
+
+def _string(value):
+    data = value.encode("utf-8")
+    return struct.pack("<Q", len(data)) + data
+
+
+def _kv(key, value):
+    if isinstance(value, str):
+        return _string(key) + struct.pack("<I", GGUF_TYPE_STRING) + _string(value)
+    if isinstance(value, list):
+        items = b"".join(_string(v) for v in value)
+        return _string(key) + struct.pack("<IIQ", GGUF_TYPE_ARRAY, GGUF_TYPE_STRING, len(value)) + items
+    return _string(key) + struct.pack("<II", GGUF_TYPE_UINT32, value)
+
+
+def write_gguf_stub(path, metadata, tensors=()):
+    """Escribe un GGUF mínimo (sin datos de tensores) con los metadatos indicados"""
+    body = b"".join(_kv(k, v) for k, v in metadata.items())
+    for name, dims in tensors:
+        body += _string(name) + struct.pack("<I", len(dims))
+        body += b"".join(struct.pack("<Q", d) for d in dims)
+        body += struct.pack("<IQ", 0, 0)
+    with open(path, "wb") as f:
+        f.write(b"GGUF" + struct.pack("<IQQ", 3, len(tensors), len(metadata)) + body)
+
+
+LLAMA_METADATA = {
+    "general.architecture": "llama",
+    "general.name": "tiny",
+    "general.file_type": 15,
+    "llama.context_length": 4096,
+    "llama.block_count": 2,
+    "llama.embedding_length": 64,
+    "llama.attention.head_count": 4,
+    "tokenizer.ggml.model": "llama",
+    "tokenizer.ggml.tokens": [f"tok{i}" for i in range(100)],
+}
+
+
+def test_summarize_gguf(tmp_path):
+    path = str(tmp_path / "tiny.gguf")
+    write_gguf_stub(path, LLAMA_METADATA, [("a", (64, 100)), ("b", (64,))])
+    summary = summarize_gguf(path)
+    assert summary["architecture"] == "llama"
+    assert summary["quantization"] == "Q4_K_M"
+    assert summary["n_params"] == 64 * 100 + 64
+    assert summary["context_length"] == 4096
+    assert summary["block_count"] == 2
+    assert summary["head_count_kv"] == 4
+    assert len(summary["tokenizer_fingerprint"]) == 16
+
+
+def test_large_arrays_are_not_decoded(tmp_path):
+    path = str(tmp_path / "tiny.gguf")
+    write_gguf_stub(path, LLAMA_METADATA)
+    tokens = read_gguf(path)["metadata"]["tokenizer.ggml.tokens"]
+    assert len(tokens) == 100
+    assert not isinstance(tokens, list)
+
+
+def test_not_gguf(tmp_path):
+    path = tmp_path / "bad.gguf"
+    path.write_bytes(b"x" * 64)
+    try:
+        read_gguf(str(path))
+    except GGUFError:
+        pass
+    else:
+        raise AssertionError("Se esperaba GGUFError")
+
+
+def test_index_only_parses_changed_files(tmp_path, monkeypatch):
+    path = str(tmp_path / "tiny.gguf")
+    write_gguf_stub(path, LLAMA_METADATA)
+    index_file = str(tmp_path / "index.json")
+    index = ModelIndex(index_file)
+    assert index.get(path)["architecture"] == "llama"
+    index.save()
+
+    calls = []
+    import core.model_index
+    monkeypatch.setattr(core.model_index, "summarize_gguf", lambda p: calls.append(p) or {})
+    reloaded = ModelIndex(index_file)
+    assert reloaded.get(path)["architecture"] == "llama"
+    assert calls == []
+
+    os.utime(path, ns=(1, 1))
+    reloaded.get(path)
+    assert calls == [path]
+
+
+def test_format_param_count():
+    assert format_param_count(7_241_732_096) == "7.2B"
+    assert format_param_count(135_000_000) == "135M"
+    assert format_param_count(0) == ""
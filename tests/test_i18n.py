@@ -0,0 +1,41 @@
+# Pruebas de los catálogos de traducción
+import os
+import json
+import core.i18n as i18n
+
+
+def test_catalogs_compile_per_language_and_load_lazily(tmp_path, monkeypatch):
+    source = tmp_path / "translations.json"
+    source.write_text(json.dumps({"hello": {"es": "Hola", "en": "Hello"}, "only_es": {"es": "Solo"}}))
+    catalog_dir = tmp_path / "i18n"
+    monkeypatch.setattr(i18n, "LANGUAGE_FILE", str(source))
+    monkeypatch.setattr(i18n, "CATALOG_DIR", str(catalog_dir))
+    monkeypatch.setattr(i18n, "catalogs", {})
+    monkeypatch.setattr(i18n, "current_language", "es")
+
+    # Sin catálogos compilados se compila el del idioma pedido, y solo ese
+    assert i18n.get_text("hello") == "Hola"
+    assert sorted(os.listdir(catalog_dir)) == ["es.json"]
+    assert list(i18n.catalogs) == ["es"]
+    assert i18n.get_text("only_es", "en") == "only_es"
+    assert json.loads((catalog_dir / "en.json").read_text()) == {"hello": "Hello"}
+
+    # Un catálogo más antiguo que la fuente se vuelve a compilar
+    source.write_text(json.dumps({"hello": {"es": "Buenas", "en": "Hi"}}))
+    os.utime(catalog_dir / "es.json", (0, 0))
+    assert i18n.load_catalog("es") == {"hello": "Buenas"}
+
+    assert [os.path.basename(p) for p in i18n.compile_catalogs(languages=["es", "en"])] == ["es.json", "en.json"]
+
+
+def test_text_bindings_refresh_with_active_language(monkeypatch):
+    monkeypatch.setattr(i18n, "catalogs", {"es": {"title": "Título"}, "en": {"title": "Title"}})
+    monkeypatch.setattr(i18n, "current_language", "es")
+    texts = i18n.TextBindings()
+    shown = {}
+    texts.bind(lambda text: shown.update(title=text), "title")
+    texts.bind(lambda text: shown.update(missing=text), "missing")
+    assert shown == {"title": "Título", "missing": "missing"}
+    i18n.set_language("en")
+    texts.refresh()
+    assert shown == {"title": "Title", "missing": "missing"}
@@ -0,0 +1,42 @@
+# Pruebas de los perfiles de lanzamiento
+import pytest
+from core.launch_profile import LaunchProfile, ProfileStore, build_launch_profile
+
+SETTINGS = {"ngl": "40", "temp": "0.8", "top_k": "40", "top_p": "0.9", "repeat_penalty": "1.1",
+            "threads": "8", "ctx_size": "4096", "max_tokens": "512", "prompt": "", "model_path": "m.gguf"}
+
+
+def test_profile_builds_argv_from_schema():
+    profile = LaunchProfile({"parallel": "4", "cache_type_k": "q8_0", "no_mmap": True, "flash_attn": False})
+    argv = profile.to_argv()
+    assert argv == ["--parallel", "4", "--cache-type-k", "q8_0", "--cont-batching", "--no-mmap"]
+    with pytest.raises(ValueError):
+        LaunchProfile({"cache_type_v": "q3_x"})
+    with pytest.raises(ValueError):
+        LaunchProfile({"parallel": "0"})
+    with pytest.raises(ValueError):
+        LaunchProfile({"unknown": 1})
+
+
+def test_launch_profile_layers():
+    tuned = {"threads": 6, "threads_batch": 12, "batch_size": 2048, "ubatch_size": 512, "parallel": 2,
+             "gen_tps": 30.0}
+    named = LaunchProfile({"parallel": 8, "defrag_thold": 0.1})
+    argv = build_launch_profile(SETTINGS, tuned=tuned, named=named).to_argv()
+    assert argv[:4] == ["--n-gpu-layers", "40", "--temp", "0.8"]
+    assert argv[argv.index("--threads") + 1] == "6"  # Autotune gana al formulario
+    assert argv[argv.index("--parallel") + 1] == "8"  # El perfil con nombre gana a Autotune
+    assert "--defrag-thold" in argv and "--cont-batching" in argv and "--flash-attn" in argv
+
+
+def test_profile_store_named_profiles(tmp_path):
+    from core.config import ConfigStore
+    config = ConfigStore(str(tmp_path / "config.json"), save_delay=0)
+    store = ProfileStore(config)
+    store.save("/models/m.gguf", "rápido", LaunchProfile({"parallel": 4}))
+    store.save("/models/m.gguf", "contexto", LaunchProfile({"cache_type_k": "q4_0"}), activate=False)
+    reloaded = ProfileStore(ConfigStore(str(tmp_path / "config.json")))
+    assert reloaded.names("/otra/ruta/m.gguf") == ["contexto", "rápido"]
+    assert reloaded.active("/models/m.gguf") == LaunchProfile({"parallel": 4})
+    assert reloaded.delete("/models/m.gguf", "rápido")
+    assert reloaded.active("/models/m.gguf") is None
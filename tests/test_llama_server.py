@@ -1 +1,480 @@
 # Pruebas del servidor LLaMA
+from core.log_buffer import LogRingBuffer
+
+
+def test_log_buffer_drains_new_lines_once():
+    buf = LogRingBuffer(max_lines=10)
+    buf.append("a\n")
+    buf.append("b\n")
+    assert buf.drain() == ("a\nb\n", 0)
+    assert buf.drain() == ("", 0)
+    buf.append("c\n")
+    assert buf.drain() == ("c\n", 0)
+
+
+def test_log_buffer_notifies_once_per_batch():
+    calls = []
+    buf = LogRingBuffer(max_lines=10, on_pending=lambda: calls.append(1))
+    buf.append("a\n")
+    buf.append("b\n")
+    assert len(calls) == 1
+    buf.drain()
+    buf.append("c\n")
+    assert len(calls) == 2
+
+
+def test_log_buffer_is_bounded():
+    buf = LogRingBuffer(max_lines=3)
+    for i in range(10):
+        buf.append(f"{i}\n")
+    assert len(buf.lines) == 3
+    assert buf.drain() == ("7\n8\n9\n", 7)
+    assert buf.tail(2) == ["8\n", "9\n"]
+
+
+def _write_session(log_dir, lines, **kwargs):
+    from core.server_log import SessionLogWriter
+    writer = SessionLogWriter(log_dir=str(log_dir), **kwargs)
+    for line in lines:
+        writer.write(line)
+    writer.close()
+    return writer
+
+
+def test_session_log_index_and_search(tmp_path):
+    from core.server_log import LogReader, list_logs
+    lines = ["I loading model\n", "W low memory\n", "E failed to allocate\n", "I listening on 8080\n"]
+    _write_session(tmp_path, lines)
+    [log_path] = list_logs(str(tmp_path))
+    reader = LogReader(log_path)
+    try:
+        assert len(reader) == 4
+        assert reader.get_line(2) == "E failed to allocate"
+        assert reader.get_lines(3, 10) == ["I listening on 8080"]
+        assert reader.search("model|8080") == [0, 3]
+        assert reader.search(level="error") == [2]
+        assert reader.search("memory|allocate", level="warning") == [1]
+    finally:
+        reader.close()
+
+
+def test_session_logs_started_together_do_not_share_files(tmp_path):
+    from core.server_log import SessionLogWriter, LogReader, list_logs
+    writers = [SessionLogWriter(log_dir=str(tmp_path)), SessionLogWriter(log_dir=str(tmp_path), name="i2-p8081")]
+    for i in range(3):
+        for n, writer in enumerate(writers):
+            writer.write(f"sesión {n} línea {i}")
+    for writer in writers:
+        writer.close()
+    logs = list_logs(str(tmp_path))
+    assert len(logs) == 2 and any(path.endswith("-i2-p8081.000.log") for path in logs)
+    for path in logs:
+        reader = LogReader(path)
+        try:
+            assert len(reader) == 3 and len({line.split()[1] for line in reader.get_lines(0, 3)}) == 1
+        finally:
+            reader.close()
+
+
+def test_session_log_rotation_and_compression(tmp_path):
+    import time
+    from core.server_log import LogReader, list_logs
+    _write_session(tmp_path, [f"line {i}\n" for i in range(100)], max_bytes=200, max_files=3, compress=True)
+    deadline = time.time() + 5
+    while time.time() < deadline and not any(p.endswith(".gz") for p in list_logs(str(tmp_path))):
+        time.sleep(0.05)
+    logs = list_logs(str(tmp_path))
+    assert len(logs) <= 3
+    compressed = [p for p in logs if p.endswith(".gz")]
+    assert compressed
+    reader = LogReader(compressed[0])
+    try:
+        assert reader.get_line(0).startswith("line ")
+    finally:
+        reader.close()
+
+
+def test_metrics_parse_llama_server_output():
+    from core.metrics import MetricsTracker
+    tracker = MetricsTracker()
+    for line in [
+        "llama_perf_context_print:        load time =    1234.56 ms\n",
+        "slot launch_slot_: id  0 | task 12 | processing task\n",
+        "prompt eval time =     123.45 ms /    10 tokens (   12.35 ms per token,    81.00 tokens per second)\n",
+        "       eval time =    1234.56 ms /   100 tokens (   12.35 ms per token,    40.50 tokens per second)\n",
+        "slot      release: id  0 | task 12 | stop processing: n_past = 110, truncated = 0\n",
+        "srv  update_slots: all slots are idle\n",
+    ]:
+        tracker.feed(line)
+    snapshot = tracker.snapshot()
+    assert snapshot["load_ms"] == 1234.56
+    assert snapshot["prompt_tps"] == 81.0
+    assert snapshot["gen_tps"] == 40.5
+    assert snapshot["requests_completed"] == 1
+    assert snapshot["active_requests"] == 0
+    assert snapshot["generated_tokens"] == 100
+
+
+def test_time_series_downsamples_when_full():
+    from core.metrics import TimeSeries
+    series = TimeSeries(capacity=4)
+    for i in range(9):
+        series.append(float(i), float(i))
+    assert len(series) <= 4
+    assert series.last() == 8.0
+
+
+def _serve_health(statuses):
+    """Servidor HTTP local que responde a /health con los códigos indicados (el último se repite)"""
+    import threading
+    from http.server import BaseHTTPRequestHandler, HTTPServer
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            code = statuses.pop(0) if len(statuses) > 1 else statuses[0]
+            self.send_response(code)
+            self.end_headers()
+            self.wfile.write(b"{}")
+
+        def log_message(self, *args):
+            pass
+
+    server = HTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def test_wait_until_ready_waits_for_model_load():
+    from core.llama_server import wait_until_ready
+    server = _serve_health([503, 503, 200])
+    try:
+        assert wait_until_ready(server.server_port, initial_delay=0.01, timeout=5) == "ready"
+    finally:
+        server.shutdown()
+
+
+def test_wait_until_ready_stops_when_process_exits():
+    from core.llama_server import wait_until_ready
+    server = _serve_health([503])
+    try:
+        assert wait_until_ready(server.server_port, initial_delay=0.01, timeout=5,
+                                is_alive=lambda: False) == "exited"
+        assert wait_until_ready(server.server_port, initial_delay=0.01, timeout=0.1) == "timeout"
+    finally:
+        server.shutdown()
+
+
+def test_readiness_probe_reports_elapsed_time():
+    import threading
+    from core.llama_server import ReadinessProbe
+    server = _serve_health([503, 200])
+    ready = threading.Event()
+    elapsed = []
+    try:
+        probe = ReadinessProbe(server.server_port, on_ready=lambda s: (elapsed.append(s), ready.set()))
+        probe.start()
+        assert ready.wait(5)
+        assert elapsed[0] >= 0
+    finally:
+        server.shutdown()
+
+
+def test_record_cold_start(tmp_path, monkeypatch):
+    import core.llama_server as llama_server
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    settings = {"ngl": "40", "ctx_size": "4096", "threads": "8"}
+    assert llama_server.record_cold_start("/m/model.gguf", settings, 10.0) is None
+    assert llama_server.record_cold_start("/m/model.gguf", settings, 20.0) == 10.0
+
+
+def test_cmdline_port_parsing():
+    from core.llama_server import get_cmdline_port
+    assert get_cmdline_port(["llama-server", "--model", "m.gguf", "--port", "9000"]) == 9000
+    assert get_cmdline_port(["llama-server", "--port=9001", "--host", "0.0.0.0"]) == 9001
+    assert get_cmdline_port(["sh", "-c", "/opt/llama-server --port 9002 --model 'a b.gguf'"]) == 9002
+    assert get_cmdline_port(["llama-server", "--model", "m.gguf"]) == 8080
+    assert get_cmdline_port(["llama-server", "--port", "abc"]) is None
+
+
+def test_check_server_running_without_listener_skips_process_scan(monkeypatch):
+    import core.llama_server as llama_server
+    monkeypatch.setattr(llama_server, "_listening_socket_inodes", lambda port: set())
+    monkeypatch.setattr(llama_server, "_find_server_by_cmdline",
+                        lambda port: (_ for _ in ()).throw(AssertionError("no debería recorrer procesos")))
+    assert llama_server.check_server_running(65000) is None
+
+
+def test_listening_socket_inodes_finds_own_socket():
+    import os
+    import socket
+    from core.llama_server import _listening_socket_inodes, _pid_owning_socket
+    if not os.path.exists("/proc/net/tcp"):
+        return
+    sock = socket.socket()
+    sock.bind(("127.0.0.1", 0))
+    sock.listen()
+    try:
+        port = sock.getsockname()[1]
+        inodes = _listening_socket_inodes(port)
+        assert inodes
+        assert _pid_owning_socket(inodes, [os.getpid()]) == os.getpid()
+    finally:
+        sock.close()
+
+
+def make_fake_bin(tmp_path):
+    """Crea un directorio con un ejecutable llama-server que lanza tests/fake_llama_server.py"""
+    import os
+    import sys
+    bin_dir = tmp_path / "bin"
+    bin_dir.mkdir()
+    script = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fake_llama_server.py")
+    launcher = bin_dir / "llama-server"
+    launcher.write_text(f"#!/bin/sh\nexec {sys.executable} {script} \"$@\"\n")
+    launcher.chmod(0o755)
+    return str(bin_dir)
+
+
+def _wait_state(instance, states, timeout=10):
+    import time
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if instance.state in states:
+            return instance.state
+        time.sleep(0.02)
+    return instance.state
+
+
+def test_supervisor_runs_independent_instances(tmp_path, monkeypatch):
+    import core.llama_server as llama_server
+    from core.llama_server import ServerSupervisor, STATE_READY, STATE_STOPPED
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    bin_dir = make_fake_bin(tmp_path)
+    supervisor = ServerSupervisor()
+    events = []
+    supervisor.add_listener(lambda event, inst: events.append((event, inst.id)))
+    first = supervisor.create_instance("a.gguf", ["--fake-load", "0.2"], bin_base=bin_dir, host="127.0.0.1")
+    second = supervisor.create_instance("b.gguf", [], bin_base=bin_dir, host="127.0.0.1")
+    try:
+        assert first.port != second.port
+        assert first.start() and second.start()
+        assert _wait_state(first, {STATE_READY}) == STATE_READY
+        assert _wait_state(second, {STATE_READY}) == STATE_READY
+        assert first.ready_seconds is not None
+        assert any("loading model a.gguf" in line for line in first.log_buffer.tail(10))
+        assert supervisor.stop(first.id)
+        assert first.state == STATE_STOPPED
+        assert second.is_running()
+        assert ("added", first.id) in events and ("state", first.id) in events
+    finally:
+        supervisor.stop_all()
+
+
+def test_stop_escalates_to_sigkill_for_the_whole_group_without_blocking(tmp_path, monkeypatch):
+    import time
+    import psutil
+    import core.llama_server as llama_server
+    from core.llama_server import ServerSupervisor, STATE_READY, STATE_STOPPED
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    supervisor = ServerSupervisor()
+    instance = supervisor.create_instance("a.gguf", ["--fake-ignore-term"], bin_base=make_fake_bin(tmp_path),
+                                          host="127.0.0.1", stop_grace=0.5)
+    try:
+        assert instance.start()
+        assert _wait_state(instance, {STATE_READY}) == STATE_READY
+        assert _wait_for(lambda: any("worker pid" in line for line in instance.log_buffer.tail(10)))
+        worker = int(next(line for line in instance.log_buffer.tail(10) if "worker pid" in line).split()[-1])
+        results = []
+        started = time.monotonic()
+        assert instance.stop(wait=False, on_stopped=results.append)
+        assert time.monotonic() - started < 0.2
+        assert _wait_for(lambda: results == [True])
+        assert time.monotonic() - started >= 0.5
+        assert instance.state == STATE_STOPPED and instance.process is None
+        assert _wait_for(lambda: not psutil.pid_exists(worker) or
+                         psutil.Process(worker).status() == psutil.STATUS_ZOMBIE)
+    finally:
+        supervisor.stop_all()
+
+
+def test_terminate_does_not_signal_a_reaped_pid(monkeypatch):
+    import os
+    import sys
+    import subprocess
+    from core.llama_server import terminate_server
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    # El PID ya no es del servidor: no se debe señalizar nada
+    signals = []
+    monkeypatch.setattr(os, "kill", lambda *args: signals.append(args))
+    monkeypatch.setattr(os, "killpg", lambda *args: signals.append(args))
+    results = []
+    terminate_server(process.pid, 0.1, results.append, process=process).join(5)
+    assert results == [True] and signals == []
+
+
+def test_stop_drains_requests_in_flight(tmp_path, monkeypatch):
+    import json
+    import threading
+    import urllib.request
+    import core.llama_server as llama_server
+    from core.llama_server import ServerSupervisor, STATE_READY, STATE_DRAINING, STATE_STOPPING, STATE_STOPPED
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    monkeypatch.setattr(llama_server, "DRAIN_POLL_INTERVAL", 0.05)
+    supervisor = ServerSupervisor()
+    instance = supervisor.create_instance("a.gguf", ["--fake-slow", "1"], bin_base=make_fake_bin(tmp_path),
+                                          host="127.0.0.1", drain_timeout=10)
+    states = []
+    instance.add_state_listener(lambda inst: states.append(inst.state))
+    replies = []
+
+    def generate():
+        request = urllib.request.Request(f"http://127.0.0.1:{instance.port}/completion", data=b"{}")
+        with urllib.request.urlopen(request, timeout=10) as response:
+            replies.append(json.loads(response.read()))
+
+    try:
+        assert instance.start()
+        assert _wait_state(instance, {STATE_READY}) == STATE_READY
+        client = threading.Thread(target=generate)
+        client.start()
+        assert _wait_for(lambda: llama_server.count_active_requests(instance.port) == 1)
+        assert instance.stop()
+        client.join()
+        assert replies and replies[0]["content"]
+        assert states[-3:] == [STATE_DRAINING, STATE_STOPPING, STATE_STOPPED]
+    finally:
+        supervisor.stop_all()
+
+
+def test_prompt_prefix_is_prefilled_saved_and_restored(tmp_path, monkeypatch):
+    import json
+    import urllib.request
+    import core.llama_server as llama_server
+    import core.prompt_cache as prompt_cache
+    from core.llama_server import ServerSupervisor, STATE_READY
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    monkeypatch.setattr(prompt_cache, "SLOT_CACHE_DIR", str(tmp_path / "slots"))
+    bin_dir = make_fake_bin(tmp_path)
+    prefix = "Eres un asistente que responde en español. " * 20
+    supervisor = ServerSupervisor()
+
+    def launch():
+        instance = supervisor.create_instance("a.gguf", ["--parallel", "2"], bin_base=bin_dir, host="127.0.0.1",
+                                              prompt_prefix=prefix)
+        assert instance.start()
+        assert _wait_state(instance, {STATE_READY}) == STATE_READY
+        return instance
+
+    try:
+        first = launch()
+        assert any("guardado en disco" in line for line in first.log_buffer.tail(5))
+        assert len(list((tmp_path / "slots").iterdir())) == 1
+        supervisor.remove(first.id)
+        second = launch()
+        assert any("restaurado desde disco en 2 ranura(s)" in line for line in second.log_buffer.tail(5))
+        # La primera petición con el prefijo solo procesa lo que viene detrás
+        for slot in (0, 1):
+            request = urllib.request.Request(f"http://127.0.0.1:{second.port}/completion", data=json.dumps(
+                {"prompt": prefix + "Hola", "id_slot": slot}).encode())
+            with urllib.request.urlopen(request, timeout=5) as response:
+                assert json.loads(response.read())["timings"]["prompt_n"] == 1
+    finally:
+        supervisor.stop_all()
+
+
+def test_warmup_runs_before_the_instance_is_ready(tmp_path, monkeypatch):
+    import core.llama_server as llama_server
+    from core.llama_server import ServerSupervisor, STATE_STARTING, STATE_WARMING, STATE_READY
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    supervisor = ServerSupervisor()
+    instance = supervisor.create_instance("a.gguf", ["--embedding"], bin_base=make_fake_bin(tmp_path),
+                                          host="127.0.0.1", warmup={"prompts": ["uno", "dos"], "n_predict": 4})
+    states = []
+    instance.add_state_listener(lambda inst: states.append(inst.state))
+    try:
+        assert instance.start()
+        assert _wait_state(instance, {STATE_READY}) == STATE_READY
+        assert states == [STATE_STARTING, STATE_WARMING, STATE_READY]
+        report = instance.describe()["warmup"]
+        assert report["requests"] == 2 and report["failed"] == 0
+        assert report["warm"]["tokens"] == 4 and report["warm"]["tokens_per_second"] == 40.0
+        assert len(report["embedding_ms"]) == 2
+        assert any("Calentamiento (2 peticiones)" in line for line in instance.log_buffer.tail(5))
+    finally:
+        supervisor.stop_all()
+
+
+def test_instance_is_not_ready_when_every_warmup_request_fails(tmp_path, monkeypatch):
+    import core.llama_server as llama_server
+    from core.llama_server import ServerSupervisor, STATE_WARMING, STATE_READY, STATE_FAILED
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    supervisor = ServerSupervisor()
+    instance = supervisor.create_instance("a.gguf", ["--fake-completion-error"], bin_base=make_fake_bin(tmp_path),
+                                          host="127.0.0.1", warmup={"prompts": ["uno", "dos"], "n_predict": 4})
+    states = []
+    instance.add_state_listener(lambda inst: states.append(inst.state))
+    try:
+        assert instance.start()
+        assert _wait_state(instance, {STATE_READY, STATE_FAILED}) == STATE_FAILED
+        assert STATE_WARMING in states and STATE_READY not in states
+        assert instance.describe()["warmup"]["failed"] == 2
+        assert any("Ninguna petición de calentamiento" in line for line in instance.log_buffer.tail(5))
+    finally:
+        supervisor.stop_all()
+
+
+def test_instance_reports_unexpected_exit(tmp_path):
+    from core.llama_server import ServerSupervisor, STATE_EXITED
+    supervisor = ServerSupervisor()
+    instance = supervisor.create_instance("a.gguf", ["--fake-exit", "3"], bin_base=make_fake_bin(tmp_path),
+                                          host="127.0.0.1")
+    assert instance.start()
+    assert _wait_state(instance, {STATE_EXITED}) == STATE_EXITED
+    assert instance.exit_code == 3
+
+
+def _wait_for(condition, timeout=10):
+    import time
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        if condition():
+            return True
+        time.sleep(0.02)
+    return False
+
+
+def test_watchdog_restarts_with_backoff_and_gives_up(tmp_path):
+    from core.llama_server import ServerSupervisor
+    supervisor = ServerSupervisor()
+    instance = supervisor.create_instance("a.gguf", ["--fake-exit", "3"], bin_base=make_fake_bin(tmp_path),
+                                          host="127.0.0.1",
+                                          watchdog={"hang_timeout": 0, "base_delay": 0.05, "max_restarts": 3})
+    watchdog = instance.watchdog
+    try:
+        assert instance.start()
+        assert _wait_for(lambda: watchdog.gave_up)
+        assert watchdog.restarts == 2
+        assert [crash.exit_code for crash in watchdog.crashes] == [3, 3, 3]
+        assert any("failed to load model" in line for line in watchdog.crashes[-1].last_lines)
+        assert instance.describe()["watchdog"]["gave_up"]
+    finally:
+        supervisor.stop_all()
+    assert not watchdog.gave_up  # Una parada manual reinicia la cuenta
+
+
+def test_watchdog_restarts_hung_server(tmp_path, monkeypatch):
+    import core.llama_server as llama_server
+    from core.llama_server import ServerSupervisor, STATE_READY
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    supervisor = ServerSupervisor()
+    instance = supervisor.create_instance("a.gguf", ["--fake-hang", "0.5"], bin_base=make_fake_bin(tmp_path),
+                                          host="127.0.0.1",
+                                          watchdog={"hang_timeout": 0.5, "check_interval": 0.1, "base_delay": 0.05})
+    try:
+        assert instance.start()
+        assert _wait_for(lambda: instance.watchdog.restarts >= 1)
+        assert instance.watchdog.crashes[0].reason == "hang"
+        assert _wait_state(instance, {STATE_READY}) == STATE_READY
+    finally:
+        supervisor.stop_all()
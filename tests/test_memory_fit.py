@@ -0,0 +1,58 @@
+# Pruebas del estimador de memoria
+from core.memory_fit import estimate_memory, kv_bytes_per_token, MODE_MLOCK, MODE_MMAP, MODE_NO_MMAP
+
+GB = 1024 ** 3
+
+LLAMA_7B = {"block_count": 32, "embedding_length": 4096, "head_count": 32, "head_count_kv": 32,
+            "context_length": 32768}
+
+
+def _model(tmp_path, size):
+    path = tmp_path / "model.gguf"
+    with open(path, "wb") as f:
+        f.truncate(size)  # Fichero disperso: no ocupa disco
+    return str(path)
+
+
+def test_kv_bytes_per_token():
+    # 32 capas * 32 cabezas * (128 K + 128 V) * 2 bytes = 0.5 MB por token
+    assert kv_bytes_per_token(LLAMA_7B) == 512 * 1024
+    # Con GQA (8 cabezas KV) y caché q8_0 ocupa bastante menos
+    gqa = dict(LLAMA_7B, head_count_kv=8)
+    assert kv_bytes_per_token(gqa) == 128 * 1024
+    assert kv_bytes_per_token(gqa, "q8_0", "q8_0") == 128 * 1024 * 34 / 64
+    # Cabezas KV por capa
+    assert kv_bytes_per_token(dict(LLAMA_7B, block_count=2, head_count_kv=[8, 0])) == 8 * 256 * 2
+    assert kv_bytes_per_token({"block_count": 32}) is None
+
+
+def test_estimate_memory_chooses_mode_and_context(tmp_path):
+    model = _model(tmp_path, 4 * GB)
+    advice = estimate_memory(model, LLAMA_7B, 4096, parallel=2, available=16 * GB, memlock=None)
+    assert advice.kv_bytes == 2 * GB
+    assert advice.fits and advice.mode == MODE_MLOCK
+    assert advice.per_slot_ctx == 2048
+    assert advice.max_ctx == 20224
+
+    # mlock fallaría con un RLIMIT_MEMLOCK pequeño
+    assert estimate_memory(model, LLAMA_7B, 4096, available=16 * GB, memlock=64 * 1024).mode == MODE_MMAP
+
+    # Poca memoria: mmap y contexto reducido
+    advice = estimate_memory(model, LLAMA_7B, 8192, available=6 * GB, memlock=None)
+    assert not advice.fits and advice.mode == MODE_MMAP
+    assert advice.max_ctx == 1792
+
+    # Todas las capas en la GPU
+    advice = estimate_memory(model, LLAMA_7B, 8192, n_gpu_layers=99, available=2 * GB, memlock=None,
+                             gpu_offload=True)
+    assert advice.mode == MODE_NO_MMAP and advice.kv_bytes == 0 and advice.max_ctx == 32768
+
+    # Sin GPU, --n-gpu-layers no libera RAM
+    advice = estimate_memory(model, LLAMA_7B, 8192, n_gpu_layers=99, available=6 * GB, memlock=None)
+    assert advice.kv_bytes == 4 * GB and advice.mode == MODE_MMAP and advice.max_ctx == 1792
+
+
+def test_estimate_memory_default_context(tmp_path):
+    # --ctx-size 0 (o vacío) usa el contexto de entrenamiento: 32768 tokens de caché
+    advice = estimate_memory(_model(tmp_path, 4 * GB), LLAMA_7B, 0, available=64 * GB, memlock=None)
+    assert advice.ctx_size == 32768 and advice.kv_bytes == 16 * GB
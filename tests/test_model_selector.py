@@ -1 +1,84 @@
 # Pruebas del selector de modelos
+import os
+import threading
+
+from core.discovery import ModelDiscovery, split_roots
+from core.model_index import ModelIndex
+
+
+def _make_tree(base, layout):
+    for rel in layout:
+        path = os.path.join(base, rel)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(b"not a real gguf")
+
+
+def _discover(roots, index, **kwargs):
+    found = []
+    done = threading.Event()
+    lock = threading.Lock()
+
+    def on_batch(root, batch):
+        with lock:
+            found.extend(path for path, _ in batch)
+
+    discovery = ModelDiscovery(on_batch, on_finished=done.set, index=index, **kwargs)
+    discovery.start(roots)
+    assert done.wait(10)
+    return sorted(found)
+
+
+def test_discovery_is_recursive_across_roots(tmp_path):
+    root_a = str(tmp_path / "a")
+    root_b = str(tmp_path / "b")
+    _make_tree(root_a, ["m1.gguf", "sub/m2.gguf", "sub/deeper/m3.gguf", "notes.txt", ".hidden/m4.gguf"])
+    _make_tree(root_b, ["m5.gguf"])
+    index = ModelIndex(str(tmp_path / "index.json"))
+    found = _discover([root_a, root_b], index)
+    assert [os.path.relpath(p, str(tmp_path)) for p in found] == [
+        os.path.join("a", "m1.gguf"),
+        os.path.join("a", "sub", "deeper", "m3.gguf"),
+        os.path.join("a", "sub", "m2.gguf"),
+        os.path.join("b", "m5.gguf"),
+    ]
+
+
+def test_discovery_reports_every_directory_it_walks(tmp_path):
+    root = str(tmp_path / "a")
+    _make_tree(root, ["m1.gguf", "sub/deeper/notes.txt"])
+    os.makedirs(os.path.join(root, "empty"))
+    directories = []
+    done = threading.Event()
+    discovery = ModelDiscovery(lambda root, batch: None, on_finished=done.set,
+                               on_directory=lambda root, directory: directories.append(directory),
+                               index=ModelIndex(str(tmp_path / "index.json")))
+    discovery.start([root])
+    assert done.wait(10)
+    # Los directorios aún sin modelos también se vigilan: ahí se pueden copiar después
+    assert sorted(os.path.relpath(d, root) for d in directories) == [
+        ".", "empty", "sub", os.path.join("sub", "deeper")]
+
+
+def test_discovery_with_no_roots_finishes(tmp_path):
+    assert _discover([], ModelIndex(str(tmp_path / "index.json"))) == []
+
+
+def test_root_timeout_reports_partial_results(tmp_path):
+    root = str(tmp_path / "a")
+    _make_tree(root, ["m1.gguf", "sub/m2.gguf"])
+    timed_out = []
+    done = threading.Event()
+    discovery = ModelDiscovery(lambda root, batch: None,
+                               on_root_done=lambda root, paths, t: timed_out.append(t),
+                               on_finished=done.set, root_timeout=-1,
+                               index=ModelIndex(str(tmp_path / "index.json")))
+    discovery.start([root])
+    assert done.wait(10)
+    assert timed_out == [True]
+
+
+def test_split_roots(tmp_path):
+    a = str(tmp_path / "a")
+    assert split_roots(f"{a}{os.pathsep} {a} {os.pathsep}") == [a]
+    assert split_roots("") == []
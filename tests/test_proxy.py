@@ -0,0 +1,238 @@
+# Pruebas del proxy de reparto de carga
+import http.client
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from core.proxy import LoadBalancingProxy
+
+
+def _serve_backend(name, release=None):
+    """Backend HTTP/1.1 mínimo: /who responde su nombre, /slow espera a `release`
+    y /stream envía eventos SSE con Transfer-Encoding: chunked"""
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def _send(self, body):
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/slow":
+                release.wait(5)
+            self._send(name.encode())
+
+        def do_POST(self):
+            body = self.rfile.read(int(self.headers["Content-Length"]))
+            if self.path != "/stream":
+                self._send(name.encode() + b":" + body)
+                return
+            self.send_response(200)
+            self.send_header("Content-Type", "text/event-stream")
+            self.send_header("Transfer-Encoding", "chunked")
+            self.end_headers()
+            for i, event in enumerate((b"data: uno\n\n", b"data: dos\n\n")):
+                if i:
+                    release.wait(5)
+                self.wfile.write(b"%x\r\n%s\r\n" % (len(event), event))
+                self.wfile.flush()
+            self.wfile.write(b"0\r\n\r\n")
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _start_proxy(*servers):
+    proxy = LoadBalancingProxy(0, host="127.0.0.1")
+    proxy.start()
+    for server in servers:
+        proxy.add_backend("127.0.0.1", server.server_address[1])
+    return proxy
+
+
+def test_proxy_routes_to_least_busy_backend():
+    release = threading.Event()
+    a = _serve_backend("a", release)
+    b = _serve_backend("b", release)
+    proxy = _start_proxy(a, b)
+    try:
+        # Una petición lenta ocupa una réplica; las siguientes van a la otra
+        slow = http.client.HTTPConnection("127.0.0.1", proxy.port, timeout=5)
+        slow.request("GET", "/slow")
+        for _ in range(50):
+            if sum(s["in_flight"] for s in proxy.stats()) == 1:
+                break
+            threading.Event().wait(0.02)
+        busy = next(s["port"] for s in proxy.stats() if s["in_flight"] == 1)
+        idle_name = b"b" if busy == a.server_address[1] else b"a"
+
+        conn = http.client.HTTPConnection("127.0.0.1", proxy.port, timeout=5)
+        for _ in range(3):
+            conn.request("POST", "/v1/completions", body=b"{}")
+            assert conn.getresponse().read() == idle_name + b":{}"
+        release.set()
+        assert slow.getresponse().read() in (b"a", b"b")
+        for _ in range(50):
+            stats = proxy.stats()
+            if all(s["in_flight"] == 0 for s in stats):
+                break
+            threading.Event().wait(0.02)
+        assert sum(s["total"] for s in stats) == 4
+        assert all(s["in_flight"] == 0 for s in stats)
+    finally:
+        release.set()
+        proxy.stop()
+        a.shutdown()
+        b.shutdown()
+
+
+def test_proxy_streams_sse_without_buffering():
+    release = threading.Event()
+    backend = _serve_backend("a", release)
+    proxy = _start_proxy(backend)
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", proxy.port, timeout=5)
+        conn.request("POST", "/stream", body=b'{"stream": true}')
+        response = conn.getresponse()
+        # El primer evento llega antes de que el backend termine la respuesta
+        assert response.readline() == b"data: uno\n"
+        release.set()
+        assert response.read() == b"\ndata: dos\n\n"
+        # La conexión hacia el backend vuelve al pool
+        for _ in range(50):
+            if proxy.backends[0].idle:
+                break
+            threading.Event().wait(0.02)
+        assert len(proxy.backends[0].idle) == 1
+    finally:
+        release.set()
+        proxy.stop()
+        backend.shutdown()
+
+
+def test_proxy_without_backends_returns_503():
+    proxy = _start_proxy()
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", proxy.port, timeout=5)
+        conn.request("GET", "/health")
+        assert conn.getresponse().status == 503
+    finally:
+        proxy.stop()
+
+
+def test_hot_swap_through_proxy_without_failed_requests(tmp_path, monkeypatch):
+    import json
+    import core.llama_server as llama_server
+    from core.llama_server import ServerSupervisor, STATE_READY
+    from core.proxy import bind_supervisor
+    from tests.test_llama_server import make_fake_bin, _wait_for
+    monkeypatch.setattr(llama_server, "COLD_START_FILE", str(tmp_path / "cold.json"))
+    monkeypatch.setattr(llama_server, "DRAIN_POLL_INTERVAL", 0.05)
+    supervisor = ServerSupervisor()
+    proxy = _start_proxy()
+    bind_supervisor(proxy, supervisor)
+    old = supervisor.create_instance("a.gguf", ["--fake-slow", "0.05", "--parallel", "2"],
+                                     bin_base=make_fake_bin(tmp_path), host="127.0.0.1", drain_timeout=10)
+    served, failures = [], []
+    stop = threading.Event()
+
+    def client(body):
+        while not stop.is_set():
+            try:
+                conn = http.client.HTTPConnection("127.0.0.1", proxy.port, timeout=10)
+                conn.request("POST", "/completion", body=body)
+                response = conn.getresponse()
+                body = response.read()
+                if response.status != 200:
+                    failures.append(response.status)
+                else:
+                    served.append(json.loads(body)["model"])
+                conn.close()
+            except OSError as e:
+                failures.append(e)
+
+    try:
+        assert old.start()
+        assert _wait_for(lambda: old.state == STATE_READY)
+        # Unos clientes no indican modelo y otros siguen pidiendo el viejo por su nombre
+        clients = [threading.Thread(target=client, args=(body,)) for body in (b"{}", b'{"model": "a"}')]
+        for thread in clients:
+            thread.start()
+        assert _wait_for(lambda: len(served) >= 5)
+        new = supervisor.swap(old.id, "b.gguf")
+        assert new.state == STATE_READY and new.port != old.port
+        assert supervisor.list() == [new] and old.process is None
+        count = len(served)
+        assert _wait_for(lambda: len(served) >= count + 5)
+        stop.set()
+        for thread in clients:
+            thread.join()
+        assert failures == []
+        assert served[0] == "a.gguf" and served[-1] == "b.gguf"
+    finally:
+        stop.set()
+        supervisor.stop_all()
+        proxy.stop()
+
+
+def test_proxy_routes_by_model_and_handles_expect_continue():
+    a = _serve_backend("a")
+    b = _serve_backend("b")
+    a2 = _serve_backend("a2")
+    proxy = LoadBalancingProxy(0, host="127.0.0.1")
+    proxy.start()
+    proxy.add_backend("127.0.0.1", a.server_address[1], model="/modelos/llama.gguf")
+    proxy.add_backend("127.0.0.1", b.server_address[1], model="/modelos/qwen.gguf")
+    proxy.add_backend("127.0.0.1", a2.server_address[1], model="/modelos/llama.gguf")
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", proxy.port, timeout=5)
+        # El campo "model" elige las réplicas; sin él (o desconocido), el modelo añadido el último
+        answers = set()
+        for _ in range(4):
+            conn.request("POST", "/v1/chat/completions", body=b'{"model": "llama"}')
+            answers.add(conn.getresponse().read().split(b":")[0])
+        assert answers == {b"a", b"a2"}
+        conn.request("POST", "/v1/chat/completions", body=b'{"model": "qwen.gguf"}')
+        assert conn.getresponse().read().startswith(b"b:")
+        conn.request("POST", "/completion", body=b'{"model": "gpt-4"}')
+        assert conn.getresponse().read().split(b":")[0] in (b"a", b"a2")
+
+        # Expect: 100-continue no llega al backend: la respuesta siguiente por la misma
+        # conexión keep-alive es la suya, no la de la petición anterior
+        proxy.remove_backend(a.server_address[1])
+        proxy.remove_backend(a2.server_address[1])
+        for body in (b'{"n": 1}', b'{"n": 2}'):
+            conn.request("POST", "/completion", body=body, headers={"Expect": "100-continue"})
+            response = conn.getresponse()
+            assert response.status == 200 and response.read() == b"b:" + body
+    finally:
+        proxy.stop()
+        for server in (a, b, a2):
+            server.shutdown()
+
+
+def test_proxy_routes_named_old_model_to_new_replica_while_draining():
+    old = _serve_backend("old")
+    new = _serve_backend("new")
+    proxy = LoadBalancingProxy(0, host="127.0.0.1")
+    proxy.start()
+    proxy.add_backend("127.0.0.1", old.server_address[1], key="old", model="/modelos/viejo.gguf")
+    proxy.add_backend("127.0.0.1", new.server_address[1], key="new", model="/modelos/nuevo.gguf")
+    try:
+        conn = http.client.HTTPConnection("127.0.0.1", proxy.port, timeout=5)
+        conn.request("POST", "/v1/chat/completions", body=b'{"model": "viejo"}')
+        assert conn.getresponse().read().startswith(b"old:")
+        # Cambio de modelo: el viejo se drena y sus clientes pasan al nuevo en vez de recibir 503
+        proxy.set_accepting("old", False)
+        for _ in range(3):
+            conn.request("POST", "/v1/chat/completions", body=b'{"model": "viejo"}')
+            response = conn.getresponse()
+            assert response.status == 200 and response.read().startswith(b"new:")
+    finally:
+        proxy.stop()
+        old.shutdown()
+        new.shutdown()